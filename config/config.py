@@ -7,6 +7,58 @@ AWS_REGION = 'us-east-1'
 DYNAMODB_TABLE_NAME = 'license_optimization_table'
 S3_BUCKET_NAME = 'license-optimization-storage'
 
+# Shared boto3 client settings (src/aws_config.py)
+AWS_CLIENT_SETTINGS = {
+    'max_pool_connections': 50,
+    'tcp_keepalive': True,
+    'retry_mode': 'adaptive',
+    'max_attempts': 10,
+    'connect_timeout': 5,
+    'read_timeout': 30
+}
+
+# Multi-tenant analysis (src/tenant_runner.py): tenant/business unit -> table,
+# worker processes for the group run (None = one per CPU, capped at the tenant count)
+TENANT_SETTINGS = {
+    'tenants': {},
+    'max_workers': None
+}
+
+# Storage backend: 'dynamodb', 'sqlite' (local/edge mode) or 'memory' (tests, benchmarks)
+STORAGE_BACKEND = 'dynamodb'
+SQLITE_DB_PATH = 'data/licenses.db'
+
+# Usage history (src/usage_history.py): raw points kept this long, daily rollups kept forever
+USAGE_HISTORY_SETTINGS = {
+    'enabled': True,
+    'raw_retention_days': 90,
+    'prune_interval_seconds': 3600,
+    'bulk_fold_min_groups': 25
+}
+
+# Aggregation cube (src/aggregation_cube.py): rollups by license type, vendor,
+# expiry month and cost center; rebuilt from a fresh snapshot after ttl_seconds
+AGGREGATION_CUBE_SETTINGS = {
+    'ttl_seconds': 60
+}
+
+# Streaming CSV import (src/bulk_importer.py): rows parsed per chunk, rows per
+# batched write, concurrent writers, parsed rows allowed in flight, errors kept
+IMPORT_SETTINGS = {
+    'chunk_rows': 50000,
+    'batch_size': 500,
+    'write_workers': 4,
+    'max_inflight_bytes': 64 * 1024 * 1024,
+    'max_errors': 1000
+}
+
+# Parquet/Arrow snapshots (src/snapshot_io.py): codec for both formats, rows per
+# Parquet row group / Arrow record batch
+SNAPSHOT_SETTINGS = {
+    'compression': 'zstd',
+    'batch_rows': 100000
+}
+
 # Application Settings
 LOG_LEVEL = 'INFO'
 LOG_FILE = 'logs/license_system.log'
@@ -16,6 +68,25 @@ ML_CONFIDENCE_THRESHOLD = 0.7
 USAGE_THRESHOLD_LOW = 0.3
 USAGE_THRESHOLD_HIGH = 0.9
 
+# Usage forecasting (src/usage_forecast.py): days of daily history used,
+# prediction interval coverage, minimum history days before fitting a trend
+FORECAST_SETTINGS = {
+    'history_days': 180,
+    'interval': 0.8,
+    'min_observations': 7
+}
+
+# Streaming usage anomaly detection (src/anomaly_stream.py)
+ANOMALY_DETECTION_SETTINGS = {
+    'enabled': True,
+    'ewma_alpha': 0.1,
+    'z_threshold': 3.0,
+    'warmup_events': 5,
+    'flatline_days': 14,
+    'state_path': 'data/anomaly_state.npz',
+    'checkpoint_seconds': 30
+}
+
 # Compliance Settings
 EXPIRY_WARNING_DAYS = 30
 COMPLIANCE_CHECK_INTERVAL = 24  # hours
@@ -28,6 +99,32 @@ COST_SETTINGS = {
     'savings_threshold': 100.0
 }
 
+# Seat right-sizing (src/rightsizing.py): headroom over forecast demand,
+# purchase tiers / minimum seats per license_type ('*' = default), monthly budget cap
+RIGHTSIZING_SETTINGS = {
+    'headroom': 0.1,
+    'seat_increment': {'*': 1},
+    'min_seats': {'*': 1},
+    'monthly_budget': None
+}
+
+# Risk scoring (src/risk_engine.py): points per factor, usage-rate thresholds,
+# minimum portfolio score (0-100) per level, licenses listed in risk reports
+RISK_SETTINGS = {
+    'weights': {
+        'over_allocation': 40,
+        'high_usage': 20,
+        'expired': 30,
+        'expiring_critical': 20,
+        'expiring_warning': 10,
+        'invalid_expiry': 5
+    },
+    'over_allocation_threshold': 1.0,
+    'high_usage_threshold': 0.95,
+    'level_thresholds': {'CRITICAL': 70, 'HIGH': 40, 'MEDIUM': 20},
+    'top_k': 10
+}
+
 # Compliance thresholds
 COMPLIANCE_THRESHOLDS = {
     'usage_warning': 0.8,
@@ -2,71 +2,113 @@
 Advanced Analytics Engine for License Optimization
 """
 
+import copy
+import json
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Union
 from license_tracker import LicenseTracker
+from license_frame import LicenseFrame
+from portfolio_engine import PortfolioAnalysis, PortfolioEngine
+from risk_engine import RiskScores, RISK_TOP_K, score_licenses
+from snapshot_cache import analytics_result_cache
+
+# Monte Carlo ROI simulation settings
+ROI_SIMULATION_SCENARIOS = 20000
+ROI_SIMULATION_MAX_SCENARIOS = 200000
+ROI_PERCENTILES = (10, 50, 90)
+
+def sample_distribution(spec: Union[float, Dict], size: int, rng: np.random.Generator,
+                        lower: float = None, upper: float = None) -> np.ndarray:
+    """Lấy mẫu một biến đầu vào của mô phỏng ROI
+    
+    spec is a plain number (fixed value) or a dict with 'distribution':
+    triangular (low/mode/high), uniform (low/high) or normal (mean/std).
+    Samples are clipped to [lower, upper] when given.
+    """
+    if not isinstance(spec, dict):
+        samples = np.full(size, float(spec))
+    else:
+        distribution = spec.get('distribution', 'triangular')
+        if distribution == 'triangular':
+            low, mode, high = float(spec['low']), float(spec['mode']), float(spec['high'])
+            if not low <= mode <= high:
+                raise ValueError(f"Triangular distribution requires low <= mode <= high: {spec}")
+            samples = rng.triangular(low, mode, high, size) if high > low else np.full(size, mode)
+        elif distribution == 'uniform':
+            samples = rng.uniform(float(spec['low']), float(spec['high']), size)
+        elif distribution == 'normal':
+            samples = rng.normal(float(spec['mean']), float(spec.get('std', 0)), size)
+        else:
+            raise ValueError(f"Unknown distribution: {distribution}")
+    if lower is not None or upper is not None:
+        samples = np.clip(samples, lower, upper)
+    return samples
+
+def _percentile_band(values: np.ndarray) -> Dict:
+    """P10/P50/P90 (+ mean) của một mảng kết quả mô phỏng"""
+    # 'nearest' giữ inf (payback không bao giờ hoàn vốn) thay vì nội suy ra nan
+    bands = np.percentile(values, ROI_PERCENTILES, method='nearest')
+    band = {f"p{p}": (float(v) if np.isfinite(v) else None) for p, v in zip(ROI_PERCENTILES, bands)}
+    finite = values[np.isfinite(values)]
+    band['mean'] = float(finite.mean()) if len(finite) else None
+    return band
 
 class AdvancedAnalytics:
-    def __init__(self):
-        self.tracker = LicenseTracker()
+    def __init__(self, table_name: str = None, tracker: LicenseTracker = None):
+        self.tracker = tracker or LicenseTracker(table_name=table_name)
+    
+    def _memoized(self, name: str, compute: Callable[[], Dict], *args) -> Dict:
+        """Kết quả cache theo data version của tracker - dữ liệu không đổi thì không tính lại"""
+        key = (name, self.tracker.data_version(), json.dumps(args, sort_keys=True, default=str))
+        # Trả bản sao để caller sửa kết quả không làm hỏng cache
+        return copy.deepcopy(analytics_result_cache.get_or_compute(key, compute))
     
-    def generate_executive_summary(self) -> Dict:
+    def generate_executive_summary(self, portfolio: PortfolioAnalysis = None) -> Dict:
         """Tạo báo cáo tổng quan cho leadership"""
-        licenses = self.tracker.get_all_licenses()
-        if not licenses:
+        if portfolio is None:
+            return self._memoized(
+                'executive_summary',
+                lambda: self.generate_executive_summary(PortfolioEngine(self.tracker).analyze())
+            )
+        if not portfolio.total_licenses:
             return {'error': 'No license data available'}
         
-        df = pd.DataFrame(licenses)
-        df['used_licenses'] = pd.to_numeric(df['used_licenses'])
-        df['total_licenses'] = pd.to_numeric(df['total_licenses'])
-        df['cost_per_license'] = pd.to_numeric(df['cost_per_license'])
-        df['usage_rate'] = df['used_licenses'] / df['total_licenses']
-        df['total_cost'] = df['total_licenses'] * df['cost_per_license']
-        df['waste_cost'] = (df['total_licenses'] - df['used_licenses']) * df['cost_per_license']
-        
-        # Calculate key metrics
-        total_spend = df['total_cost'].sum()
-        total_waste = df['waste_cost'].sum()
-        avg_utilization = df['usage_rate'].mean()
-        
-        # Risk assessment
-        high_risk_licenses = len(df[df['usage_rate'] > 0.95])
-        underutilized_licenses = len(df[df['usage_rate'] < 0.3])
-        
-        # Expiry analysis
-        expired_count = 0
-        expiring_soon_count = 0
-        
-        for _, license in df.iterrows():
-            if license.get('expiry_date'):
-                try:
-                    expiry = datetime.strptime(license['expiry_date'], '%Y-%m-%d')
-                    days_until_expiry = (expiry - datetime.now()).days
-                    if days_until_expiry < 0:
-                        expired_count += 1
-                    elif days_until_expiry <= 30:
-                        expiring_soon_count += 1
-                except:
-                    pass
-        
+        return portfolio.executive_summary()
+    
+    def generate_headline_metrics(self) -> Dict:
+        """Chỉ số chính từ portfolio summary - một lần đọc, không phụ thuộc số license"""
+        summary = PortfolioEngine(self.tracker).summary()
+        if summary is None:
+            return {'error': 'Portfolio summary unavailable'}
+        
+        total_spend = summary.total_monthly_cost
+        total_waste = summary.total_waste
+        expiry_counts = summary.expiry_counts()
         return {
-            'total_licenses': len(licenses),
+            'total_licenses': summary.total_licenses,
+            'total_seats': summary.total_seats,
+            'used_seats': summary.used_seats,
+            'total_monthly_cost': total_spend,
             'total_annual_spend': total_spend * 12,  # Assuming monthly costs
             'potential_annual_savings': total_waste * 12,
-            'average_utilization': f"{avg_utilization:.1%}",
-            'efficiency_score': f"{((total_spend - total_waste) / total_spend * 100):.1f}%",
-            'high_risk_licenses': high_risk_licenses,
-            'underutilized_licenses': underutilized_licenses,
-            'expired_licenses': expired_count,
-            'expiring_soon': expiring_soon_count,
-            'top_cost_drivers': df.nlargest(3, 'total_cost')[['software_name', 'total_cost']].to_dict('records'),
-            'biggest_waste_sources': df.nlargest(3, 'waste_cost')[['software_name', 'waste_cost']].to_dict('records')
+            'average_utilization': f"{summary.average_utilization:.1%}",
+            'efficiency_score': f"{((total_spend - total_waste) / total_spend * 100):.1f}%" if total_spend > 0 else "0.0%",
+            'expired_licenses': expiry_counts['expired'],
+            'expiring_soon': expiry_counts['critical'] + expiry_counts['warning'],
+            'license_types': summary.license_types
         }
     
     def calculate_roi_projections(self, optimization_scenarios: List[Dict]) -> Dict:
         """Tính toán ROI cho các kịch bản tối ưu hóa"""
+        return self._memoized(
+            'roi_projections',
+            lambda: self._calculate_roi_projections(optimization_scenarios),
+            optimization_scenarios
+        )
+    
+    def _calculate_roi_projections(self, optimization_scenarios: List[Dict]) -> Dict:
         current_summary = self.generate_executive_summary()
         current_annual_spend = current_summary.get('total_annual_spend', 0)
         
@@ -98,70 +140,70 @@ class AdvancedAnalytics:
             'recommended_scenario': max(projections, key=lambda x: x['net_benefit_year_1']) if projections else None
         }
     
-    def generate_compliance_risk_score(self) -> Dict:
+    def simulate_roi_projections(self, scenario: Dict, n_scenarios: int = ROI_SIMULATION_SCENARIOS,
+                                 seed: Optional[int] = None) -> Dict:
+        """Mô phỏng Monte Carlo ROI cho một kịch bản tối ưu hóa
+        
+        scenario takes distributions (see sample_distribution) for
+        'monthly_savings', 'implementation_cost' and 'adoption' (0-1, fraction
+        of the savings actually realised). All scenarios are evaluated as
+        NumPy arrays in one pass.
+        """
+        n_scenarios = int(min(max(n_scenarios, 1), ROI_SIMULATION_MAX_SCENARIOS))
+        rng = np.random.default_rng(seed)
+        
+        monthly_savings = sample_distribution(scenario.get('monthly_savings', 0), n_scenarios, rng, lower=0)
+        implementation_cost = sample_distribution(scenario.get('implementation_cost', 0), n_scenarios, rng, lower=0)
+        adoption = sample_distribution(scenario.get('adoption', 1), n_scenarios, rng, lower=0, upper=1)
+        
+        realised_savings = monthly_savings * adoption
+        annual_savings = realised_savings * 12
+        net_benefit = annual_savings - implementation_cost
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Cùng quy ước với calculate_roi_projections: không có chi phí -> ROI 0
+            roi_percentage = np.where(implementation_cost > 0, net_benefit / implementation_cost * 100, 0.0)
+            payback_months = np.where(realised_savings > 0, implementation_cost / realised_savings, np.inf)
+        
+        return {
+            'scenario': scenario.get('name', 'Unnamed Scenario'),
+            'n_scenarios': n_scenarios,
+            'seed': seed,
+            'roi_percentage': _percentile_band(roi_percentage),
+            'payback_period_months': _percentile_band(payback_months),
+            'net_benefit_year_1': _percentile_band(net_benefit),
+            'annual_savings': _percentile_band(annual_savings),
+            'probability_positive_roi': float(np.mean(net_benefit > 0)),
+            'probability_payback_within_year': float(np.mean(payback_months <= 12))
+        }
+    
+    def generate_compliance_risk_score(self, portfolio: PortfolioAnalysis = None) -> Dict:
         """Tính điểm rủi ro tuân thủ"""
-        licenses = self.tracker.get_all_licenses()
-        if not licenses:
+        if portfolio is None:
+            return self._memoized(
+                'compliance_risk_score',
+                lambda: self.generate_compliance_risk_score(PortfolioEngine(self.tracker).analyze())
+            )
+        if not portfolio.total_licenses:
             return {'error': 'No license data available'}
         
-        total_score = 0
-        risk_factors = []
-        
-        for license in licenses:
-            license_risk = 0
-            
-            # Usage risk
-            usage_rate = float(license['used_licenses']) / float(license['total_licenses'])
-            if usage_rate > 1.0:
-                license_risk += 40  # Critical over-allocation
-                risk_factors.append(f"{license['software_name']}: Over-allocation detected")
-            elif usage_rate > 0.95:
-                license_risk += 20  # High usage risk
-                risk_factors.append(f"{license['software_name']}: High usage risk")
-            
-            # Expiry risk
-            if license.get('expiry_date'):
-                try:
-                    expiry = datetime.strptime(license['expiry_date'], '%Y-%m-%d')
-                    days_until_expiry = (expiry - datetime.now()).days
-                    if days_until_expiry < 0:
-                        license_risk += 30  # Expired
-                        risk_factors.append(f"{license['software_name']}: License expired")
-                    elif days_until_expiry <= 7:
-                        license_risk += 20  # Expiring very soon
-                        risk_factors.append(f"{license['software_name']}: Expiring within 7 days")
-                    elif days_until_expiry <= 30:
-                        license_risk += 10  # Expiring soon
-                        risk_factors.append(f"{license['software_name']}: Expiring within 30 days")
-                except:
-                    license_risk += 5  # Invalid date format
-                    risk_factors.append(f"{license['software_name']}: Invalid expiry date")
-            
-            total_score += license_risk
-        
-        # Normalize score (0-100)
-        max_possible_score = len(licenses) * 70  # Max risk per license
-        normalized_score = min(100, (total_score / max_possible_score * 100)) if max_possible_score > 0 else 0
-        
-        # Risk level
-        if normalized_score >= 70:
-            risk_level = 'CRITICAL'
-        elif normalized_score >= 40:
-            risk_level = 'HIGH'
-        elif normalized_score >= 20:
-            risk_level = 'MEDIUM'
-        else:
-            risk_level = 'LOW'
-        
+        risk = portfolio.risk
+        top = risk.top(RISK_TOP_K)
+        factor_counts = risk.factor_counts()
         return {
-            'risk_score': f"{normalized_score:.1f}",
-            'risk_level': risk_level,
-            'total_licenses_evaluated': len(licenses),
-            'risk_factors': risk_factors[:10],  # Top 10 risk factors
-            'recommendations': self._get_risk_mitigation_recommendations(risk_level, risk_factors)
+            'risk_score': f"{portfolio.risk_score:.1f}",
+            'risk_level': portfolio.risk_level,
+            'total_licenses_evaluated': portfolio.total_licenses,
+            'risk_factors': risk.describe(top),  # Factor của RISK_TOP_K license rủi ro nhất
+            'top_risk_licenses': risk.records(top),
+            'factor_counts': factor_counts,
+            'recommendations': self._get_risk_mitigation_recommendations(portfolio.risk_level, factor_counts)
         }
     
-    def _get_risk_mitigation_recommendations(self, risk_level: str, risk_factors: List[str]) -> List[str]:
+    def score_licenses(self, frame: LicenseFrame = None) -> RiskScores:
+        """Điểm rủi ro + bitmask factor cho mọi license (mặc định snapshot hiện tại)"""
+        return score_licenses(frame if frame is not None else LicenseFrame.from_tracker(self.tracker))
+    
+    def _get_risk_mitigation_recommendations(self, risk_level: str, factor_counts: Dict[str, int]) -> List[str]:
         """Đề xuất giảm thiểu rủi ro"""
         recommendations = []
         
@@ -170,15 +212,15 @@ class AdvancedAnalytics:
             recommendations.append("Implement automated compliance monitoring")
             recommendations.append("Establish emergency license procurement process")
         
-        if any('expired' in factor.lower() for factor in risk_factors):
+        if factor_counts.get('expired'):
             recommendations.append("Renew expired licenses immediately")
             recommendations.append("Set up expiry alerts 60 days in advance")
         
-        if any('over-allocation' in factor.lower() for factor in risk_factors):
+        if factor_counts.get('over_allocation'):
             recommendations.append("Audit license usage to prevent over-allocation")
             recommendations.append("Implement usage monitoring tools")
         
-        if any('expiring' in factor.lower() for factor in risk_factors):
+        if factor_counts.get('expiring_critical') or factor_counts.get('expiring_warning'):
             recommendations.append("Create renewal calendar for upcoming expirations")
             recommendations.append("Negotiate multi-year contracts for better rates")
         
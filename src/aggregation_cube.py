@@ -0,0 +1,238 @@
+"""
+Aggregation Cube - Rollup chi phí/seat theo license type, vendor, tháng hết hạn và cost center
+Precomputed cells updated per write; drill-down queries read cells, not licenses
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Chiều của cube (thứ tự trong key của cell)
+DIMENSIONS = ('license_type', 'vendor', 'expiry_month', 'cost_center')
+# Measure nguyên cộng dồn trong mỗi cell
+MEASURES = ('license_count', 'total_seats', 'used_seats', 'spend_cents', 'used_spend_cents')
+# Giá trị chiều khi license không có thông tin
+NO_EXPIRY = 'NO_EXPIRY'
+UNASSIGNED = 'UNASSIGNED'
+# Cube được build lại từ snapshot mới sau khoảng này (nhận thay đổi từ process khác)
+CUBE_TTL_SECONDS = 60
+
+try:
+    from config.config import AGGREGATION_CUBE_SETTINGS
+    CUBE_TTL_SECONDS = AGGREGATION_CUBE_SETTINGS.get('ttl_seconds', CUBE_TTL_SECONDS)
+except ImportError:
+    pass
+
+
+def software_family(software_name: str) -> str:
+    """Vendor/họ phần mềm: từ đầu tiên của tên ('Microsoft Office 365' -> 'Microsoft')"""
+    parts = str(software_name or '').split()
+    return parts[0] if parts else UNASSIGNED
+
+
+def cube_cell(item: Dict) -> Tuple[str, ...]:
+    """Key cell (theo DIMENSIONS) của một license"""
+    expiry_date = str(item.get('expiry_date') or '')
+    return (
+        str(item.get('license_type') or UNASSIGNED),
+        software_family(item.get('software_name')),
+        expiry_date[:7] if expiry_date else NO_EXPIRY,
+        str(item.get('cost_center') or UNASSIGNED)
+    )
+
+
+def cube_measures(total: int, used: int, cost_cents: int) -> np.ndarray:
+    return np.array([1, total, used, total * cost_cents, used * cost_cents], dtype=np.int64)
+
+
+def _cost_cents(value) -> int:
+    # Làm tròn như LicenseFrame.from_licenses để hai nguồn khớp nhau
+    return int(np.rint(float(value or 0) * 100))
+
+
+class AggregationCube:
+    """Cell (license_type, vendor, expiry_month, cost_center) -> tổng measure
+
+    Each license's cell and measures are remembered so a write is applied
+    as remove-old + add-new without reading the previous item. Queries only
+    iterate cells, whose number is bounded by the distinct dimension
+    combinations rather than the number of licenses.
+    """
+
+    def __init__(self):
+        self._cells = {}
+        self._rows = {}
+        self._lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_licenses(cls, licenses: List[Dict]) -> 'AggregationCube':
+        """Build cube từ list license trong một lượt groupby"""
+        cube = cls()
+        if not licenses:
+            return cube
+        df = pd.DataFrame.from_records(
+            licenses, columns=['license_id', 'software_name', 'license_type', 'total_licenses',
+                               'used_licenses', 'cost_per_license', 'expiry_date', 'cost_center']
+        )
+        total = pd.to_numeric(df['total_licenses'], errors='coerce').fillna(0).to_numpy(np.int64)
+        used = pd.to_numeric(df['used_licenses'], errors='coerce').fillna(0).to_numpy(np.int64)
+        cost = np.rint(pd.to_numeric(df['cost_per_license'], errors='coerce').fillna(0)
+                       .to_numpy(np.float64) * 100).astype(np.int64)
+        expiry = df['expiry_date'].fillna('').astype(str)
+
+        dims = pd.DataFrame({
+            'license_type': df['license_type'].fillna('').astype(str).replace('', UNASSIGNED),
+            'vendor': df['software_name'].fillna('').astype(str).str.split().str[0].fillna(UNASSIGNED),
+            'expiry_month': expiry.str[:7].where(expiry != '', NO_EXPIRY),
+            'cost_center': df['cost_center'].fillna('').astype(str).replace('', UNASSIGNED)
+        })
+        measures = np.column_stack([np.ones(len(df), dtype=np.int64), total, used, total * cost, used * cost])
+
+        # Giữ bản ghi cuối nếu license_id trùng (như khi ghi đè)
+        keep = ~df['license_id'].astype(str).duplicated(keep='last').to_numpy()
+        cells = list(dims[keep].itertuples(index=False, name=None))
+        measures = measures[keep]
+        grouped = pd.DataFrame(measures, columns=MEASURES).groupby(
+            pd.MultiIndex.from_tuples(cells, names=DIMENSIONS), sort=False
+        ).sum()
+
+        cube._cells = {cell: row for cell, row in zip(grouped.index, grouped.to_numpy(np.int64))}
+        cube._rows = dict(zip(df['license_id'].astype(str)[keep], zip(cells, measures)))
+        return cube
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def apply(self, item: Dict):
+        """Ghi/ghi đè một license"""
+        measures = cube_measures(
+            int(item.get('total_licenses', 0)), int(item.get('used_licenses', 0)),
+            _cost_cents(item.get('cost_per_license'))
+        )
+        with self._lock:
+            self._remove(item['license_id'])
+            self._add(item['license_id'], cube_cell(item), measures)
+
+    def set_usage(self, license_id: str, used_licenses: int):
+        """Đổi used_licenses (increment/decrement) mà không cần item đầy đủ"""
+        with self._lock:
+            row = self._rows.get(license_id)
+            if row is None:
+                return
+            cell, old = row
+            cost_cents = old[3] // old[1] if old[1] else 0
+            self._remove(license_id)
+            self._add(license_id, cell, cube_measures(int(old[1]), int(used_licenses), int(cost_cents)))
+
+    def remove(self, license_id: str):
+        with self._lock:
+            self._remove(license_id)
+
+    def _add(self, license_id: str, cell: Tuple[str, ...], measures: np.ndarray):
+        self._rows[license_id] = (cell, measures)
+        current = self._cells.get(cell)
+        self._cells[cell] = measures.copy() if current is None else current + measures
+
+    def _remove(self, license_id: str):
+        row = self._rows.pop(license_id, None)
+        if row is None:
+            return
+        cell, measures = row
+        remaining = self._cells[cell] - measures
+        if remaining[0]:
+            self._cells[cell] = remaining
+        else:
+            del self._cells[cell]
+
+    def rollup(self, by: Sequence[str] = ('license_type',), filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Gộp cell theo các chiều by, chỉ lấy cell khớp filters; sắp giảm dần theo spend
+
+        Drill-down is a rollup one level deeper with the chosen values as
+        filters, e.g. rollup(['vendor'], {'license_type': 'SUBSCRIPTION'}).
+        """
+        by = list(by)
+        positions = [DIMENSIONS.index(dim) for dim in by]
+        conditions = [(DIMENSIONS.index(dim), value) for dim, value in (filters or {}).items()]
+        groups = {}
+        with self._lock:
+            for cell, measures in self._cells.items():
+                if any(cell[position] != value for position, value in conditions):
+                    continue
+                key = tuple(cell[position] for position in positions)
+                current = groups.get(key)
+                groups[key] = measures.copy() if current is None else current + measures
+
+        results = []
+        for key, measures in groups.items():
+            count, total, used, spend, used_spend = (int(value) for value in measures)
+            record = dict(zip(by, key))
+            record.update({
+                'license_count': count,
+                'total_seats': total,
+                'used_seats': used,
+                'monthly_spend': spend / 100,
+                'monthly_waste': (spend - used_spend) / 100,
+                'utilization': used / total if total else 0.0
+            })
+            results.append(record)
+        results.sort(key=lambda record: -record['monthly_spend'])
+        return results
+
+    def values(self, dimension: str) -> List[str]:
+        """Các giá trị đang có của một chiều (cho filter/drill-down)"""
+        position = DIMENSIONS.index(dimension)
+        with self._lock:
+            return sorted({cell[position] for cell in self._cells})
+
+
+class CubeRegistry:
+    def __init__(self, ttl_seconds: float = CUBE_TTL_SECONDS):
+        """Cube theo key nguồn dữ liệu (như snapshot cache), build lại sau TTL"""
+        self.ttl_seconds = ttl_seconds
+        self._cubes = {}
+        # Số lần ghi theo key: cube build xong sau một lần ghi chưa thấy nó thì không được đăng ký
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], List[Dict]], refresh: bool = False) -> AggregationCube:
+        cube = None if refresh else self.peek(key)
+        if cube is None:
+            with self._lock:
+                generation = self._generations.get(key, 0)
+            cube = AggregationCube.from_licenses(loader())
+            with self._lock:
+                # Có ghi trong lúc build - cube có thể thiếu thay đổi đó, chỉ trả về mà không cache
+                if self._generations.get(key, 0) == generation:
+                    self._cubes[key] = cube
+        return cube
+
+    def peek(self, key: Hashable) -> Optional[AggregationCube]:
+        """Cube còn hạn hoặc None"""
+        with self._lock:
+            return self._peek(key)
+
+    def changed(self, key: Hashable) -> Optional[AggregationCube]:
+        """Ghi nhận một lần ghi và trả về cube đang có để áp thay đổi (không build cube chỉ để cập nhật)"""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            return self._peek(key)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._cubes.pop(key, None)
+
+    def _peek(self, key: Hashable) -> Optional[AggregationCube]:
+        cube = self._cubes.get(key)
+        if cube is not None and time.monotonic() - cube.built_at > self.ttl_seconds:
+            del self._cubes[key]
+            return None
+        return cube
+
+
+# Cube dùng chung cho mọi LicenseTracker trong process
+cube_registry = CubeRegistry()
@@ -0,0 +1,335 @@
+"""
+Anomaly Stream - Phát hiện bất thường online trên từng lần cập nhật usage
+Per-license EWMA mean/variance kept in flat NumPy arrays, O(1) per event
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+# Detector settings (overridden by config/config.py if available)
+ANOMALY_DETECTION_ENABLED = True
+ANOMALY_EWMA_ALPHA = 0.1
+ANOMALY_Z_THRESHOLD = 3.0
+# Số event đầu tiên của mỗi license chỉ dùng để học, không cảnh báo spike/drop
+ANOMALY_WARMUP_EVENTS = 5
+# Độ lệch chuẩn tối thiểu: max(ANOMALY_MIN_STD seats, ANOMALY_MIN_STD_RATIO * mean)
+ANOMALY_MIN_STD = 1.0
+ANOMALY_MIN_STD_RATIO = 0.05
+# Giá trị không đổi lâu hơn số ngày này (qua các lần sync) thì báo flatline
+ANOMALY_FLATLINE_DAYS = 14
+ANOMALY_STATE_PATH = 'data/anomaly_state.npz'
+# Ghi state ra đĩa tối đa mỗi ngần này giây
+ANOMALY_CHECKPOINT_SECONDS = 30
+# Số anomaly gần nhất giữ trong bộ nhớ
+ANOMALY_RECENT_MAX = 500
+
+try:
+    from config.config import ANOMALY_DETECTION_SETTINGS
+    ANOMALY_DETECTION_ENABLED = ANOMALY_DETECTION_SETTINGS.get('enabled', ANOMALY_DETECTION_ENABLED)
+    ANOMALY_EWMA_ALPHA = ANOMALY_DETECTION_SETTINGS.get('ewma_alpha', ANOMALY_EWMA_ALPHA)
+    ANOMALY_Z_THRESHOLD = ANOMALY_DETECTION_SETTINGS.get('z_threshold', ANOMALY_Z_THRESHOLD)
+    ANOMALY_WARMUP_EVENTS = ANOMALY_DETECTION_SETTINGS.get('warmup_events', ANOMALY_WARMUP_EVENTS)
+    ANOMALY_FLATLINE_DAYS = ANOMALY_DETECTION_SETTINGS.get('flatline_days', ANOMALY_FLATLINE_DAYS)
+    ANOMALY_STATE_PATH = ANOMALY_DETECTION_SETTINGS.get('state_path', ANOMALY_STATE_PATH)
+    ANOMALY_CHECKPOINT_SECONDS = ANOMALY_DETECTION_SETTINGS.get('checkpoint_seconds', ANOMALY_CHECKPOINT_SECONDS)
+except ImportError:
+    pass
+if not os.path.isabs(ANOMALY_STATE_PATH):
+    ANOMALY_STATE_PATH = os.path.join(os.path.dirname(__file__), '..', ANOMALY_STATE_PATH)
+
+# Các mảng state lưu trong file .npz (license_ids lưu riêng dạng unicode)
+STATE_ARRAYS = ('mean', 'var', 'last_value', 'last_change', 'count', 'flat_flagged')
+
+
+class StreamingAnomalyDetector:
+    """EWMA mean/variance theo license, cập nhật O(1) cho mỗi event usage
+
+    Each license owns one row in a set of flat arrays (grown by doubling).
+    An event is scored against the state before it is folded in:
+    - USAGE_SPIKE / USAGE_DROP: |value - mean| / std above z_threshold
+      after the warm-up events;
+    - USAGE_FLATLINE: the value reported again unchanged for longer than
+      flatline_days (flagged once per flat period).
+    """
+
+    def __init__(self, state_path: Optional[str] = None, alpha: float = ANOMALY_EWMA_ALPHA,
+                 z_threshold: float = ANOMALY_Z_THRESHOLD, warmup_events: int = ANOMALY_WARMUP_EVENTS,
+                 flatline_days: float = ANOMALY_FLATLINE_DAYS,
+                 checkpoint_seconds: float = ANOMALY_CHECKPOINT_SECONDS, capacity: int = 1024):
+        self.state_path = state_path
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup_events = warmup_events
+        self.flatline_seconds = flatline_days * 86400
+        self.checkpoint_seconds = checkpoint_seconds
+        self.recent = deque(maxlen=ANOMALY_RECENT_MAX)
+        self._lock = threading.Lock()
+        # Giữ suốt lúc ghi file tạm + rename: hai lần save không ghi đè lẫn nhau
+        self._save_lock = threading.Lock()
+        self._index = {}
+        self._license_ids = []
+        self._allocate(capacity)
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        if state_path and os.path.exists(state_path):
+            try:
+                self.load(state_path)
+            except (OSError, ValueError, KeyError):
+                # State hỏng/không đọc được: học lại từ đầu thay vì chặn việc ghi usage
+                self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.mean = np.zeros(capacity)
+        self.var = np.zeros(capacity)
+        self.last_value = np.zeros(capacity)
+        # Epoch seconds của lần giá trị đổi gần nhất
+        self.last_change = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.flat_flagged = np.zeros(capacity, dtype=bool)
+
+    def _row(self, license_id: str) -> int:
+        row = self._index.get(license_id)
+        if row is None:
+            row = self._index[license_id] = len(self._license_ids)
+            self._license_ids.append(license_id)
+            if row == len(self.mean):
+                for name in STATE_ARRAYS:
+                    array = getattr(self, name)
+                    grown = np.zeros(2 * len(array), dtype=array.dtype)
+                    grown[:len(array)] = array
+                    setattr(self, name, grown)
+        return row
+
+    def observe(self, license_id: str, used_licenses: float, recorded_at=None) -> Optional[Dict]:
+        """Chấm điểm một event rồi cập nhật state; trả về anomaly (hoặc None)"""
+        timestamp = _epoch_seconds(recorded_at)
+        value = float(used_licenses)
+        with self._lock:
+            anomaly = self._observe(license_id, value, timestamp)
+            if anomaly is not None:
+                self.recent.append(anomaly)
+            self._dirty = True
+        self._maybe_checkpoint()
+        return anomaly
+
+    def observe_many(self, records: List[tuple]) -> List[Dict]:
+        """Nhiều event (license_id, recorded_at, used_licenses) - như record của usage history"""
+        anomalies = []
+        with self._lock:
+            for license_id, recorded_at, used in records:
+                anomaly = self._observe(license_id, float(used), _epoch_seconds(recorded_at))
+                if anomaly is not None:
+                    self.recent.append(anomaly)
+                    anomalies.append(anomaly)
+            self._dirty = self._dirty or bool(records)
+        self._maybe_checkpoint()
+        return anomalies
+
+    def _observe(self, license_id: str, value: float, timestamp: float) -> Optional[Dict]:
+        row = self._row(license_id)
+        count = self.count[row]
+        if count == 0:
+            self.mean[row] = value
+            self.var[row] = 0.0
+            self.last_value[row] = value
+            self.last_change[row] = timestamp
+            self.count[row] = 1
+            return None
+
+        mean = self.mean[row]
+        anomaly = None
+        if value == self.last_value[row]:
+            flat_for = timestamp - self.last_change[row]
+            if flat_for >= self.flatline_seconds and not self.flat_flagged[row]:
+                self.flat_flagged[row] = True
+                anomaly = self._anomaly(
+                    license_id, 'USAGE_FLATLINE', 'MEDIUM', value, mean, 0.0, timestamp,
+                    f"Usage unchanged at {value:.0f} for {flat_for / 86400:.0f} days"
+                )
+        else:
+            self.last_change[row] = timestamp
+            self.flat_flagged[row] = False
+            std = max(np.sqrt(self.var[row]), ANOMALY_MIN_STD, ANOMALY_MIN_STD_RATIO * abs(mean))
+            z_score = (value - mean) / std
+            if count >= self.warmup_events and abs(z_score) > self.z_threshold:
+                severity = 'HIGH' if abs(z_score) > 2 * self.z_threshold else 'MEDIUM'
+                kind, direction = ('USAGE_SPIKE', 'above') if z_score > 0 else ('USAGE_DROP', 'below')
+                anomaly = self._anomaly(
+                    license_id, kind, severity, value, mean, z_score, timestamp,
+                    f"Usage {value:.0f} is {abs(z_score):.1f} std {direction} recent average {mean:.1f}"
+                )
+
+        # Incremental EWMA mean/variance
+        diff = value - mean
+        increment = self.alpha * diff
+        self.mean[row] = mean + increment
+        self.var[row] = (1 - self.alpha) * (self.var[row] + diff * increment)
+        self.last_value[row] = value
+        self.count[row] = count + 1
+        return anomaly
+
+    @staticmethod
+    def _anomaly(license_id: str, anomaly_type: str, severity: str, value: float, expected: float,
+                 z_score: float, timestamp: float, description: str) -> Dict:
+        return {
+            'license_id': license_id,
+            'anomaly_type': anomaly_type,
+            'severity': severity,
+            'description': description,
+            'value': value,
+            'expected': float(expected),
+            'z_score': float(z_score),
+            'detected_at': datetime.fromtimestamp(timestamp).isoformat()
+        }
+
+    def recent_anomalies(self, since: Optional[str] = None) -> List[Dict]:
+        """Anomaly gần nhất (mới nhất trước), tùy chọn từ thời điểm since (ISO)"""
+        with self._lock:
+            anomalies = list(self.recent)
+        if since:
+            anomalies = [a for a in anomalies if a['detected_at'] >= since]
+        return anomalies[::-1]
+
+    def flatlines(self, now=None) -> List[str]:
+        """License đang đứng yên lâu hơn flatline_days, kiểm tra trên mảng state (không scan bảng)"""
+        timestamp = _epoch_seconds(now)
+        with self._lock:
+            size = len(self._license_ids)
+            rows = np.flatnonzero(
+                (self.count[:size] > 0) & (timestamp - self.last_change[:size] >= self.flatline_seconds)
+            )
+            return [self._license_ids[row] for row in rows]
+
+    def forget(self, license_id: str) -> bool:
+        """Bỏ state của license (vd. license đã bị xóa); hàng cuối được chuyển vào chỗ trống"""
+        with self._lock:
+            row = self._index.pop(license_id, None)
+            if row is None:
+                return False
+            last = len(self._license_ids) - 1
+            if row != last:
+                moved = self._license_ids[last]
+                for name in STATE_ARRAYS:
+                    array = getattr(self, name)
+                    array[row] = array[last]
+                self._license_ids[row] = moved
+                self._index[moved] = row
+            self._license_ids.pop()
+            for name in STATE_ARRAYS:
+                getattr(self, name)[last] = 0
+            self._dirty = True
+        self._maybe_checkpoint()
+        return True
+
+    def state(self, license_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._index.get(license_id)
+            if row is None:
+                return None
+            return {
+                'mean': float(self.mean[row]),
+                'std': float(np.sqrt(self.var[row])),
+                'last_value': float(self.last_value[row]),
+                'events': int(self.count[row])
+            }
+
+    def save(self, path: Optional[str] = None):
+        """Ghi state ra .npz (ghi file tạm rồi rename để không để lại file hỏng)
+
+        The save lock is held from the snapshot to the rename, so concurrent
+        checkpoints cannot replace a newer file with an older one; the temp
+        file name is unique across threads and processes.
+        """
+        path = path or self.state_path
+        if not path:
+            return
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._save_lock:
+            with self._lock:
+                size = len(self._license_ids)
+                arrays = {name: getattr(self, name)[:size].copy() for name in STATE_ARRAYS}
+                arrays['license_ids'] = np.array(self._license_ids, dtype=str)
+                self._dirty = False
+            temp_file = tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path) + '.',
+                                                    suffix='.tmp.npz', delete=False)
+            try:
+                with temp_file:
+                    np.savez(temp_file, **arrays)
+                os.replace(temp_file.name, path)
+            except BaseException:
+                if os.path.exists(temp_file.name):
+                    os.unlink(temp_file.name)
+                raise
+            self._last_checkpoint = time.monotonic()
+
+    def load(self, path: Optional[str] = None):
+        """Nạp state đã lưu - khởi động lại không cần học lại từ đầu"""
+        path = path or self.state_path
+        with np.load(path, allow_pickle=False) as data:
+            license_ids = [str(license_id) for license_id in data['license_ids']]
+            with self._lock:
+                self._allocate(max(1024, 2 * len(license_ids)))
+                for name in STATE_ARRAYS:
+                    getattr(self, name)[:len(license_ids)] = data[name]
+                self._license_ids = license_ids
+                self._index = {license_id: row for row, license_id in enumerate(license_ids)}
+                self._dirty = False
+
+    def _maybe_checkpoint(self):
+        if (self.state_path and self._dirty
+                and time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds):
+            self.save()
+
+
+def _epoch_seconds(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def anomaly_state_path(key: Optional[Hashable] = None) -> str:
+    """File state của detector theo nguồn dữ liệu: ANOMALY_STATE_PATH thêm hậu tố theo key"""
+    if key is None:
+        return ANOMALY_STATE_PATH
+    parts = key if isinstance(key, tuple) else (key,)
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', '_'.join(str(part) for part in parts)).strip('_')[-60:]
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=4).hexdigest()
+    base, extension = os.path.splitext(ANOMALY_STATE_PATH)
+    return f"{base}.{slug}-{digest}{extension or '.npz'}"
+
+
+_detectors = {}
+_detector_lock = threading.Lock()
+
+
+def get_usage_anomaly_detector(key: Optional[Hashable] = None, persist: bool = True) -> StreamingAnomalyDetector:
+    """Detector dùng chung trong process cho một nguồn dữ liệu (key như snapshot cache)
+
+    Licenses in different tables may share ids, so each key (e.g.
+    LicenseTracker._table_key()) gets its own detector and state file,
+    loaded on first use. persist=False keeps the state in memory only (for
+    in-memory stores).
+    """
+    detector = _detectors.get(key)
+    if detector is None:
+        with _detector_lock:
+            detector = _detectors.get(key)
+            if detector is None:
+                detector = _detectors[key] = StreamingAnomalyDetector(
+                    state_path=anomaly_state_path(key) if persist else None
+                )
+    return detector
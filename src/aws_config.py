@@ -4,36 +4,113 @@ Handles AWS credentials and region setup
 """
 
 import os
+import threading
 import boto3
+from botocore.config import Config
+
+# Connection pool / retry settings (overridden by config/config.py if available)
+AWS_CLIENT_SETTINGS = {
+    'max_pool_connections': 50,
+    'tcp_keepalive': True,
+    'retry_mode': 'adaptive',
+    'max_attempts': 10,
+    'connect_timeout': 5,
+    'read_timeout': 30
+}
+
+try:
+    from config.config import AWS_CLIENT_SETTINGS
+except ImportError:
+    pass
+
+# Process-wide registry: one session, one client per (service, region),
+# one resource per (service, region) per thread (resources are not thread-safe)
+_session = None
+_clients = {}
+_registry_lock = threading.Lock()
+_thread_local = threading.local()
+# Tăng mỗi lần reset_clients: resource cache của mọi thread có generation cũ bị bỏ
+_generation = 0
 
 def get_aws_region():
     """Get AWS region from environment or default"""
     return os.environ.get('REGION', 'us-east-1')
 
-def get_boto3_client(service_name):
-    """Get boto3 client with proper region"""
-    region = get_aws_region()
-    
+def get_client_config():
+    """botocore Config with pooling, keepalive, adaptive retries and timeouts"""
+    return Config(
+        max_pool_connections=AWS_CLIENT_SETTINGS.get('max_pool_connections', 50),
+        tcp_keepalive=AWS_CLIENT_SETTINGS.get('tcp_keepalive', True),
+        retries={
+            'mode': AWS_CLIENT_SETTINGS.get('retry_mode', 'adaptive'),
+            'max_attempts': AWS_CLIENT_SETTINGS.get('max_attempts', 10)
+        },
+        connect_timeout=AWS_CLIENT_SETTINGS.get('connect_timeout', 5),
+        read_timeout=AWS_CLIENT_SETTINGS.get('read_timeout', 30)
+    )
+
+def get_session():
+    """Shared boto3 session - credentials are resolved once per process"""
+    global _session
+    if _session is None:
+        with _registry_lock:
+            if _session is None:
+                _session = boto3.session.Session()
+    return _session
+
+def get_boto3_client(service_name, region=None):
+    """Get shared boto3 client with proper region (clients are thread-safe)"""
+    region = region or get_aws_region()
+    key = (service_name, region)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
     # Amplify automatically provides AWS credentials via IAM role
     # No need to set AWS_ACCESS_KEY_ID or AWS_SECRET_ACCESS_KEY
+    session = get_session()
     try:
-        client = boto3.client(service_name, region_name=region)
+        with _registry_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = session.client(service_name, region_name=region, config=get_client_config())
+                _clients[key] = client
         return client
     except Exception as e:
         print(f"Error creating {service_name} client: {e}")
         return None
 
-def get_boto3_resource(service_name):
-    """Get boto3 resource with proper region"""
-    region = get_aws_region()
-    
+def get_boto3_resource(service_name, region=None):
+    """Get boto3 resource with proper region, cached per thread"""
+    region = region or get_aws_region()
+    key = (service_name, region)
+    resources = getattr(_thread_local, 'resources', None)
+    if resources is None or getattr(_thread_local, 'generation', None) != _generation:
+        resources = _thread_local.resources = {}
+        _thread_local.generation = _generation
+    if key in resources:
+        return resources[key]
+
+    session = get_session()
     try:
-        resource = boto3.resource(service_name, region_name=region)
+        # Session is not thread-safe while creating clients/resources
+        with _registry_lock:
+            resource = session.resource(service_name, region_name=region, config=get_client_config())
+        resources[key] = resource
         return resource
     except Exception as e:
         print(f"Error creating {service_name} resource: {e}")
         return None
 
+def reset_clients():
+    """Drop cached session, clients and every thread's resources (e.g. after credential rotation)"""
+    global _session, _generation
+    with _registry_lock:
+        _session = None
+        _clients.clear()
+        _generation += 1
+    _thread_local.resources = {}
+
 def setup_aws_environment():
     """Setup AWS environment for Amplify"""
     # Set AWS region if not already set
@@ -48,7 +125,7 @@ def setup_aws_environment():
 def check_aws_credentials():
     """Check if AWS credentials are available"""
     try:
-        sts = boto3.client('sts')
+        sts = get_boto3_client('sts')
         sts.get_caller_identity()
         return True
     except Exception:
@@ -4,99 +4,322 @@ Bulk Import/Export for License Data
 
 import csv
 import json
-from typing import List, Dict
+import os
+import queue
+import threading
+import time
+from itertools import zip_longest
+from typing import Callable, Iterable, List, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
 from license_tracker import LicenseTracker
 from data_validator import LicenseValidator
+from snapshot_cache import estimate_items_size
+from snapshot_io import count_snapshot_rows, iter_snapshot_batches, snapshot_frame, write_snapshot
+
+# Import pipeline settings (overridden by config/config.py if available)
+# Rows parsed and validated together
+IMPORT_CHUNK_ROWS = 50000
+# Rows buffered before each batched write to DynamoDB
+IMPORT_BATCH_SIZE = 500
+IMPORT_WRITE_WORKERS = 4
+# Ước lượng bộ nhớ tối đa của các batch đã parse nhưng chưa ghi xong
+IMPORT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+# Số thông báo lỗi giữ lại; lỗi sau đó chỉ được đếm
+IMPORT_MAX_ERRORS = 1000
+# Khoảng tối thiểu giữa hai lần gọi progress callback
+IMPORT_PROGRESS_INTERVAL = 0.5
+
+try:
+    from config.config import IMPORT_SETTINGS
+    IMPORT_CHUNK_ROWS = IMPORT_SETTINGS.get('chunk_rows', IMPORT_CHUNK_ROWS)
+    IMPORT_BATCH_SIZE = IMPORT_SETTINGS.get('batch_size', IMPORT_BATCH_SIZE)
+    IMPORT_WRITE_WORKERS = IMPORT_SETTINGS.get('write_workers', IMPORT_WRITE_WORKERS)
+    IMPORT_MAX_INFLIGHT_BYTES = IMPORT_SETTINGS.get('max_inflight_bytes', IMPORT_MAX_INFLIGHT_BYTES)
+    IMPORT_MAX_ERRORS = IMPORT_SETTINGS.get('max_errors', IMPORT_MAX_ERRORS)
+except ImportError:
+    pass
+
+REQUIRED_HEADERS = ['license_id', 'software_name', 'license_type', 'total_licenses', 'cost_per_license']
+IMPORT_COLUMNS = ['license_id', 'software_name', 'license_type', 'total_licenses', 'used_licenses',
+                  'cost_per_license', 'expiry_date', 'cost_center']
+
+
+def clean_chunk(chunk: pd.DataFrame, first_row: int, error_limit: int):
+    """Làm sạch + validate một chunk (cột text dạng str, cột số có thể đã là số) bằng mask
+
+    Same rules as the former per-row loop: unparsable total_licenses or
+    cost_per_license is an error, unparsable used_licenses becomes 0, rows
+    without license_id or software_name are skipped silently, remaining
+    rows go through LicenseValidator.validate_frame. Returns (records,
+    row_numbers, errors, error_count, skipped); at most error_limit messages
+    are formatted, error_count counts all of them.
+    """
+    rows = np.arange(first_row, first_row + len(chunk))
+    text = lambda column, default='': (chunk[column].str.strip() if column in chunk
+                                       else pd.Series(default, index=chunk.index))
+
+    cleaned = pd.DataFrame({
+        'license_id': text('license_id'),
+        'software_name': text('software_name'),
+        'license_type': text('license_type', 'SUBSCRIPTION').str.upper(),
+        'expiry_date': text('expiry_date'),
+        'cost_center': text('cost_center')
+    })
+
+    def number(column, default):
+        # Cột đã có kiểu số (snapshot Parquet/Arrow) không cần parse
+        if column in chunk and pd.api.types.is_numeric_dtype(chunk[column]):
+            return chunk[column].to_numpy(np.float64, na_value=np.nan)
+        return pd.to_numeric(text(column, default), errors='coerce').to_numpy(np.float64)
+
+    total = number('total_licenses', '0')
+    used = number('used_licenses', '0')
+    cost = number('cost_per_license', '0')
+
+    bad_total = ~np.isfinite(total)
+    bad_cost = ~bad_total & ~np.isfinite(cost)
+    total = np.trunc(np.where(bad_total, 0, total)).astype(np.int64)
+    used = np.trunc(np.where(np.isfinite(used), used, 0)).astype(np.int64)
+    skipped = ~(bad_total | bad_cost) & ((cleaned['license_id'] == '') | (cleaned['software_name'] == '')).to_numpy()
+
+    cleaned['total_licenses'] = total
+    cleaned['used_licenses'] = used
+    cleaned['cost_per_license'] = cost
+    validation = LicenseValidator.validate_frame(cleaned)
+    invalid = ~(bad_total | bad_cost | skipped) & ~validation.valid
+
+    failed = bad_total | bad_cost | invalid
+    errors = []
+    for i in np.flatnonzero(failed)[:error_limit]:
+        if bad_total[i]:
+            errors.append(f"Row {rows[i]}: Invalid total_licenses value: {chunk['total_licenses'].iat[i]}")
+        elif bad_cost[i]:
+            errors.append(f"Row {rows[i]}: Invalid cost_per_license value: {chunk['cost_per_license'].iat[i]}")
+        else:
+            errors.append(f"Row {rows[i]}: {', '.join(validation.messages(i))}")
+
+    valid = ~(failed | skipped)
+    # tolist() trả về kiểu Python sẵn; nhanh hơn nhiều so với DataFrame.to_dict('records')
+    columns = [cleaned[column].to_numpy()[valid].tolist() for column in IMPORT_COLUMNS]
+    records = [dict(zip(IMPORT_COLUMNS, values)) for values in zip(*columns)]
+    return records, rows[valid], errors, int(np.count_nonzero(failed)), int(np.count_nonzero(skipped))
+
+
+class _InflightBudget:
+    def __init__(self, limit: int):
+        """Giới hạn tổng bytes của các batch đang chờ/đang ghi (back-pressure cho reader)"""
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int):
+        with self._condition:
+            # Batch lớn hơn cả budget vẫn được đi khi không còn gì in flight
+            while self.used and self.used + size > self.limit:
+                self._condition.wait()
+            self.used += size
+
+    def release(self, size: int):
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
 
 class BulkImporter:
     def __init__(self):
         self.tracker = LicenseTracker()
         self.validator = LicenseValidator()
     
-    def import_from_csv(self, file_path: str) -> Dict:
-        """Import licenses from CSV"""
-        results = {'success': 0, 'errors': []}
+    def import_from_csv(self, file_path: str, progress_callback: Optional[Callable[[Dict], None]] = None,
+                        write_workers: int = IMPORT_WRITE_WORKERS) -> Dict:
+        """Import licenses from CSV qua pipeline streaming
+        
+        Chunks of IMPORT_CHUNK_ROWS rows are read and cleaned/validated on the
+        calling thread, split into IMPORT_BATCH_SIZE batches and handed to
+        write_workers threads through bounded queues. Rows with the same
+        license_id always go to the same writer, so the last row in the
+        file still wins. The reader blocks while the parsed-but-unwritten
+        batches exceed IMPORT_MAX_INFLIGHT_BYTES. progress_callback is
+        called on the calling thread with a snapshot of the counters.
+        """
+        total_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        handle = []
+        
+        def chunks():
+            with open(file_path, 'r', encoding='utf-8', newline='') as file:
+                handle.append(file)
+                yield from pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=IMPORT_CHUNK_ROWS)
+        
+        def bytes_read():
+            return handle[0].tell() if handle and not handle[0].closed else total_bytes
+        
+        return self._import_chunks(chunks(), progress_callback, write_workers, bytes_read, total_bytes)
+    
+    def import_snapshot(self, file_path: str, format: Optional[str] = None,
+                        progress_callback: Optional[Callable[[Dict], None]] = None,
+                        write_workers: int = IMPORT_WRITE_WORKERS) -> Dict:
+        """Import licenses từ snapshot Parquet/Arrow (export_snapshot) qua cùng pipeline với CSV
+        
+        Record batches are read one at a time and keep their types, so
+        numbers and dates skip the CSV parsing step; cleaning, validation,
+        error reporting and the concurrent writers are the same as
+        import_from_csv. Progress is reported in bytes proportional to the
+        rows read.
+        """
+        total_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        rows_read = [0, 0]
+        
+        def chunks():
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(file_path)
+            rows_read[1] = count_snapshot_rows(file_path, format)
+            for batch in iter_snapshot_batches(file_path, format, batch_rows=IMPORT_CHUNK_ROWS):
+                rows_read[0] += batch.num_rows
+                yield snapshot_frame(batch)
+        
+        def bytes_read():
+            return int(total_bytes * rows_read[0] / rows_read[1]) if rows_read[1] else total_bytes
+        
+        return self._import_chunks(chunks(), progress_callback, write_workers, bytes_read, total_bytes)
+    
+    def _import_chunks(self, chunks: Iterable[pd.DataFrame], progress_callback: Optional[Callable[[Dict], None]],
+                       write_workers: int, bytes_read: Callable[[], int], total_bytes: int) -> Dict:
+        """Clean/validate từng chunk trên thread gọi, ghi qua các writer thread"""
+        results = {'success': 0, 'errors': [], 'error_count': 0, 'rows_read': 0, 'skipped': 0,
+                   'errors_truncated': False}
         
         # Auto-create database table if not exists
         try:
             self.tracker.create_table_if_not_exists()
         except Exception as e:
             results['errors'].append(f"Database setup failed: {str(e)}")
+            results['error_count'] = 1
             return results
         
+        lock = threading.Lock()
+        budget = _InflightBudget(IMPORT_MAX_INFLIGHT_BYTES)
+        write_workers = max(1, int(write_workers))
+        queues = [queue.Queue(maxsize=2) for _ in range(write_workers)]
+        writers = [
+            threading.Thread(target=self._write_loop, args=(work, budget, lock, results),
+                             name=f"import-writer-{i}", daemon=True)
+            for i, work in enumerate(queues)
+        ]
+        for writer in writers:
+            writer.start()
+        
+        last_report = [0.0]
+        
+        def report(force=False):
+            if progress_callback is None or (not force and time.monotonic() - last_report[0] < IMPORT_PROGRESS_INTERVAL):
+                return
+            last_report[0] = time.monotonic()
+            with lock:
+                progress = {key: results[key] for key in ('success', 'error_count', 'rows_read', 'skipped')}
+            progress['bytes_read'] = bytes_read()
+            progress['total_bytes'] = total_bytes
+            progress_callback(progress)
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
+            first_row = 1
+            for chunk in chunks:
                 # Check if file has required headers
-                required_headers = ['license_id', 'software_name', 'license_type', 'total_licenses', 'cost_per_license']
-                if not all(header in reader.fieldnames for header in required_headers):
-                    results['errors'].append(f"Missing required headers. Expected: {required_headers}")
-                    return results
-                
-                for row_num, row in enumerate(reader, 1):
-                    try:
-                        # Clean and convert data
-                        cleaned_row = {}
-                        
-                        # String fields
-                        cleaned_row['license_id'] = str(row.get('license_id', '')).strip()
-                        cleaned_row['software_name'] = str(row.get('software_name', '')).strip()
-                        cleaned_row['license_type'] = str(row.get('license_type', 'SUBSCRIPTION')).strip().upper()
-                        cleaned_row['expiry_date'] = str(row.get('expiry_date', '')).strip()
-                        
-                        # Numeric fields with better error handling
-                        try:
-                            cleaned_row['total_licenses'] = int(float(str(row.get('total_licenses', 0)).strip()))
-                        except (ValueError, TypeError):
-                            results['errors'].append(f"Row {row_num}: Invalid total_licenses value: {row.get('total_licenses')}")
-                            continue
-                        
-                        try:
-                            cleaned_row['used_licenses'] = int(float(str(row.get('used_licenses', 0)).strip()))
-                        except (ValueError, TypeError):
-                            cleaned_row['used_licenses'] = 0
-                        
-                        try:
-                            cleaned_row['cost_per_license'] = float(str(row.get('cost_per_license', 0)).strip())
-                        except (ValueError, TypeError):
-                            results['errors'].append(f"Row {row_num}: Invalid cost_per_license value: {row.get('cost_per_license')}")
-                            continue
-                        
-                        # Skip empty rows
-                        if not cleaned_row['license_id'] or not cleaned_row['software_name']:
-                            continue
-                        
-                        # Validate data
-                        errors = self.validator.validate_license_data(cleaned_row)
-                        if errors:
-                            results['errors'].append(f"Row {row_num}: {', '.join(errors)}")
-                            continue
-                        
-                        # Add license
-                        try:
-                            if self.tracker.add_license(cleaned_row):
-                                results['success'] += 1
-                            else:
-                                results['errors'].append(f"Row {row_num}: Database error adding license {cleaned_row['license_id']}")
-                        except Exception as e:
-                            results['errors'].append(f"Row {row_num}: Exception adding license {cleaned_row['license_id']}: {str(e)}")
-                    
-                    except Exception as e:
-                        results['errors'].append(f"Row {row_num}: Processing error - {str(e)}")
-                        continue
-        
+                if first_row == 1 and not all(header in chunk.columns for header in REQUIRED_HEADERS):
+                    self._add_errors(results, lock, [f"Missing required headers. Expected: {REQUIRED_HEADERS}"], 1)
+                    break
+                with lock:
+                    error_limit = max(IMPORT_MAX_ERRORS - len(results['errors']), 0)
+                records, rows, errors, error_count, skipped = clean_chunk(chunk, first_row, error_limit)
+                first_row += len(chunk)
+                self._add_errors(results, lock, errors, error_count)
+                with lock:
+                    results['rows_read'] += len(chunk)
+                    results['skipped'] += skipped
+                self._dispatch(records, rows, queues, budget, report)
+                report()
         except FileNotFoundError:
-            results['errors'].append("File not found")
+            self._add_errors(results, lock, ["File not found"], 1)
         except UnicodeDecodeError:
-            results['errors'].append("File encoding error - try saving as UTF-8")
+            self._add_errors(results, lock, ["File encoding error - try saving as UTF-8"], 1)
         except Exception as e:
-            results['errors'].append(f"File error: {str(e)}")
-            import traceback
-            results['errors'].append(f"Traceback: {traceback.format_exc()}")
+            self._add_errors(results, lock, [f"File error: {str(e)}"], 1)
+        finally:
+            # Rows parsed before any file error are still written
+            for work in queues:
+                work.put(None)
+            for writer in writers:
+                writer.join()
         
+        results['errors_truncated'] = results['error_count'] > len(results['errors'])
+        report(force=True)
         return results
     
+    def _dispatch(self, records: List[Dict], rows: np.ndarray, queues: List[queue.Queue],
+                  budget: _InflightBudget, on_batch: Callable[[], None]):
+        """Chia record theo writer (hash license_id) rồi theo IMPORT_BATCH_SIZE, đưa vào queue"""
+        if not records:
+            return
+        ids = pd.Series([record['license_id'] for record in records])
+        owner = (pd.util.hash_pandas_object(ids, index=False).to_numpy() % np.uint64(len(queues))).astype(np.int64)
+        batches = [
+            [(worker, indices[start:start + IMPORT_BATCH_SIZE]) for start in range(0, len(indices), IMPORT_BATCH_SIZE)]
+            for worker, indices in ((worker, np.flatnonzero(owner == worker)) for worker in range(len(queues)))
+        ]
+        # Xen kẽ giữa các writer để một queue đầy không làm các writer khác ngồi chờ
+        for worker, selected in (task for round_ in zip_longest(*batches) for task in round_ if task):
+            batch = [records[i] for i in selected]
+            size = estimate_items_size(batch)
+            budget.acquire(size)
+            # Queue đầy thì chờ writer (back-pressure)
+            queues[worker].put((rows[selected], batch, size))
+            on_batch()
+    
+    def _write_loop(self, work: queue.Queue, budget: _InflightBudget, lock: threading.Lock, results: Dict):
+        while True:
+            task = work.get()
+            if task is None:
+                return
+            rows, batch, size = task
+            try:
+                self._write_batch(rows, batch, lock, results)
+            except Exception as e:
+                # Writer phải tiếp tục rút queue của mình, nếu không reader bị chặn mãi ở put()
+                errors = [f"Row {row_num}: Exception adding license {row['license_id']}: {str(e)}"
+                          for row_num, row in zip(rows, batch)]
+                self._add_errors(results, lock, errors, len(errors))
+            finally:
+                budget.release(size)
+    
+    def _write_batch(self, rows: np.ndarray, batch: List[Dict], lock: threading.Lock, results: Dict):
+        """Write queued rows with one batched call and record per-row outcomes"""
+        try:
+            outcome = self.tracker.add_licenses(batch)
+        except Exception as e:
+            errors = [f"Row {row_num}: Exception adding license {row['license_id']}: {str(e)}"
+                      for row_num, row in zip(rows, batch)]
+            self._add_errors(results, lock, errors, len(errors))
+            return
+        
+        errors = [
+            f"Row {rows[failure['index']]}: Database error adding license "
+            f"{batch[failure['index']]['license_id']}: {failure['error']}"
+            for failure in outcome['failed']
+        ]
+        with lock:
+            results['success'] += outcome['written']
+        self._add_errors(results, lock, errors, len(errors))
+    
+    @staticmethod
+    def _add_errors(results: Dict, lock: threading.Lock, errors: List[str], count: int):
+        with lock:
+            results['error_count'] += count
+            room = IMPORT_MAX_ERRORS - len(results['errors'])
+            if room > 0:
+                results['errors'].extend(errors[:room])
+    
     def export_to_csv(self, file_path: str) -> bool:
         """Export licenses to CSV"""
         # Auto-create database table if not exists
@@ -112,7 +335,8 @@ class BulkImporter:
             
             with open(file_path, 'w', newline='', encoding='utf-8') as file:
                 fieldnames = ['license_id', 'software_name', 'license_type', 
-                            'total_licenses', 'used_licenses', 'expiry_date', 'cost_per_license']
+                            'total_licenses', 'used_licenses', 'expiry_date', 'cost_per_license',
+                            'cost_center']
                 writer = csv.DictWriter(file, fieldnames=fieldnames)
                 writer.writeheader()
                 
@@ -139,4 +363,26 @@ class BulkImporter:
             print(f"Export error: {e}")
             import traceback
             print(f"Traceback: {traceback.format_exc()}")
-            return False
\ No newline at end of file
+            return False
+    
+    def export_snapshot(self, file_path: str, format: Optional[str] = None) -> bool:
+        """Export licenses ra snapshot Parquet/Arrow (định dạng theo format hoặc phần mở rộng)
+        
+        The typed, compressed snapshot can be re-imported with
+        import_snapshot or loaded for analysis with LicenseFrame.from_snapshot.
+        """
+        # Auto-create database table if not exists
+        try:
+            self.tracker.create_table_if_not_exists()
+        except Exception:
+            return False
+        
+        try:
+            licenses = self.tracker.get_all_licenses()
+            if not licenses:
+                return False
+            write_snapshot(licenses, file_path, format=format)
+            return True
+        except Exception as e:
+            print(f"Export error: {e}")
+            return False
@@ -11,82 +11,26 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from config.config import *
 from license_tracker import LicenseTracker
+from license_frame import LicenseFrame
+from portfolio_engine import PortfolioAnalysis, PortfolioEngine, analyze_portfolio
 
 class ComplianceChecker:
-    def __init__(self):
-        """Khởi tạo Compliance Checker"""
-        self.tracker = LicenseTracker()
+    def __init__(self, table_name: str = None, tracker: LicenseTracker = None):
+        """Khởi tạo Compliance Checker (table_name: bảng của tenant, mặc định DYNAMODB_TABLE_NAME; tracker: dùng chung tracker có sẵn)"""
+        self.tracker = tracker or LicenseTracker(table_name=table_name)
     
-    def check_compliance_status(self) -> Dict:
+    def check_compliance_status(self, portfolio: PortfolioAnalysis = None) -> Dict:
         """Kiểm tra trạng thái tuân thủ"""
-        licenses = self.tracker.get_all_licenses()
-        compliance_report = {
-            'total_licenses': len(licenses),
-            'compliant': [],
-            'warnings': [],
-            'violations': [],
-            'overall_status': 'COMPLIANT'
-        }
-        
-        for license in licenses:
-            license_status = self._check_single_license(license)
-            
-            if license_status['status'] == 'COMPLIANT':
-                compliance_report['compliant'].append(license_status)
-            elif license_status['status'] == 'WARNING':
-                compliance_report['warnings'].append(license_status)
-                if compliance_report['overall_status'] == 'COMPLIANT':
-                    compliance_report['overall_status'] = 'WARNING'
-            else:  # VIOLATION
-                compliance_report['violations'].append(license_status)
-                compliance_report['overall_status'] = 'VIOLATION'
-        
-        return compliance_report
+        portfolio = portfolio or PortfolioEngine(self.tracker).analyze()
+        return portfolio.compliance_report()
     
     def _check_single_license(self, license: Dict) -> Dict:
         """Kiểm tra một license cụ thể"""
-        status = {
-            'license_id': license['license_id'],
-            'software_name': license['software_name'],
-            'status': 'COMPLIANT',
-            'issues': []
-        }
-        
-        # Kiểm tra over-usage
-        usage_rate = license['used_licenses'] / license['total_licenses']
-        
-        if usage_rate > 1.0:  # Vượt quá 100%
-            status['status'] = 'VIOLATION'
-            status['issues'].append(f"Vượt quá license: {license['used_licenses']}/{license['total_licenses']}")
-        elif usage_rate > COMPLIANCE_THRESHOLDS['usage_critical']:
-            status['status'] = 'WARNING'
-            status['issues'].append(f"Sử dụng cao: {usage_rate:.1%}")
-        elif usage_rate > COMPLIANCE_THRESHOLDS['usage_warning']:
-            if status['status'] == 'COMPLIANT':
-                status['status'] = 'WARNING'
-            status['issues'].append(f"Cảnh báo sử dụng: {usage_rate:.1%}")
-        
-        # Kiểm tra expiry date
-        if license.get('expiry_date'):
-            try:
-                expiry = datetime.strptime(license['expiry_date'], '%Y-%m-%d')
-                days_until_expiry = (expiry - datetime.now()).days
-                
-                if days_until_expiry < 0:
-                    status['status'] = 'VIOLATION'
-                    status['issues'].append(f"License đã hết hạn {abs(days_until_expiry)} ngày - Cần mua license mới")
-                elif days_until_expiry <= COMPLIANCE_THRESHOLDS['expiry_warning_days']:
-                    if status['status'] == 'COMPLIANT':
-                        status['status'] = 'WARNING'
-                    status['issues'].append(f"Sắp hết hạn trong {days_until_expiry} ngày")
-            except:
-                status['issues'].append("Ngày hết hạn không hợp lệ")
-        
-        return status
+        return analyze_portfolio(LicenseFrame.from_licenses([license])).license_statuses()[0]
     
-    def generate_compliance_report(self) -> str:
+    def generate_compliance_report(self, portfolio: PortfolioAnalysis = None) -> str:
         """Tạo báo cáo tuân thủ"""
-        compliance_data = self.check_compliance_status()
+        compliance_data = self.check_compliance_status(portfolio)
         
         report = []
         report.append("=" * 60)
@@ -135,12 +79,12 @@ class ComplianceChecker:
         
         return "\n".join(report)
     
-    def save_compliance_report(self, filename: str = None):
+    def save_compliance_report(self, filename: str = None, portfolio: PortfolioAnalysis = None):
         """Lưu báo cáo tuân thủ"""
         if not filename:
             filename = f"compliance_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
-        report = self.generate_compliance_report()
+        report = self.generate_compliance_report(portfolio)
         
         try:
             with open(filename, 'w', encoding='utf-8') as f:
@@ -149,9 +93,9 @@ class ComplianceChecker:
         except Exception as e:
             print(f"❌ Lỗi lưu báo cáo: {e}")
     
-    def print_compliance_report(self):
+    def print_compliance_report(self, portfolio: PortfolioAnalysis = None):
         """In báo cáo tuân thủ"""
-        print(self.generate_compliance_report())
+        print(self.generate_compliance_report(portfolio))
 
 def main():
     """Test function"""
@@ -2,9 +2,63 @@
 Data Validation for License System
 """
 
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List
 
+VALID_LICENSE_TYPES = ['SUBSCRIPTION', 'PERPETUAL', 'CONCURRENT', 'NAMED_USER']
+
+# Bit lỗi của validate_frame, theo thứ tự thông báo của validate_license_data
+VALIDATION_ERRORS = (
+    ('missing_license_id', "Missing license_id"),
+    ('missing_software_name', "Missing software_name"),
+    ('missing_license_type', "Missing license_type"),
+    ('missing_total_licenses', "Missing total_licenses"),
+    ('invalid_license_type', f"Invalid license_type. Must be one of: {VALID_LICENSE_TYPES}"),
+    ('nonpositive_total', "total_licenses must be positive"),
+    ('invalid_used', "used_licenses must be a number"),
+    ('negative_used', "used_licenses cannot be negative"),
+    ('used_above_total', "used_licenses exceeds total_licenses"),
+    ('invalid_expiry_date', "expiry_date must be in YYYY-MM-DD format")
+)
+ERROR_BITS = {name: np.uint16(1 << bit) for bit, (name, _) in enumerate(VALIDATION_ERRORS)}
+# Over-allocation là trạng thái hợp lệ (được báo ở compliance/risk): chỉ cảnh báo, không loại dòng
+WARNING_MASK = ERROR_BITS['used_above_total']
+
+
+@dataclass(frozen=True)
+class FrameValidation:
+    """Kết quả validate_frame - bitmask lỗi theo dòng, cùng thứ tự với DataFrame đầu vào"""
+    errors: np.ndarray
+    valid: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    def has_error(self, name: str) -> np.ndarray:
+        return (self.errors & ERROR_BITS[name]) != 0
+
+    def messages(self, index: int) -> List[str]:
+        """Thông báo lỗi của một dòng (như validate_license_data)"""
+        code = int(self.errors[index])
+        return [message for bit, (_, message) in enumerate(VALIDATION_ERRORS) if code >> bit & 1]
+
+    def summary(self) -> Dict:
+        return {
+            'rows': len(self.errors),
+            'valid': int(np.count_nonzero(self.valid)),
+            'invalid': int(np.count_nonzero(~self.valid)),
+            'warnings': int(np.count_nonzero(self.errors & WARNING_MASK)),
+            'errors': {
+                name: count for name, count in
+                ((name, int(np.count_nonzero(self.has_error(name)))) for name, _ in VALIDATION_ERRORS)
+                if count
+            }
+        }
+
+
 class LicenseValidator:
     @staticmethod
     def validate_license_data(data: Dict) -> List[str]:
@@ -18,9 +72,8 @@ class LicenseValidator:
                 errors.append(f"Missing {field}")
         
         # Validate license type
-        valid_types = ['SUBSCRIPTION', 'PERPETUAL', 'CONCURRENT', 'NAMED_USER']
-        if data.get('license_type') not in valid_types:
-            errors.append(f"Invalid license_type. Must be one of: {valid_types}")
+        if data.get('license_type') not in VALID_LICENSE_TYPES:
+            errors.append(f"Invalid license_type. Must be one of: {VALID_LICENSE_TYPES}")
         
         # Validate numbers
         if data.get('total_licenses', 0) <= 0:
@@ -36,4 +89,63 @@ class LicenseValidator:
             except ValueError:
                 errors.append("expiry_date must be in YYYY-MM-DD format")
         
-        return errors
\ No newline at end of file
+        return errors
+    
+    @staticmethod
+    def validate_frame(df: pd.DataFrame) -> FrameValidation:
+        """Validate mọi dòng của DataFrame license bằng mask cột (không lặp theo dòng)
+        
+        Same checks as validate_license_data plus used_licenses above
+        total_licenses, reported as a warning only. Missing optional columns
+        (used_licenses, expiry_date) count as absent values.
+        """
+        n = len(df)
+        
+        def values(name):
+            # Mảng object (None = thiếu): so sánh numpy nhanh hơn các phép .str/isna của string dtype
+            if name not in df:
+                return np.full(n, None, dtype=object)
+            return df[name].to_numpy(dtype=object, na_value=None)
+        
+        def empty(array):
+            return (array == '') | (array == None)  # noqa: E711 - so sánh từng phần tử
+        
+        def numbers(name):
+            # Cột số (vd. sau khi import đã parse) không cần đi qua mảng object
+            if name in df and pd.api.types.is_numeric_dtype(df[name]):
+                array = df[name].to_numpy(np.float64, na_value=np.nan)
+                return array, np.isnan(array)
+            raw = values(name)
+            return pd.to_numeric(raw, errors='coerce').astype(np.float64), empty(raw)
+        
+        license_type = values('license_type')
+        total, _ = numbers('total_licenses')
+        used, used_missing = numbers('used_licenses')
+        
+        expiry = values('expiry_date')
+        has_expiry = ~empty(expiry)
+        invalid_expiry = np.zeros(n, dtype=bool)
+        invalid_expiry[has_expiry] = pd.isna(
+            pd.to_datetime(expiry[has_expiry], format='%Y-%m-%d', errors='coerce')
+        )
+        
+        masks = {
+            'missing_license_id': empty(values('license_id')),
+            'missing_software_name': empty(values('software_name')),
+            'missing_license_type': empty(license_type),
+            'missing_total_licenses': np.isnan(total) | (total == 0),
+            'invalid_license_type': ~pd.Series(license_type, dtype=object).isin(VALID_LICENSE_TYPES).to_numpy(),
+            'nonpositive_total': ~(total > 0),
+            'invalid_used': ~used_missing & np.isnan(used),
+            'negative_used': used < 0,
+            'used_above_total': used > total,
+            'invalid_expiry_date': invalid_expiry
+        }
+        errors = np.zeros(n, dtype=np.uint16)
+        for name, mask in masks.items():
+            errors |= np.where(mask, ERROR_BITS[name], np.uint16(0))
+        valid = (errors & ~WARNING_MASK) == 0
+        
+        for array in (errors, valid):
+            array.setflags(write=False)
+        return FrameValidation(errors=errors, valid=valid)
@@ -0,0 +1,243 @@
+"""
+License Frame - Dạng cột (columnar) của snapshot license
+Columnar view of a license snapshot shared by the analytics engines
+"""
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from snapshot_io import column_numbers, expiry_text, read_snapshot
+
+# Expiry thresholds in days (overridden by config/config.py if available)
+EXPIRY_CRITICAL_DAYS = 7
+EXPIRY_WARNING_DAYS = 30
+
+try:
+    from config.config import COMPLIANCE_THRESHOLDS
+    EXPIRY_CRITICAL_DAYS = COMPLIANCE_THRESHOLDS.get('expiry_critical_days', EXPIRY_CRITICAL_DAYS)
+    EXPIRY_WARNING_DAYS = COMPLIANCE_THRESHOLDS.get('expiry_warning_days', EXPIRY_WARNING_DAYS)
+except ImportError:
+    pass
+
+# Name of the view cached alongside each snapshot (LicenseTracker.get_snapshot_view)
+FRAME_VIEW_NAME = 'license_frame'
+
+SOURCE_COLUMNS = [
+    'license_id', 'software_name', 'license_type', 'total_licenses',
+    'used_licenses', 'cost_per_license', 'expiry_date'
+]
+
+# Cột snapshot Parquet/Arrow cần để build frame (bỏ qua timestamp, cost_center)
+ARROW_COLUMNS = [
+    'license_id', 'software_name', 'license_type', 'total_licenses',
+    'used_licenses', 'cost_per_license', 'expiry_date', 'expiry_date_unparsed'
+]
+
+_DAY_NS = np.int64(24 * 60 * 60 * 10**9)
+
+
+def parse_expiry_dates(values) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse chuỗi YYYY-MM-DD trong một lượt -> (datetime64[D], mask ngày không hợp lệ)
+
+    Empty/missing values become NaT without being flagged as invalid.
+    """
+    raw = pd.Series(values, dtype=object).fillna('').astype(str)
+    parsed = pd.to_datetime(raw, format='%Y-%m-%d', errors='coerce').to_numpy().astype('datetime64[D]')
+    invalid = (raw != '').to_numpy() & np.isnat(parsed)
+    return parsed, invalid
+
+
+@dataclass(frozen=True)
+class ExpiryClassification:
+    """Kết quả phân loại expiry cho từng license (các mask loại trừ lẫn nhau)
+
+    days_remaining follows timedelta.days (floored), so a license expiring
+    today counts as expired once the day has started; it is 0 where there is
+    no valid expiry date.
+    """
+    reference_time: datetime
+    days_remaining: np.ndarray
+    has_expiry: np.ndarray
+    invalid: np.ndarray
+    expired: np.ndarray
+    critical: np.ndarray
+    warning: np.ndarray
+    ok: np.ndarray
+
+    @property
+    def expiring(self) -> np.ndarray:
+        """Còn hạn nhưng trong ngưỡng cảnh báo (critical hoặc warning)"""
+        return self.critical | self.warning
+
+
+def classify_expiry(expiry_dates, now: Optional[datetime] = None, invalid: Optional[np.ndarray] = None,
+                    critical_days: int = EXPIRY_CRITICAL_DAYS,
+                    warning_days: int = EXPIRY_WARNING_DAYS) -> ExpiryClassification:
+    """Phân loại expired/critical/warning/ok so với một thời điểm tham chiếu cố định
+
+    expiry_dates is either a datetime64 array or raw date strings (parsed in
+    one pass); all rows are compared against the same reference time.
+    """
+    expiry_dates = np.asarray(expiry_dates)
+    if not np.issubdtype(expiry_dates.dtype, np.datetime64):
+        expiry_dates, parsed_invalid = parse_expiry_dates(expiry_dates)
+        invalid = parsed_invalid if invalid is None else invalid
+    if invalid is None:
+        invalid = np.zeros(len(expiry_dates), dtype=bool)
+
+    reference_time = now or datetime.now()
+    has_expiry = ~np.isnat(expiry_dates)
+    delta = (expiry_dates.astype('datetime64[ns]') - np.datetime64(reference_time, 'ns')).astype(np.int64)
+    days_remaining = np.where(has_expiry, np.floor_divide(delta, _DAY_NS), 0)
+
+    expired = has_expiry & (days_remaining < 0)
+    critical = has_expiry & ~expired & (days_remaining <= critical_days)
+    warning = has_expiry & ~expired & ~critical & (days_remaining <= warning_days)
+    ok = has_expiry & ~(expired | critical | warning)
+
+    return ExpiryClassification(
+        reference_time=reference_time,
+        days_remaining=days_remaining,
+        has_expiry=has_expiry,
+        invalid=invalid,
+        expired=expired,
+        critical=critical,
+        warning=warning,
+        ok=ok
+    )
+
+
+class LicenseFrame:
+    """Snapshot license dạng cột: mảng NumPy cho số lượng/chi phí, expiry đã parse sẵn
+
+    Costs are kept in integer cents so sums are exact; arrays are read-only
+    because one frame is shared by every caller of the same snapshot.
+    """
+
+    def __init__(self, license_id: np.ndarray, software_name: pd.Categorical,
+                 license_type: pd.Categorical, total_licenses: np.ndarray,
+                 used_licenses: np.ndarray, cost_cents: np.ndarray,
+                 expiry_date: np.ndarray, expiry_raw: np.ndarray):
+        self.license_id = license_id
+        self.software_name = software_name
+        self.license_type = license_type
+        self.total_licenses = total_licenses
+        self.used_licenses = used_licenses
+        self.cost_cents = cost_cents
+        self.expiry_date = expiry_date
+        self.expiry_raw = expiry_raw
+
+        # Cột dẫn xuất dùng chung cho mọi engine
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.usage_rate = np.where(total_licenses > 0, used_licenses / total_licenses, 0.0)
+        self.monthly_cost_cents = total_licenses * cost_cents
+        self.waste_cents = (total_licenses - used_licenses) * cost_cents
+        self.has_expiry = ~np.isnat(expiry_date)
+        self.expiry_invalid = (expiry_raw != '') & ~self.has_expiry
+
+        for array in (self.license_id, self.total_licenses, self.used_licenses, self.cost_cents,
+                      self.expiry_date, self.expiry_raw, self.usage_rate, self.monthly_cost_cents,
+                      self.waste_cents, self.has_expiry, self.expiry_invalid):
+            array.setflags(write=False)
+
+    @classmethod
+    def from_licenses(cls, licenses: List[Dict]) -> 'LicenseFrame':
+        """Build frame từ list license (dict DynamoDB/SQLite) trong một lượt"""
+        df = pd.DataFrame.from_records(licenses, columns=SOURCE_COLUMNS)
+
+        total = pd.to_numeric(df['total_licenses'], errors='coerce').fillna(0).to_numpy(np.int64)
+        used = pd.to_numeric(df['used_licenses'], errors='coerce').fillna(0).to_numpy(np.int64)
+        cost = pd.to_numeric(df['cost_per_license'], errors='coerce').fillna(0).to_numpy(np.float64)
+        cost_cents = np.rint(cost * 100).astype(np.int64)
+
+        expiry_raw = df['expiry_date'].fillna('').astype(str).to_numpy(dtype=object)
+        expiry_date, _ = parse_expiry_dates(expiry_raw)
+
+        return cls(
+            license_id=df['license_id'].astype(str).to_numpy(dtype=object),
+            software_name=pd.Categorical(df['software_name'].fillna('').astype(str)),
+            license_type=pd.Categorical(df['license_type'].fillna('').astype(str)),
+            total_licenses=total,
+            used_licenses=used,
+            cost_cents=cost_cents,
+            expiry_date=expiry_date,
+            expiry_raw=expiry_raw
+        )
+
+    @classmethod
+    def from_arrow(cls, table) -> 'LicenseFrame':
+        """Build frame từ Table snapshot (snapshot_io) mà không parse lại chuỗi
+
+        Dictionary-encoded names/types become Categoricals from their codes
+        (categories sorted as in from_licenses, so grouping order matches)
+        and date32 expiry is already typed. Costs are rounded to cents like
+        from_licenses.
+        """
+        def categorical(name):
+            values = pd.Categorical(table.column(name).to_pandas())
+            if values.isna().any():
+                values = values.add_categories([''] if '' not in values.categories else []).fillna('')
+            # bincount thay cho remove_unused_categories (tránh sort toàn bộ codes)
+            unused = np.bincount(values.codes, minlength=len(values.categories)) == 0
+            if unused.any():
+                values = values.remove_categories(values.categories[unused])
+            return values.reorder_categories(sorted(values.categories))
+
+        expiry = table.column('expiry_date')
+        unparsed = table.column('expiry_date_unparsed') if 'expiry_date_unparsed' in table.column_names else None
+        expiry_date = np.asarray(expiry.to_numpy(), dtype='datetime64[D]')
+
+        return cls(
+            license_id=np.asarray(table.column('license_id').to_numpy(), dtype=object),
+            software_name=categorical('software_name'),
+            license_type=categorical('license_type'),
+            total_licenses=column_numbers(table, 'total_licenses', np.int64),
+            used_licenses=column_numbers(table, 'used_licenses', np.int64),
+            cost_cents=np.rint(column_numbers(table, 'cost_per_license', np.float64) * 100).astype(np.int64),
+            expiry_date=expiry_date,
+            expiry_raw=expiry_text(expiry, unparsed)
+        )
+
+    @classmethod
+    def from_snapshot(cls, source, format: Optional[str] = None) -> 'LicenseFrame':
+        """Frame từ file snapshot Parquet/Arrow (path hoặc file-like), chỉ đọc các cột cần"""
+        return cls.from_arrow(read_snapshot(source, format=format, columns=ARROW_COLUMNS))
+
+    @classmethod
+    def from_tracker(cls, tracker, refresh: bool = False) -> 'LicenseFrame':
+        """Frame của snapshot hiện tại - chỉ build lại khi snapshot đổi"""
+        return tracker.get_snapshot_view(FRAME_VIEW_NAME, cls.from_licenses, refresh=refresh)
+
+    def __len__(self) -> int:
+        return len(self.license_id)
+
+    def names(self) -> np.ndarray:
+        """Tên phần mềm dạng mảng object (decode categorical một lần)"""
+        return np.asarray(self.software_name.categories, dtype=object)[self.software_name.codes]
+
+    def classify_expiry(self, now: Optional[datetime] = None, **thresholds) -> ExpiryClassification:
+        """Phân loại expiry toàn bộ frame so với một thời điểm tham chiếu"""
+        return classify_expiry(self.expiry_date, now=now, invalid=self.expiry_invalid, **thresholds)
+
+    @staticmethod
+    def to_money(cents) -> float:
+        """Cents -> đơn vị tiền (float)"""
+        return float(cents) / 100
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """DataFrame cho hiển thị/biểu đồ (chi phí đổi lại sang đơn vị tiền)"""
+        return pd.DataFrame({
+            'license_id': self.license_id,
+            'software_name': self.software_name,
+            'license_type': self.license_type,
+            'total_licenses': self.total_licenses,
+            'used_licenses': self.used_licenses,
+            'cost_per_license': self.cost_cents / 100,
+            'expiry_date': self.expiry_raw,
+            'usage_rate': self.usage_rate,
+            'total_cost': self.monthly_cost_cents / 100,
+            'waste_cost': self.waste_cents / 100
+        })
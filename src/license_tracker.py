@@ -10,9 +10,33 @@ from typing import Dict, List, Optional
 from decimal import Decimal
 import sys
 import os
+from .snapshot_cache import license_snapshot_cache
+from .storage_backends import (
+    StorageBackend, create_backend, SCAN_TOTAL_SEGMENTS, SCAN_MAX_WORKERS, USAGE_RATE_SCALE
+)
+from .usage_history import UsageHistoryStore, UsageSeries, DailyRollup, create_history_store
+from .anomaly_stream import ANOMALY_DETECTION_ENABLED, get_usage_anomaly_detector
+from .aggregation_cube import AggregationCube, cube_registry
 # Simple config without external dependencies
 DYNAMODB_TABLE_NAME = 'license_optimization_table'
 AWS_REGION = 'us-east-1'
+# Backend lưu trữ: 'dynamodb', 'sqlite' hoặc 'memory' (ghi đè bởi config/config.py nếu có)
+STORAGE_BACKEND = 'dynamodb'
+SQLITE_DB_PATH = 'data/licenses.db'
+# Ghi lịch sử used_licenses mỗi lần usage thay đổi
+USAGE_HISTORY_ENABLED = True
+
+try:
+    from config.config import STORAGE_BACKEND, SQLITE_DB_PATH
+except ImportError:
+    pass
+try:
+    from config.config import USAGE_HISTORY_SETTINGS
+    USAGE_HISTORY_ENABLED = USAGE_HISTORY_SETTINGS.get('enabled', USAGE_HISTORY_ENABLED)
+except ImportError:
+    pass
+if not os.path.isabs(SQLITE_DB_PATH):
+    SQLITE_DB_PATH = os.path.join(os.path.dirname(__file__), '..', SQLITE_DB_PATH)
 
 try:
     from .logger import LicenseLogger
@@ -20,61 +44,102 @@ except:
     class LicenseLogger:
         def info(self, msg): print(f"INFO: {msg}")
         def error(self, msg): print(f"ERROR: {msg}")
+        def warning(self, msg): print(f"WARNING: {msg}")
 
 class LicenseTracker:
-    def __init__(self):
-        """Khởi tạo License Tracker"""
-        # Use default boto3 for EC2 deployment
-        self.dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-        self.table_name = DYNAMODB_TABLE_NAME
+    def __init__(self, backend=None, scan_segments: int = SCAN_TOTAL_SEGMENTS, scan_workers: int = SCAN_MAX_WORKERS,
+                 history=None, table_name: Optional[str] = None):
+        """Khởi tạo License Tracker
+        
+        backend: instance StorageBackend hoặc tên ('dynamodb', 'sqlite', 'memory');
+        mặc định lấy từ STORAGE_BACKEND.
+        history: UsageHistoryStore; mặc định là store đi cùng backend
+        (None khi USAGE_HISTORY_ENABLED tắt).
+        table_name: bảng của tenant/business unit (mặc định DYNAMODB_TABLE_NAME);
+        với sqlite là file <table_name>.db cạnh SQLITE_DB_PATH.
+        """
+        self.table_name = table_name or DYNAMODB_TABLE_NAME
         self.logger = LicenseLogger()
+        if isinstance(backend, StorageBackend):
+            self.backend = backend
+        else:
+            sqlite_path = SQLITE_DB_PATH
+            if table_name and table_name != DYNAMODB_TABLE_NAME:
+                sqlite_path = os.path.join(os.path.dirname(SQLITE_DB_PATH), f"{table_name}.db")
+            self.backend = create_backend(
+                backend or STORAGE_BACKEND, self.logger,
+                table_name=self.table_name, region=AWS_REGION, sqlite_path=sqlite_path,
+                scan_segments=scan_segments, scan_workers=scan_workers
+            )
+        if isinstance(history, UsageHistoryStore):
+            self.history = history
+        else:
+            self.history = create_history_store(self.backend, self.logger) if USAGE_HISTORY_ENABLED else None
         
-    def create_table_if_not_exists(self):
+    def _table_key(self) -> tuple:
+        """Key dùng cho snapshot cache"""
+        return self.backend.cache_key()
+    
+    def _anomaly_detector(self):
+        """Detector anomaly của bảng này; kho in-memory không lưu state ra đĩa"""
+        persist = self.backend.name != 'memory' and getattr(self.backend, 'db_path', None) != ':memory:'
+        return get_usage_anomaly_detector(self._table_key(), persist=persist)
+    
+    def create_table_if_not_exists(self) -> bool:
         """Tạo bảng DynamoDB nếu chưa tồn tại"""
+        return self.ensure_table_ready()
+    
+    def ensure_table_ready(self, refresh: bool = False) -> bool:
+        """Đảm bảo bảng tồn tại; kết quả được cache một lần cho mỗi process"""
         try:
-            table = self.dynamodb.create_table(
-                TableName=self.table_name,
-                KeySchema=[
-                    {'AttributeName': 'license_id', 'KeyType': 'HASH'}
-                ],
-                AttributeDefinitions=[
-                    {'AttributeName': 'license_id', 'AttributeType': 'S'}
-                ],
-                BillingMode='PAY_PER_REQUEST' 
-            )
-            table.wait_until_exists()
-            pass
+            self.backend.ensure_ready(refresh=refresh)
+            return True
         except Exception as e:
-            if 'ResourceInUseException' in str(e):
-                pass
-            else:
-                pass
+            self.logger.error(f"Table readiness check failed: {e}")
+            return False
+    
+    def refresh_table_status(self) -> bool:
+        """Bỏ cache trạng thái bảng và kiểm tra lại"""
+        return self.ensure_table_ready(refresh=True)
+    
+    def get_table_description(self) -> Optional[Dict]:
+        """Thông tin bảng đã cache (None nếu bảng chưa được kiểm tra)"""
+        return self.backend.describe()
+    
+    def _build_item(self, license_data: Dict) -> Dict:
+        """Chuẩn hóa dữ liệu license thành item DynamoDB"""
+        item = {
+            'license_id': license_data['license_id'],
+            'software_name': license_data['software_name'],
+            'license_type': license_data['license_type'],
+            'total_licenses': int(license_data['total_licenses']),
+            'used_licenses': int(license_data.get('used_licenses', 0)),
+            'cost_per_license': Decimal(str(license_data.get('cost_per_license', 0))),
+            'created_date': datetime.now().isoformat(),
+            'last_updated': datetime.now().isoformat()
+        }
+        # Key của GSI không được là chuỗi rỗng: license vĩnh viễn không có expiry_date
+        expiry_date = str(license_data.get('expiry_date') or '').strip()
+        if expiry_date:
+            item['expiry_date'] = expiry_date
+            item['expiry_month'] = expiry_date[:7]
+        cost_center = str(license_data.get('cost_center') or '').strip()
+        if cost_center:
+            item['cost_center'] = cost_center
+        return item
     
     def add_license(self, license_data: Dict) -> bool:
         """Thêm license mới"""
-        # Auto-create table if not exists
-        try:
-            self.create_table_if_not_exists()
-        except Exception:
-            pass
-            
+        self.ensure_table_ready()
+        
         try:
-            table = self.dynamodb.Table(self.table_name)
-            
             # Chuẩn bị dữ liệu
-            item = {
-                'license_id': license_data['license_id'],
-                'software_name': license_data['software_name'],
-                'license_type': license_data['license_type'],
-                'total_licenses': int(license_data['total_licenses']),
-                'used_licenses': int(license_data.get('used_licenses', 0)),
-                'expiry_date': license_data.get('expiry_date', ''),
-                'cost_per_license': Decimal(str(license_data.get('cost_per_license', 0))),
-                'created_date': datetime.now().isoformat(),
-                'last_updated': datetime.now().isoformat()
-            }
+            item = self._build_item(license_data)
             
-            table.put_item(Item=item)
+            self.backend.put_item(item)
+            self._invalidate_snapshot()
+            self._update_cube(lambda cube: cube.apply(item))
+            self._record_usage([(item['license_id'], item['last_updated'], item['used_licenses'])])
             self.logger.info(f"Added license: {license_data['software_name']}")
             return True
             
@@ -82,61 +147,332 @@ class LicenseTracker:
             self.logger.error(f"Failed to add license: {e}")
             return False
     
-    def get_all_licenses(self) -> List[Dict]:
-        """Lấy tất cả license"""
-        # Auto-create table if not exists
+    def add_licenses(self, licenses: List[Dict]) -> Dict:
+        """Thêm nhiều license (DynamoDB: BatchWriteItem 25 item/request)
+        
+        Trả về {'written': số item ghi thành công,
+                'outcomes': list True/False theo thứ tự đầu vào,
+                'failed': [{'index', 'license_id', 'error'}]}
+        """
+        results = {'written': 0, 'outcomes': [False] * len(licenses), 'failed': []}
+        if not licenses:
+            return results
+        
+        self.ensure_table_ready()
+        
+        # Chuẩn bị item; item lỗi được báo ngay, không gửi xuống backend
+        prepared = []
+        for index, license_data in enumerate(licenses):
+            try:
+                prepared.append((index, self._build_item(license_data)))
+            except Exception as e:
+                results['failed'].append({
+                    'index': index,
+                    'license_id': license_data.get('license_id') if isinstance(license_data, dict) else None,
+                    'error': f"Invalid license data: {e}"
+                })
+        
         try:
-            self.create_table_if_not_exists()
-        except Exception:
-            pass
-            
+            errors = self.backend.put_items(prepared)
+        except Exception as e:
+            self.logger.error(f"Batch write failed: {e}")
+            errors = {index: str(e) for index, _ in prepared}
+        
+        for index, item in prepared:
+            error = errors.get(index)
+            if error:
+                results['failed'].append({'index': index, 'license_id': item['license_id'], 'error': error})
+            else:
+                results['outcomes'][index] = True
+                results['written'] += 1
+        
+        results['failed'].sort(key=lambda f: f['index'])
+        if results['written']:
+            self._invalidate_snapshot()
+            written = [item for index, item in prepared if results['outcomes'][index]]
+            self._update_cube(lambda cube: [cube.apply(item) for item in written])
+            self._record_usage([
+                (item['license_id'], item['last_updated'], item['used_licenses'])
+                for item in written
+            ])
+        self.logger.info(f"Batch added {results['written']}/{len(licenses)} licenses")
+        return results
+    
+    def get_all_licenses(self, refresh: bool = False) -> List[Dict]:
+        """Lấy tất cả license (qua snapshot cache dùng chung, refresh=True để đọc lại từ backend)"""
+        self.ensure_table_ready()
+        
         try:
-            table = self.dynamodb.Table(self.table_name)
-            response = table.scan()
-            return response.get('Items', [])
+            if refresh:
+                self._invalidate_snapshot()
+            return license_snapshot_cache.get(self._table_key(), self.backend.scan_all)
         except Exception as e:
+            self.logger.error(f"Failed to scan licenses: {e}")
             return []
     
-    def update_usage(self, license_id: str, used_licenses: int) -> bool:
-        """Cập nhật số lượng license đang sử dụng"""
-        # Auto-create table if not exists
+    def get_snapshot_view(self, name: str, builder, refresh: bool = False):
+        """Dạng dẫn xuất của snapshot (vd. LicenseFrame), build một lần cho mỗi snapshot
+        
+        builder nhận list license và trả về view; view bị bỏ cùng snapshot khi có ghi.
+        """
+        self.ensure_table_ready()
+        if refresh:
+            self._invalidate_snapshot()
+        return license_snapshot_cache.get_derived(self._table_key(), name, builder, self.backend.scan_all)
+    
+    def data_version(self) -> tuple:
+        """Version của dữ liệu - đổi sau mỗi lần ghi qua tracker và mỗi lần đọc refresh=True
+        
+        A mutation counter, not a load counter: a TTL reload of the snapshot
+        keeps it, it holds for snapshots too large to cache, and reading it
+        never scans. Writes from other processes show up after the next
+        refresh=True read.
+        """
+        key = self._table_key()
+        return key, license_snapshot_cache.generation(key)
+    
+    def _invalidate_snapshot(self):
+        """Bỏ snapshot cache và tăng data version sau mỗi lần ghi"""
+        license_snapshot_cache.invalidate(self._table_key())
+    
+    def get_aggregation_cube(self, refresh: bool = False) -> AggregationCube:
+        """Cube rollup theo license_type/vendor/expiry_month/cost_center
+        
+        Build một lần từ snapshot, sau đó được cập nhật tăng dần khi ghi qua tracker.
+        """
+        return cube_registry.get(self._table_key(), self.get_all_licenses, refresh=refresh)
+    
+    def get_rollup(self, by=('license_type',), filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Spend/waste/seat/utilization gộp theo các chiều by (drill-down bằng filters)"""
         try:
-            self.create_table_if_not_exists()
-        except Exception:
-            pass
-            
+            return self.get_aggregation_cube().rollup(by, filters)
+        except Exception as e:
+            self.logger.error(f"Failed to query aggregation cube: {e}")
+            return []
+    
+    def _update_cube(self, apply):
+        """Áp thay đổi vào cube nếu cube đã được build; cube đang build dở sẽ không được cache"""
+        cube = cube_registry.changed(self._table_key())
+        if cube is None:
+            return
         try:
-            table = self.dynamodb.Table(self.table_name)
-            table.update_item(
-                Key={'license_id': license_id},
-                UpdateExpression='SET used_licenses = :used, last_updated = :updated',
-                ExpressionAttributeValues={
-                    ':used': used_licenses,
-                    ':updated': datetime.now().isoformat()
-                }
+            apply(cube)
+        except Exception as e:
+            # Cube lệch dữ liệu: bỏ để lần đọc sau build lại từ snapshot
+            cube_registry.invalidate(self._table_key())
+            self.logger.error(f"Failed to update aggregation cube: {e}")
+    
+    def get_license(self, license_id: str) -> Optional[Dict]:
+        """Lấy một license theo license_id (DynamoDB: GetItem)"""
+        self.ensure_table_ready()
+        
+        try:
+            return self.backend.get_item(license_id)
+        except Exception as e:
+            self.logger.error(f"Failed to get license {license_id}: {e}")
+            return None
+    
+    def get_licenses(self, license_ids: List[str]) -> List[Dict]:
+        """Lấy nhiều license (DynamoDB: BatchGetItem 100 key/request), giữ thứ tự đầu vào"""
+        unique_ids = list(dict.fromkeys(license_ids))
+        if not unique_ids:
+            return []
+        
+        self.ensure_table_ready()
+        
+        try:
+            found = {item['license_id']: item for item in self.backend.get_items(unique_ids)}
+        except Exception as e:
+            self.logger.error(f"Batch get failed: {e}")
+            return []
+        
+        return [found[license_id] for license_id in unique_ids if license_id in found]
+    
+    def licenses_expiring_between(self, start, end) -> List[Dict]:
+        """License có expiry_date trong khoảng [start, end] (date hoặc chuỗi YYYY-MM-DD)"""
+        start = start if isinstance(start, str) else start.strftime('%Y-%m-%d')
+        end = end if isinstance(end, str) else end.strftime('%Y-%m-%d')
+        if start > end:
+            return []
+        
+        self.ensure_table_ready()
+        
+        try:
+            items = self.backend.query_expiring(start, end)
+        except Exception as e:
+            self.logger.error(f"Failed to query expiring licenses: {e}")
+            return []
+        
+        if items is None:
+            # Bảng cũ chưa có GSI: lọc trên snapshot
+            items = sorted(
+                (l for l in self.get_all_licenses() if start <= (l.get('expiry_date') or '') <= end),
+                key=lambda l: l['expiry_date']
             )
+        return items
+    
+    def licenses_for_software(self, software_name: str) -> List[Dict]:
+        """Tất cả license của một phần mềm"""
+        self.ensure_table_ready()
+        
+        try:
+            items = self.backend.query_software(software_name)
+        except Exception as e:
+            self.logger.error(f"Failed to query licenses for {software_name}: {e}")
+            return []
+        
+        if items is None:
+            items = [l for l in self.get_all_licenses() if l.get('software_name') == software_name]
+        return items
+    
+    def scan_all(self) -> List[Dict]:
+        """Đọc toàn bộ license trực tiếp từ backend (bỏ qua snapshot cache)"""
+        return self.backend.scan_all()
+    
+    def update_usage(self, license_id: str, used_licenses: int) -> bool:
+        """Cập nhật số lượng license đang sử dụng; False nếu license không tồn tại"""
+        self.ensure_table_ready()
+        
+        try:
+            updated_at = datetime.now().isoformat()
+            updated = self.backend.update_usage(license_id, used_licenses, updated_at)
+            if updated is None:
+                self.logger.warning(f"Usage update skipped, license not found: {license_id}")
+                return False
+            self._invalidate_snapshot()
+            self._update_cube(lambda cube: cube.apply(updated))
+            self._record_usage([(license_id, updated_at, int(used_licenses))])
             self.logger.info(f"Updated usage for license: {license_id}")
             return True
         except Exception as e:
             self.logger.error(f"Failed to update usage: {e}")
             return False
     
+    def increment_usage(self, license_id: str, delta: int = 1) -> Optional[int]:
+        """Tăng used_licenses thêm delta trong một round trip, không cần đọc trước
+        
+        Trả về used_licenses mới, hoặc None nếu license không tồn tại / vượt total_licenses.
+        """
+        return self._adjust_usage(license_id, delta)
+    
+    def decrement_usage(self, license_id: str, delta: int = 1) -> Optional[int]:
+        """Giảm used_licenses đi delta; None nếu kết quả nhỏ hơn 0"""
+        return self._adjust_usage(license_id, -delta)
+    
+    def _adjust_usage(self, license_id: str, delta: int) -> Optional[int]:
+        self.ensure_table_ready()
+        
+        try:
+            updated_at = datetime.now().isoformat()
+            used = self.backend.adjust_usage(license_id, int(delta), updated_at)
+        except Exception as e:
+            self.logger.error(f"Failed to adjust usage for {license_id}: {e}")
+            return None
+        
+        if used is None:
+            self.logger.error(f"Usage change {delta:+d} rejected for license: {license_id}")
+            return None
+        self._invalidate_snapshot()
+        self._update_cube(lambda cube: cube.set_usage(license_id, used))
+        self._record_usage([(license_id, updated_at, used)])
+        return used
+    
     def delete_license(self, license_id: str) -> bool:
         """Xóa license"""
-        # Auto-create table if not exists
-        try:
-            self.create_table_if_not_exists()
-        except Exception:
-            pass
-            
+        self.ensure_table_ready()
+        
         try:
-            table = self.dynamodb.Table(self.table_name)
-            table.delete_item(Key={'license_id': license_id})
+            self.backend.delete_item(license_id)
+            self._invalidate_snapshot()
+            self._update_cube(lambda cube: cube.remove(license_id))
+            if ANOMALY_DETECTION_ENABLED:
+                self._anomaly_detector().forget(license_id)
             self.logger.info(f"Deleted license: {license_id}")
             return True
         except Exception as e:
             self.logger.error(f"Failed to delete license: {e}")
             return False
+    
+    def _record_usage(self, records: List[tuple]):
+        """Ghi điểm lịch sử và đưa event vào anomaly detector sau khi license đã được ghi
+        
+        Lỗi ở history/detector không làm hỏng lần ghi license.
+        """
+        if not records:
+            return
+        if self.history is not None:
+            try:
+                self.history.append(records)
+            except Exception as e:
+                self.logger.error(f"Failed to record usage history: {e}")
+        if ANOMALY_DETECTION_ENABLED:
+            try:
+                for anomaly in self._anomaly_detector().observe_many(records):
+                    self.logger.info(f"Usage anomaly {anomaly['anomaly_type']} on {anomaly['license_id']}: {anomaly['description']}")
+            except Exception as e:
+                self.logger.error(f"Failed to score usage update: {e}")
+    
+    def get_usage_history(self, license_id: str, start=None, end=None) -> Optional[UsageSeries]:
+        """Điểm used_licenses raw của một license trong khoảng [start, end]"""
+        if self.history is None:
+            return None
+        try:
+            return self.history.query(license_id, start, end)
+        except Exception as e:
+            self.logger.error(f"Failed to query usage history for {license_id}: {e}")
+            return None
+    
+    def get_daily_usage(self, license_id: str, start=None, end=None) -> Optional[DailyRollup]:
+        """Rollup ngày (max/avg/last used) của một license - đọc rẻ cho khoảng dài"""
+        if self.history is None:
+            return None
+        try:
+            return self.history.daily_rollup(license_id, start, end)
+        except Exception as e:
+            self.logger.error(f"Failed to query daily usage for {license_id}: {e}")
+            return None
+    
+    def get_daily_usage_all(self, start=None, end=None):
+        """Rollup ngày của mọi license (DataFrame), None nếu không có history"""
+        if self.history is None:
+            return None
+        try:
+            return self.history.daily_rollups(start, end)
+        except Exception as e:
+            self.logger.error(f"Failed to query daily usage: {e}")
+            return None
+    
+    def get_usage_anomalies(self, since: Optional[str] = None) -> List[Dict]:
+        """Anomaly do detector online phát hiện trên các lần ghi usage (mới nhất trước)"""
+        if not ANOMALY_DETECTION_ENABLED:
+            return []
+        try:
+            return self._anomaly_detector().recent_anomalies(since)
+        except Exception as e:
+            self.logger.error(f"Failed to read usage anomalies: {e}")
+            return []
+    
+    def get_portfolio_summary(self) -> Optional[Dict[str, int]]:
+        """Counter tổng hợp của portfolio (duy trì khi ghi) - một lần đọc, không scan"""
+        self.ensure_table_ready()
+        
+        try:
+            return self.backend.get_summary()
+        except Exception as e:
+            self.logger.error(f"Failed to read portfolio summary: {e}")
+            return None
+    
+    def rebuild_portfolio_summary(self) -> Optional[Dict[str, int]]:
+        """Tính lại summary từ toàn bộ license (sau khi sửa dữ liệu ngoài tracker)"""
+        self.ensure_table_ready()
+        
+        try:
+            counters = self.backend.rebuild_summary()
+            self.logger.info(f"Rebuilt portfolio summary: {counters.get('license_count', 0)} licenses")
+            return counters
+        except Exception as e:
+            self.logger.error(f"Failed to rebuild portfolio summary: {e}")
+            return None
 
 def main():
     """Hàm chính để test"""
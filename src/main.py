@@ -13,6 +13,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from license_tracker import LicenseTracker
 from usage_analyzer import UsageAnalyzer
 from compliance_checker import ComplianceChecker
+from portfolio_engine import PortfolioEngine
 
 class LicenseOptimizationSystem:
     def __init__(self):
@@ -72,13 +73,16 @@ class LicenseOptimizationSystem:
         print("📅 KIỂM TRA HÀNG NGÀY")
         print("=" * 50)
         
+        # Một lần scan + một lượt phân tích cho mọi báo cáo bên dưới
+        portfolio = PortfolioEngine(self.tracker).analyze(refresh=True)
+        
         # Kiểm tra compliance
         print("1. Kiểm tra tuân thủ...")
-        self.compliance.print_compliance_report()
+        self.compliance.print_compliance_report(portfolio)
         
         # Phân tích usage
         print("\n2. Phân tích sử dụng...")
-        self.analyzer.print_analysis_report()
+        self.analyzer.print_analysis_report(portfolio)
         
         # Lưu báo cáo
         print("\n3. Lưu báo cáo...")
@@ -86,7 +90,7 @@ class LicenseOptimizationSystem:
         reports_dir = os.path.join(os.path.dirname(__file__), '..', 'reports')
         os.makedirs(reports_dir, exist_ok=True)
         report_path = os.path.join(reports_dir, f"compliance_{timestamp}.txt")
-        self.compliance.save_compliance_report(report_path)
+        self.compliance.save_compliance_report(report_path, portfolio)
         
     def interactive_menu(self):
         """Menu tương tác"""
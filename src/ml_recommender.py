@@ -2,139 +2,169 @@
 Machine Learning Recommender for License Optimization
 """
 
+import hashlib
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from license_tracker import LicenseTracker
+from license_frame import LicenseFrame
+from portfolio_engine import PortfolioAnalysis, PortfolioEngine
+from snapshot_cache import forecast_result_cache
+from usage_forecast import (
+    UsageForecast, usage_matrix, holt_forecast, forecast_record, FORECAST_HISTORY_DAYS
+)
+from rightsizing import (
+    RightsizingPlan, optimize_seats, per_type_values,
+    RIGHTSIZING_HEADROOM, RIGHTSIZING_SEAT_INCREMENT, RIGHTSIZING_MIN_SEATS, RIGHTSIZING_MONTHLY_BUDGET
+)
 
 class MLRecommender:
     def __init__(self):
         self.tracker = LicenseTracker()
     
     def predict_usage_trend(self, license_id: str, days_ahead: int = 30) -> Dict:
-        """Dự đoán xu hướng sử dụng license"""
-        # Simplified ML prediction - trong thực tế sẽ dùng historical data
-        licenses = self.tracker.get_all_licenses()
-        license_data = next((l for l in licenses if l['license_id'] == license_id), None)
-        
-        if not license_data:
+        """Dự đoán xu hướng sử dụng một license (chỉ đọc license đó và rollup ngày của nó)
+
+        Same model as the portfolio forecast - rows are fitted independently,
+        so this matches forecast_usage for the license - without building the
+        whole portfolio.
+        """
+        license = self.tracker.get_license(license_id)
+        if license is None:
             return {'error': 'License not found'}
         
-        current_usage = float(str(license_data['used_licenses']))
-        total_licenses = float(str(license_data['total_licenses']))
-        usage_rate = current_usage / total_licenses
+        end = datetime.now().strftime('%Y-%m-%d')
+        start = (datetime.now() - timedelta(days=FORECAST_HISTORY_DAYS)).strftime('%Y-%m-%d')
+        rollup = self.tracker.get_daily_usage(license_id, start=start, end=end)
+        matrix, observed = usage_matrix(rollup.to_dataframe() if rollup is not None else None,
+                                        [license_id], end=end, days=FORECAST_HISTORY_DAYS)
+        forecast = holt_forecast(matrix, days_ahead, license_ids=[license_id],
+                                 fallback=np.array([int(license.get('used_licenses', 0))]), observed=observed)
+        return forecast_record(forecast, 0, days_ahead, int(license['total_licenses']))
+    
+    def forecast_usage(self, days_ahead: int = 30, history: Optional[pd.DataFrame] = None,
+                       history_days: int = FORECAST_HISTORY_DAYS) -> UsageForecast:
+        """Dự báo used_licenses cho mọi license trong một lượt vectorized
         
-        # Simple trend prediction based on current usage pattern
-        if usage_rate < 0.3:
-            trend = 'decreasing'
-            predicted_change = -5
-        elif usage_rate > 0.8:
-            trend = 'increasing'
-            predicted_change = 10
+        history is a long DataFrame (license_id, day, max_used) - e.g. daily
+        rollups rebuilt from backups, daily reports or imported usage CSVs;
+        by default the tracker's usage history is used. Rows follow the
+        current LicenseFrame. Results are cached until the data version (or
+        the supplied history) changes.
+        """
+        return self._portfolio_forecast(days_ahead, history, history_days)[1]
+    
+    def _portfolio_forecast(self, days_ahead: int, history: Optional[pd.DataFrame] = None,
+                            history_days: int = FORECAST_HISTORY_DAYS) -> Tuple[LicenseFrame, UsageForecast]:
+        """(frame, forecast) cache cùng nhau - số seat/chi phí luôn khớp hàng của dự báo"""
+        if history is None:
+            # Lịch sử của tracker kết thúc hôm nay; ngày không có điểm giữ giá trị trước đó
+            end = datetime.now().strftime('%Y-%m-%d')
+            key = ('usage_forecast', self.tracker.data_version(), end, days_ahead, history_days)
+            load = lambda: self.tracker.get_daily_usage_all(
+                start=(datetime.now() - timedelta(days=history_days)).strftime('%Y-%m-%d'), end=end
+            )
         else:
-            trend = 'stable'
-            predicted_change = 2
+            end = None
+            hashed = pd.util.hash_pandas_object(history, index=False).to_numpy()
+            fingerprint = hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+            key = ('usage_forecast', self.tracker.data_version(), days_ahead, history_days, fingerprint)
+            load = lambda: history
         
-        predicted_usage = min(total_licenses, max(0, current_usage + predicted_change))
+        def compute():
+            frame = LicenseFrame.from_tracker(self.tracker)
+            matrix, observed = usage_matrix(load(), frame.license_id, end=end, days=history_days)
+            forecast = holt_forecast(matrix, days_ahead, license_ids=frame.license_id,
+                                     fallback=frame.used_licenses, observed=observed)
+            return frame, forecast
         
-        return {
-            'license_id': license_id,
-            'current_usage': current_usage,
-            'predicted_usage': predicted_usage,
-            'trend': trend,
-            'confidence': 0.75,
-            'days_ahead': days_ahead
-        }
+        return forecast_result_cache.get_or_compute(key, compute)
     
-    def get_cost_optimization_recommendations(self) -> List[Dict]:
-        """Đề xuất tối ưu hóa chi phí dựa trên ML"""
+    def optimize_rightsizing(self, budget: Optional[float] = None, days_ahead: int = 30,
+                             headroom: Optional[float] = None) -> Tuple[LicenseFrame, UsageForecast, RightsizingPlan]:
+        """Chọn số seat cho mọi license cùng lúc (ngân sách tháng, headroom, bước mua)
+        
+        Demand per license is the upper prediction bound of the usage
+        forecast days_ahead out where there is enough history, otherwise the
+        current usage (never below current usage).
+        """
+        frame, forecast = self._portfolio_forecast(days_ahead)
+        step = min(days_ahead, forecast.horizon) - 1
+        demand = np.where(forecast.fitted, np.fmax(forecast.upper[:, step], frame.used_licenses), frame.used_licenses)
+        budget = budget if budget is not None else RIGHTSIZING_MONTHLY_BUDGET
+        plan = optimize_seats(
+            demand, frame.total_licenses, frame.cost_cents,
+            headroom=RIGHTSIZING_HEADROOM if headroom is None else headroom,
+            seat_increment=per_type_values(frame.license_type, RIGHTSIZING_SEAT_INCREMENT),
+            min_seats=per_type_values(frame.license_type, RIGHTSIZING_MIN_SEATS),
+            budget_cents=int(round(budget * 100)) if budget is not None else None
+        )
+        return frame, forecast, plan
+    
+    def get_cost_optimization_recommendations(self, budget: Optional[float] = None, days_ahead: int = 30) -> List[Dict]:
+        """Đề xuất tối ưu hóa chi phí từ kế hoạch right-sizing toàn portfolio"""
         try:
-            licenses = self.tracker.get_all_licenses()
-            if not licenses:
+            frame, forecast, plan = self.optimize_rightsizing(budget, days_ahead)
+            if not len(frame):
                 return []
-            recommendations = []
             
-            for license in licenses:
-                used_licenses = float(str(license['used_licenses']))
-                total_licenses = float(str(license['total_licenses']))
-                cost_per_license = float(str(license['cost_per_license']))
-                usage_rate = used_licenses / total_licenses
-                total_cost = total_licenses * cost_per_license
-                
-                # ML-based recommendations
-                if usage_rate < 0.2:
-                    action = 'REDUCE_SIGNIFICANTLY'
-                    recommended_licenses = max(1, int(used_licenses * 1.2))
-                    potential_savings = (total_licenses - recommended_licenses) * cost_per_license
-                    priority = 'HIGH'
-                elif usage_rate < 0.5:
-                    action = 'REDUCE_MODERATELY'
-                    recommended_licenses = max(1, int(used_licenses * 1.5))
-                    potential_savings = (total_licenses - recommended_licenses) * cost_per_license
-                    priority = 'MEDIUM'
-                elif usage_rate > 0.9:
-                    action = 'INCREASE'
-                    recommended_licenses = int(total_licenses * 1.2)
-                    potential_savings = 0
-                    priority = 'HIGH'
-                else:
-                    action = 'MAINTAIN'
-                    recommended_licenses = int(total_licenses)
-                    potential_savings = 0
-                    priority = 'LOW'
-                
+            used_licenses = frame.used_licenses
+            total_licenses = frame.total_licenses
+            usage_rate = frame.usage_rate
+            recommended_licenses = plan.recommended
+            
+            reduce = recommended_licenses < total_licenses
+            reduce_significantly = reduce & (recommended_licenses * 2 <= total_licenses)
+            reduce_moderately = reduce & ~reduce_significantly
+            increase = recommended_licenses > total_licenses
+            
+            savings_cents = np.where(reduce, (total_licenses - recommended_licenses) * frame.cost_cents, 0)
+            actions = np.select(
+                [reduce_significantly, reduce_moderately, increase],
+                ['REDUCE_SIGNIFICANTLY', 'REDUCE_MODERATELY', 'INCREASE'],
+                default='MAINTAIN'
+            )
+            priorities = np.where(reduce_significantly | increase, 'HIGH',
+                                  np.where(reduce_moderately, 'MEDIUM', 'LOW'))
+            # Độ tin cậy theo độ rộng khoảng dự báo; chỉ có usage hiện tại thì 0.5
+            step = min(days_ahead, forecast.horizon) - 1
+            width = (forecast.upper[:, step] - forecast.lower[:, step]) / np.maximum(total_licenses, 1)
+            confidence = np.where(forecast.fitted, np.clip(1 - np.nan_to_num(width), 0, 1), 0.5)
+            
+            names = frame.names()
+            recommendations = []
+            # Sắp xếp giảm dần theo savings, giữ thứ tự gốc khi bằng nhau
+            for i in np.argsort(-savings_cents, kind='stable'):
                 recommendations.append({
-                    'software_name': license['software_name'],
-                    'license_id': license['license_id'],
-                    'current_licenses': int(total_licenses),
-                    'current_usage': int(used_licenses),
-                    'usage_rate': f"{usage_rate:.1%}",
-                    'recommended_licenses': recommended_licenses,
-                    'action': action,
-                    'potential_savings': potential_savings,
-                    'priority': priority,
-                    'confidence_score': 0.8
+                    'software_name': names[i],
+                    'license_id': frame.license_id[i],
+                    'current_licenses': int(total_licenses[i]),
+                    'current_usage': int(used_licenses[i]),
+                    'usage_rate': f"{usage_rate[i]:.1%}",
+                    'recommended_licenses': int(recommended_licenses[i]),
+                    'action': str(actions[i]),
+                    'potential_savings': LicenseFrame.to_money(savings_cents[i]),
+                    'priority': str(priorities[i]),
+                    'confidence_score': float(confidence[i])
                 })
         
-            return sorted(recommendations, key=lambda x: x['potential_savings'], reverse=True)
+            return recommendations
         except Exception as e:
+            self.tracker.logger.error(f"Failed to generate cost optimization recommendations: {e}")
             return []
     
-    def detect_anomalies(self) -> List[Dict]:
+    def detect_anomalies(self, portfolio: PortfolioAnalysis = None) -> List[Dict]:
         """Phát hiện bất thường trong sử dụng license"""
-        licenses = self.tracker.get_all_licenses()
-        anomalies = []
-        
-        for license in licenses:
-            used_licenses = float(str(license['used_licenses']))
-            total_licenses = float(str(license['total_licenses']))
-            usage_rate = used_licenses / total_licenses
-            
-            # Detect anomalies
-            if usage_rate > 1.0:
-                anomalies.append({
-                    'license_id': license['license_id'],
-                    'software_name': license['software_name'],
-                    'anomaly_type': 'OVER_ALLOCATION',
-                    'severity': 'CRITICAL',
-                    'description': f"Usage exceeds total licenses: {used_licenses}/{total_licenses}"
-                })
-            elif usage_rate == 0:
-                anomalies.append({
-                    'license_id': license['license_id'],
-                    'software_name': license['software_name'],
-                    'anomaly_type': 'ZERO_USAGE',
-                    'severity': 'HIGH',
-                    'description': "No usage detected - potential waste"
-                })
-            elif usage_rate < 0.1:
-                anomalies.append({
-                    'license_id': license['license_id'],
-                    'software_name': license['software_name'],
-                    'anomaly_type': 'VERY_LOW_USAGE',
-                    'severity': 'MEDIUM',
-                    'description': f"Extremely low usage: {usage_rate:.1%}"
-                })
-        
-        return anomalies
\ No newline at end of file
+        portfolio = portfolio or PortfolioEngine(self.tracker).analyze()
+        return portfolio.anomalies()
+    
+    def get_usage_anomalies(self, since: Optional[str] = None) -> List[Dict]:
+        """Spike/drop/flatline do detector online phát hiện khi usage thay đổi (mới nhất trước)"""
+        anomalies = self.tracker.get_usage_anomalies(since)
+        if anomalies:
+            frame = LicenseFrame.from_tracker(self.tracker)
+            names = dict(zip(frame.license_id, frame.names()))
+            for anomaly in anomalies:
+                anomaly['software_name'] = names.get(anomaly['license_id'], anomaly['license_id'])
+        return anomalies
@@ -2,15 +2,15 @@
 Real-time Monitoring System
 """
 
-import boto3
 import json
 from datetime import datetime
 from typing import Dict, List
 from logger import LicenseLogger
+from aws_config import get_boto3_client
 
 class MonitoringSystem:
     def __init__(self):
-        self.cloudwatch = boto3.client('cloudwatch', region_name='us-east-1')
+        self.cloudwatch = get_boto3_client('cloudwatch', 'us-east-1')
         self.logger = LicenseLogger()
         self.namespace = 'LicenseOptimization'
     
@@ -109,7 +109,7 @@ class MonitoringSystem:
         try:
             from license_tracker import LicenseTracker
             tracker = LicenseTracker()
-            licenses = tracker.get_all_licenses()
+            licenses = tracker.get_all_licenses(refresh=True)
             health_status['checks']['database'] = 'healthy'
             health_status['checks']['license_count'] = len(licenses)
         except Exception as e:
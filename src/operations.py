@@ -22,7 +22,7 @@ class OperationsManager:
             'tasks': {}
         }
         
-        # 1. Health check
+        # 1. Health check (scan mới - các bước sau dùng lại snapshot này)
         results['tasks']['health_check'] = self.health_check()
         
         # 2. Backup data
@@ -31,11 +31,14 @@ class OperationsManager:
         # 3. Clean old logs
         results['tasks']['log_cleanup'] = self.cleanup_old_logs()
         
+        # Một lượt phân tích dùng chung cho report và metrics
+        portfolio = self._analyze_portfolio()
+        
         # 4. Generate daily report
-        results['tasks']['daily_report'] = self.generate_daily_report()
+        results['tasks']['daily_report'] = self.generate_daily_report(portfolio)
         
         # 5. Send metrics
-        results['tasks']['metrics'] = self.send_daily_metrics()
+        results['tasks']['metrics'] = self.send_daily_metrics(portfolio)
         
         self.logger.info(f"Daily operations completed: {results}")
         return results
@@ -48,7 +51,7 @@ class OperationsManager:
             tracker = LicenseTracker()
             
             # Test database connection
-            licenses = tracker.get_all_licenses()
+            licenses = tracker.get_all_licenses(refresh=True)
             
             return {
                 'status': 'success',
@@ -100,28 +103,32 @@ class OperationsManager:
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
     
-    def generate_daily_report(self) -> Dict:
-        """Generate daily operational report"""
+    def _analyze_portfolio(self):
+        """Portfolio analysis of the current snapshot (None if unavailable)"""
         try:
-            from usage_analyzer import UsageAnalyzer
-            from compliance_checker import ComplianceChecker
+            from portfolio_engine import PortfolioEngine
             
-            analyzer = UsageAnalyzer()
-            compliance = ComplianceChecker()
+            return PortfolioEngine().analyze()
+        except Exception as e:
+            self.logger.error(f"Portfolio analysis failed: {e}")
+            return None
+    
+    def generate_daily_report(self, portfolio=None) -> Dict:
+        """Generate daily operational report"""
+        try:
+            from portfolio_engine import PortfolioEngine
             
-            # Get analysis
-            analysis = analyzer.analyze_usage_patterns()
-            compliance_data = compliance.check_compliance_status()
+            portfolio = portfolio or PortfolioEngine().analyze()
             
             # Create report
             report = {
                 'date': datetime.now().strftime('%Y-%m-%d'),
                 'summary': {
-                    'total_licenses': analysis['total_licenses'],
-                    'underutilized': len(analysis['underutilized']),
-                    'overutilized': len(analysis['overutilized']),
-                    'expired': len(analysis.get('expired', [])),
-                    'compliance_status': compliance_data['overall_status']
+                    'total_licenses': portfolio.total_licenses,
+                    'underutilized': int(portfolio.underutilized.sum()),
+                    'overutilized': int(portfolio.overutilized.sum()),
+                    'expired': int(portfolio.expiry.expired.sum()),
+                    'compliance_status': portfolio.overall_status
                 }
             }
             
@@ -137,16 +144,15 @@ class OperationsManager:
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
     
-    def send_daily_metrics(self) -> Dict:
+    def send_daily_metrics(self, portfolio=None) -> Dict:
         """Send daily metrics to monitoring"""
         try:
-            from usage_analyzer import UsageAnalyzer
+            from portfolio_engine import PortfolioEngine
             
-            analyzer = UsageAnalyzer()
-            analysis = analyzer.analyze_usage_patterns()
+            portfolio = portfolio or PortfolioEngine().analyze()
             
             # Log metrics instead of sending to CloudWatch
-            self.logger.info(f"Daily metrics - Total: {analysis['total_licenses']}, Underutilized: {len(analysis['underutilized'])}")
+            self.logger.info(f"Daily metrics - Total: {portfolio.total_licenses}, Underutilized: {int(portfolio.underutilized.sum())}")
             
             return {'status': 'success', 'metrics_logged': 4}
         except Exception as e:
@@ -166,7 +172,7 @@ class OperationsManager:
             return {
                 'status': 'success',
                 'restored_licenses': results['success'],
-                'errors': len(results['errors'])
+                'errors': results['error_count']
             }
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
\ No newline at end of file
@@ -0,0 +1,363 @@
+"""
+Portfolio Engine - Phân tích toàn bộ danh mục license trong một lượt
+Fused single-pass analysis shared by the usage, compliance, risk and anomaly views
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from config.config import COMPLIANCE_THRESHOLDS, COST_SETTINGS
+from license_tracker import LicenseTracker, USAGE_RATE_SCALE
+from license_frame import LicenseFrame, ExpiryClassification, classify_expiry
+from risk_engine import RiskScores, score_licenses
+
+# Compliance status codes (index into COMPLIANCE_STATUSES)
+COMPLIANT, WARNING, VIOLATION = 0, 1, 2
+COMPLIANCE_STATUSES = np.array(['COMPLIANT', 'WARNING', 'VIOLATION'])
+
+# Usage rate below which a license is reported as VERY_LOW_USAGE
+ANOMALY_LOW_USAGE = 0.1
+
+
+@dataclass(frozen=True)
+class PortfolioAnalysis:
+    """Kết quả phân tích một snapshot - mask/mảng theo từng license và tổng hợp
+
+    All masks are aligned with frame; the report methods only build Python
+    dicts for the rows they return.
+    """
+    reference_time: datetime
+    frame: LicenseFrame
+    expiry: ExpiryClassification
+
+    # Usage
+    underutilized: np.ndarray
+    overutilized: np.ndarray
+    over_allocation: np.ndarray
+    critical_usage: np.ndarray
+    warning_usage: np.ndarray
+
+    # Compliance
+    compliance_status: np.ndarray
+    overall_status: str
+
+    # Anomalies
+    zero_usage: np.ndarray
+    very_low_usage: np.ndarray
+
+    # Risk
+    risk: RiskScores
+    risk_points: np.ndarray
+    risk_score: float
+    risk_level: str
+
+    # Cost totals (cents)
+    total_monthly_cost_cents: int
+    total_waste_cents: int
+    underutilized_waste_cents: int
+
+    @property
+    def total_licenses(self) -> int:
+        return len(self.frame)
+
+    @property
+    def total_monthly_cost(self) -> float:
+        return LicenseFrame.to_money(self.total_monthly_cost_cents)
+
+    @property
+    def potential_monthly_savings(self) -> float:
+        return LicenseFrame.to_money(self.underutilized_waste_cents)
+
+    def usage_report(self) -> Dict:
+        """View dạng UsageAnalyzer.analyze_usage_patterns"""
+        frame = self.frame
+        names = frame.names()
+        usage_rate = frame.usage_rate
+        days_until_expiry = self.expiry.days_remaining
+
+        report = {
+            'total_licenses': self.total_licenses,
+            'underutilized': [
+                {
+                    'software': names[i],
+                    'usage_rate': f"{usage_rate[i]:.1%}",
+                    'unused_licenses': int(frame.total_licenses[i] - frame.used_licenses[i]),
+                    'potential_savings': LicenseFrame.to_money(frame.waste_cents[i])
+                }
+                for i in np.flatnonzero(self.underutilized)
+            ],
+            'overutilized': [
+                {
+                    'software': names[i],
+                    'usage_rate': f"{usage_rate[i]:.1%}",
+                    'risk_level': 'HIGH'
+                }
+                for i in np.flatnonzero(self.overutilized)
+            ],
+            'expiring_soon': [
+                {
+                    'software': names[i],
+                    'expiry_date': frame.expiry_raw[i],
+                    'days_remaining': int(days_until_expiry[i])
+                }
+                for i in np.flatnonzero(self.expiry.expiring)
+            ],
+            'expired': [
+                {
+                    'software': names[i],
+                    'expiry_date': frame.expiry_raw[i],
+                    'days_expired': int(abs(days_until_expiry[i]))
+                }
+                for i in np.flatnonzero(self.expiry.expired)
+            ]
+        }
+
+        total_cost = self.total_monthly_cost
+        total_waste = self.potential_monthly_savings
+        report['cost_analysis'] = {
+            'total_monthly_cost': total_cost,
+            'potential_monthly_savings': total_waste,
+            'efficiency_rate': f"{((total_cost - total_waste) / total_cost * 100):.1f}%" if total_cost > 0 else "0%"
+        }
+        return report
+
+    def license_statuses(self) -> List[Dict]:
+        """Trạng thái tuân thủ từng license (issues chỉ dựng cho license có vấn đề)"""
+        frame = self.frame
+        expiry = self.expiry
+        usage_rate = frame.usage_rate
+        days_until_expiry = expiry.days_remaining
+
+        statuses = [
+            {
+                'license_id': license_id,
+                'software_name': software_name,
+                'status': status,
+                'issues': []
+            }
+            for license_id, software_name, status in zip(
+                frame.license_id, frame.names(), COMPLIANCE_STATUSES[self.compliance_status].tolist()
+            )
+        ]
+
+        flagged = (self.compliance_status != COMPLIANT) | expiry.invalid
+        for i in np.flatnonzero(flagged):
+            issues = statuses[i]['issues']
+            if self.over_allocation[i]:
+                issues.append(f"Vượt quá license: {frame.used_licenses[i]}/{frame.total_licenses[i]}")
+            elif self.critical_usage[i]:
+                issues.append(f"Sử dụng cao: {usage_rate[i]:.1%}")
+            elif self.warning_usage[i]:
+                issues.append(f"Cảnh báo sử dụng: {usage_rate[i]:.1%}")
+
+            if expiry.expired[i]:
+                issues.append(f"License đã hết hạn {abs(days_until_expiry[i])} ngày - Cần mua license mới")
+            elif expiry.expiring[i]:
+                issues.append(f"Sắp hết hạn trong {days_until_expiry[i]} ngày")
+            elif expiry.invalid[i]:
+                issues.append("Ngày hết hạn không hợp lệ")
+
+        return statuses
+
+    def compliance_report(self) -> Dict:
+        """View dạng ComplianceChecker.check_compliance_status"""
+        report = {
+            'total_licenses': self.total_licenses,
+            'compliant': [],
+            'warnings': [],
+            'violations': [],
+            'overall_status': self.overall_status
+        }
+        buckets = {'COMPLIANT': 'compliant', 'WARNING': 'warnings', 'VIOLATION': 'violations'}
+        for status in self.license_statuses():
+            report[buckets[status['status']]].append(status)
+        return report
+
+    def risk_factors(self) -> List[str]:
+        """Mô tả rủi ro theo thứ tự license (usage trước, expiry sau)"""
+        return self.risk.describe(np.flatnonzero(self.risk.factors))
+
+    def anomalies(self) -> List[Dict]:
+        """View dạng MLRecommender.detect_anomalies"""
+        frame = self.frame
+        names = frame.names()
+        anomalies = []
+        for i in np.flatnonzero(self.over_allocation | self.zero_usage | self.very_low_usage):
+            if self.over_allocation[i]:
+                anomalies.append({
+                    'license_id': frame.license_id[i],
+                    'software_name': names[i],
+                    'anomaly_type': 'OVER_ALLOCATION',
+                    'severity': 'CRITICAL',
+                    'description': f"Usage exceeds total licenses: {float(frame.used_licenses[i])}/{float(frame.total_licenses[i])}"
+                })
+            elif self.zero_usage[i]:
+                anomalies.append({
+                    'license_id': frame.license_id[i],
+                    'software_name': names[i],
+                    'anomaly_type': 'ZERO_USAGE',
+                    'severity': 'HIGH',
+                    'description': "No usage detected - potential waste"
+                })
+            else:
+                anomalies.append({
+                    'license_id': frame.license_id[i],
+                    'software_name': names[i],
+                    'anomaly_type': 'VERY_LOW_USAGE',
+                    'severity': 'MEDIUM',
+                    'description': f"Extremely low usage: {frame.usage_rate[i]:.1%}"
+                })
+        return anomalies
+
+    def executive_summary(self) -> Dict:
+        """View dạng AdvancedAnalytics.generate_executive_summary"""
+        frame = self.frame
+        total_spend = self.total_monthly_cost
+        total_waste = LicenseFrame.to_money(self.total_waste_cents)
+
+        return {
+            'total_licenses': self.total_licenses,
+            'total_annual_spend': total_spend * 12,  # Assuming monthly costs
+            'potential_annual_savings': total_waste * 12,
+            'average_utilization': f"{frame.usage_rate.mean():.1%}",
+            'efficiency_score': f"{((total_spend - total_waste) / total_spend * 100):.1f}%" if total_spend > 0 else "0.0%",
+            'high_risk_licenses': int(np.count_nonzero(self.overutilized)),
+            'underutilized_licenses': int(np.count_nonzero(self.underutilized)),
+            'expired_licenses': int(np.count_nonzero(self.expiry.expired)),
+            'expiring_soon': int(np.count_nonzero(self.expiry.expiring)),
+            'top_cost_drivers': self._top_records(frame.monthly_cost_cents, 'total_cost'),
+            'biggest_waste_sources': self._top_records(frame.waste_cents, 'waste_cost')
+        }
+
+    def _top_records(self, values_cents: np.ndarray, column: str, n: int = 3) -> List[Dict]:
+        """n license lớn nhất theo values_cents (giữ thứ tự gốc khi bằng nhau, như DataFrame.nlargest)"""
+        names = self.frame.names()
+        return [
+            {'software_name': names[i], column: LicenseFrame.to_money(values_cents[i])}
+            for i in np.argsort(-values_cents, kind='stable')[:n]
+        ]
+
+
+@dataclass(frozen=True)
+class PortfolioSummary:
+    """Chỉ số tổng hợp đọc từ counter duy trì khi ghi (không cần snapshot)"""
+    total_licenses: int
+    total_seats: int
+    used_seats: int
+    spend_cents: int
+    used_spend_cents: int
+    usage_rate_sum: float
+    license_types: Dict[str, int]
+    expiry_dates: Dict[str, int]
+
+    @classmethod
+    def from_counters(cls, counters: Dict[str, int]) -> 'PortfolioSummary':
+        """Đọc counter theo định dạng storage_backends.summary_contribution"""
+        return cls(
+            total_licenses=int(counters.get('license_count', 0)),
+            total_seats=int(counters.get('total_seats', 0)),
+            used_seats=int(counters.get('used_seats', 0)),
+            spend_cents=int(counters.get('spend_cents', 0)),
+            used_spend_cents=int(counters.get('used_spend_cents', 0)),
+            usage_rate_sum=int(counters.get('usage_rate_sum', 0)) / USAGE_RATE_SCALE,
+            license_types={
+                counter[len('type:'):]: int(value) for counter, value in counters.items()
+                if counter.startswith('type:') and value
+            },
+            expiry_dates={
+                counter[len('expiry:'):]: int(value) for counter, value in counters.items()
+                if counter.startswith('expiry:') and value
+            }
+        )
+
+    @property
+    def total_monthly_cost(self) -> float:
+        return LicenseFrame.to_money(self.spend_cents)
+
+    @property
+    def total_waste(self) -> float:
+        return LicenseFrame.to_money(self.spend_cents - self.used_spend_cents)
+
+    @property
+    def average_utilization(self) -> float:
+        """Trung bình usage rate theo license (như frame.usage_rate.mean())"""
+        return self.usage_rate_sum / self.total_licenses if self.total_licenses else 0.0
+
+    def expiry_counts(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Số license expired/critical/warning theo cùng classifier với snapshot"""
+        dates = list(self.expiry_dates)
+        counts = np.array([self.expiry_dates[date] for date in dates], dtype=np.int64)
+        expiry = classify_expiry(dates, now=now)
+        return {
+            'expired': int(counts[expiry.expired].sum()),
+            'critical': int(counts[expiry.critical].sum()),
+            'warning': int(counts[expiry.warning].sum())
+        }
+
+
+def analyze_portfolio(frame: LicenseFrame, now: Optional[datetime] = None) -> PortfolioAnalysis:
+    """Một lượt trên frame: usage, compliance, risk, anomaly và tổng chi phí"""
+    expiry = frame.classify_expiry(now=now)
+    usage_rate = frame.usage_rate
+
+    # Usage
+    underutilized = usage_rate < COST_SETTINGS['min_usage_for_recommendation']
+    overutilized = usage_rate > COMPLIANCE_THRESHOLDS['usage_critical']
+    over_allocation = usage_rate > 1.0
+    critical_usage = overutilized & ~over_allocation
+    warning_usage = ~overutilized & (usage_rate > COMPLIANCE_THRESHOLDS['usage_warning'])
+
+    # Compliance
+    violation = over_allocation | expiry.expired
+    warning = ~violation & (critical_usage | warning_usage | expiry.expiring)
+    compliance_status = np.where(violation, VIOLATION, np.where(warning, WARNING, COMPLIANT))
+    overall_status = COMPLIANCE_STATUSES[compliance_status.max()] if len(frame) else 'COMPLIANT'
+
+    # Anomalies
+    zero_usage = usage_rate == 0
+    very_low_usage = ~zero_usage & (usage_rate < ANOMALY_LOW_USAGE)
+
+    # Risk
+    risk = score_licenses(frame, expiry=expiry)
+
+    return PortfolioAnalysis(
+        reference_time=expiry.reference_time,
+        frame=frame,
+        expiry=expiry,
+        underutilized=underutilized,
+        overutilized=overutilized,
+        over_allocation=over_allocation,
+        critical_usage=critical_usage,
+        warning_usage=warning_usage,
+        compliance_status=compliance_status,
+        overall_status=str(overall_status),
+        zero_usage=zero_usage,
+        very_low_usage=very_low_usage,
+        risk=risk,
+        risk_points=risk.scores,
+        risk_score=risk.portfolio_score,
+        risk_level=risk.level,
+        total_monthly_cost_cents=int(frame.monthly_cost_cents.sum()),
+        total_waste_cents=int(frame.waste_cents.sum()),
+        underutilized_waste_cents=int(frame.waste_cents[underutilized].sum())
+    )
+
+
+class PortfolioEngine:
+    def __init__(self, tracker: LicenseTracker = None):
+        """Khởi tạo Portfolio Engine"""
+        self.tracker = tracker or LicenseTracker()
+
+    def analyze(self, refresh: bool = False, now: Optional[datetime] = None) -> PortfolioAnalysis:
+        """Phân tích snapshot hiện tại (refresh=True: scan lại bảng trước)"""
+        return analyze_portfolio(LicenseFrame.from_tracker(self.tracker, refresh=refresh), now=now)
+
+    def summary(self) -> Optional[PortfolioSummary]:
+        """Chỉ số tổng hợp từ summary duy trì khi ghi (None nếu không đọc được)"""
+        counters = self.tracker.get_portfolio_summary()
+        return PortfolioSummary.from_counters(counters) if counters is not None else None
@@ -0,0 +1,148 @@
+"""
+Rightsizing - Chọn số seat cho toàn bộ portfolio cùng lúc
+Vectorized seat optimizer under headroom, purchase-tier and budget constraints
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+# Optimizer settings (overridden by config/config.py if available)
+RIGHTSIZING_HEADROOM = 0.1
+# Bước mua (seat) và số seat tối thiểu theo license_type; '*' là mặc định
+RIGHTSIZING_SEAT_INCREMENT = {'*': 1}
+RIGHTSIZING_MIN_SEATS = {'*': 1}
+# Ngân sách tháng (đơn vị tiền); None = không giới hạn
+RIGHTSIZING_MONTHLY_BUDGET = None
+
+try:
+    from config.config import RIGHTSIZING_SETTINGS
+    RIGHTSIZING_HEADROOM = RIGHTSIZING_SETTINGS.get('headroom', RIGHTSIZING_HEADROOM)
+    RIGHTSIZING_SEAT_INCREMENT = RIGHTSIZING_SETTINGS.get('seat_increment', RIGHTSIZING_SEAT_INCREMENT)
+    RIGHTSIZING_MIN_SEATS = RIGHTSIZING_SETTINGS.get('min_seats', RIGHTSIZING_MIN_SEATS)
+    RIGHTSIZING_MONTHLY_BUDGET = RIGHTSIZING_SETTINGS.get('monthly_budget', RIGHTSIZING_MONTHLY_BUDGET)
+except ImportError:
+    pass
+
+
+def per_type_values(license_type, values: Union[int, Dict[str, int]]) -> np.ndarray:
+    """Mapping license_type -> giá trị thành mảng theo license (tra categorical một lần)"""
+    codes = np.asarray(license_type.codes)
+    if not isinstance(values, dict):
+        return np.full(len(codes), int(values), dtype=np.int64)
+    default = int(values.get('*', 1))
+    lookup = np.array([int(values.get(category, default)) for category in license_type.categories] + [default],
+                      dtype=np.int64)
+    # code -1 (thiếu) trỏ vào phần tử default cuối
+    return lookup[codes]
+
+
+def _round_up(seats: np.ndarray, increment: np.ndarray) -> np.ndarray:
+    return -(-seats // increment) * increment
+
+
+@dataclass(frozen=True)
+class RightsizingPlan:
+    """Kết quả tối ưu - mảng theo license, cùng thứ tự với demand đầu vào
+
+    target is the seat count meeting demand plus headroom; floor is the
+    smallest count still covering demand (no headroom). recommended lies
+    between the two: headroom is only given up where the budget requires.
+    """
+    current: np.ndarray
+    demand: np.ndarray
+    floor: np.ndarray
+    target: np.ndarray
+    recommended: np.ndarray
+    cost_cents: np.ndarray
+    budget_cents: Optional[int]
+    feasible: bool
+
+    @property
+    def current_spend_cents(self) -> int:
+        return int(np.dot(self.current, self.cost_cents))
+
+    @property
+    def recommended_spend_cents(self) -> int:
+        return int(np.dot(self.recommended, self.cost_cents))
+
+    @property
+    def headroom_cut(self) -> np.ndarray:
+        """Số seat headroom bị bỏ để vừa ngân sách"""
+        return self.target - self.recommended
+
+    def summary(self) -> Dict:
+        return {
+            'licenses': len(self.current),
+            'current_monthly_spend': self.current_spend_cents / 100,
+            'recommended_monthly_spend': self.recommended_spend_cents / 100,
+            'monthly_savings': (self.current_spend_cents - self.recommended_spend_cents) / 100,
+            'budget': self.budget_cents / 100 if self.budget_cents is not None else None,
+            'feasible': self.feasible,
+            'seats_added': int(np.maximum(self.recommended - self.current, 0).sum()),
+            'seats_removed': int(np.maximum(self.current - self.recommended, 0).sum()),
+            'licenses_with_headroom_cut': int(np.count_nonzero(self.headroom_cut))
+        }
+
+
+def optimize_seats(demand: np.ndarray, current: np.ndarray, cost_cents: np.ndarray,
+                   headroom: Union[float, np.ndarray] = RIGHTSIZING_HEADROOM,
+                   seat_increment: Optional[np.ndarray] = None, min_seats: Optional[np.ndarray] = None,
+                   budget_cents: Optional[int] = None) -> RightsizingPlan:
+    """Số seat tối thiểu chi phí cho mọi license, trong ngân sách nếu có
+
+    Cost is linear in seats, so without a budget the cheapest plan buys
+    exactly target = demand * (1 + headroom) rounded up to the purchase
+    tier (and at least min_seats). When target spend exceeds the budget,
+    headroom is given up tier by tier on the most expensive seats first -
+    the fewest seats removed per dollar saved - down to floor. If even
+    floor does not fit, the plan keeps floor and is marked infeasible.
+    """
+    demand = np.maximum(np.asarray(demand, dtype=np.float64), 0)
+    current = np.array(current, dtype=np.int64)
+    cost_cents = np.array(cost_cents, dtype=np.int64)
+    n = len(demand)
+    increment = np.maximum(seat_increment if seat_increment is not None else np.ones(n, dtype=np.int64), 1)
+    minimum = min_seats if min_seats is not None else np.ones(n, dtype=np.int64)
+
+    def seats_for(required):
+        seats = np.maximum(np.ceil(required - 1e-9).astype(np.int64), minimum)
+        return _round_up(seats, increment)
+
+    floor = seats_for(demand)
+    target = np.maximum(seats_for(demand * (1 + np.asarray(headroom))), floor)
+    recommended = target.copy()
+    feasible = True
+
+    if budget_cents is not None:
+        overshoot = int(np.dot(target, cost_cents)) - int(budget_cents)
+        if overshoot > 0:
+            block_cost = increment * cost_cents
+            blocks = (target - floor) // increment
+            # Seat đắt nhất trước; cắt trọn headroom của license đứng trước ranh giới
+            order = np.argsort(-cost_cents, kind='stable')
+            savings = np.cumsum(blocks[order] * block_cost[order])
+            cut_blocks = np.zeros(n, dtype=np.int64)
+            boundary = int(np.searchsorted(savings, overshoot))
+            cut_blocks[order[:boundary]] = blocks[order[:boundary]]
+            if boundary < n:
+                # License ở ranh giới: chỉ cắt số block vừa đủ
+                remaining = overshoot - (savings[boundary - 1] if boundary else 0)
+                i = order[boundary]
+                cut_blocks[i] = min(blocks[i], -(-remaining // max(block_cost[i], 1)))
+            else:
+                feasible = False
+            recommended = target - cut_blocks * increment
+
+    for array in (current, demand, floor, target, recommended, cost_cents):
+        array.setflags(write=False)
+    return RightsizingPlan(
+        current=current,
+        demand=demand,
+        floor=floor,
+        target=target,
+        recommended=recommended,
+        cost_cents=cost_cents,
+        budget_cents=budget_cents,
+        feasible=feasible
+    )
@@ -0,0 +1,184 @@
+"""
+Risk Engine - Chấm điểm rủi ro tuân thủ cho toàn bộ license trong một lượt
+Vectorized per-license risk points and factor bitmasks, weights from config
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from license_frame import LicenseFrame, ExpiryClassification, EXPIRY_CRITICAL_DAYS, EXPIRY_WARNING_DAYS
+
+# Risk factor theo thứ tự bit trong bitmask (bit i = 1 << i)
+RISK_FACTORS = ('over_allocation', 'high_usage', 'expired', 'expiring_critical', 'expiring_warning', 'invalid_expiry')
+# Nhóm loại trừ nhau: một license có nhiều nhất một factor usage và một factor expiry
+USAGE_FACTORS = ('over_allocation', 'high_usage')
+EXPIRY_FACTORS = ('expired', 'expiring_critical', 'expiring_warning', 'invalid_expiry')
+
+# Risk settings (overridden by config/config.py if available)
+RISK_WEIGHTS = {
+    'over_allocation': 40,
+    'high_usage': 20,
+    'expired': 30,
+    'expiring_critical': 20,
+    'expiring_warning': 10,
+    'invalid_expiry': 5
+}
+# usage_rate vượt ngưỡng: over_allocation (> 1.0) hoặc high_usage
+RISK_OVER_ALLOCATION_THRESHOLD = 1.0
+RISK_HIGH_USAGE_THRESHOLD = 0.95
+# Điểm portfolio (0-100) tối thiểu của mỗi mức, xét từ cao xuống
+RISK_LEVEL_THRESHOLDS = {'CRITICAL': 70, 'HIGH': 40, 'MEDIUM': 20}
+RISK_TOP_K = 10
+
+try:
+    from config.config import COMPLIANCE_THRESHOLDS
+    RISK_HIGH_USAGE_THRESHOLD = COMPLIANCE_THRESHOLDS.get('usage_critical', RISK_HIGH_USAGE_THRESHOLD)
+except ImportError:
+    pass
+try:
+    from config.config import RISK_SETTINGS
+    RISK_WEIGHTS = {**RISK_WEIGHTS, **RISK_SETTINGS.get('weights', {})}
+    RISK_OVER_ALLOCATION_THRESHOLD = RISK_SETTINGS.get('over_allocation_threshold', RISK_OVER_ALLOCATION_THRESHOLD)
+    RISK_HIGH_USAGE_THRESHOLD = RISK_SETTINGS.get('high_usage_threshold', RISK_HIGH_USAGE_THRESHOLD)
+    RISK_LEVEL_THRESHOLDS = RISK_SETTINGS.get('level_thresholds', RISK_LEVEL_THRESHOLDS)
+    RISK_TOP_K = RISK_SETTINGS.get('top_k', RISK_TOP_K)
+except ImportError:
+    pass
+
+FACTOR_BITS = {factor: np.uint8(1 << bit) for bit, factor in enumerate(RISK_FACTORS)}
+FACTOR_DESCRIPTIONS = {
+    'over_allocation': "Over-allocation detected",
+    'high_usage': "High usage risk",
+    'expired': "License expired",
+    'expiring_critical': f"Expiring within {EXPIRY_CRITICAL_DAYS} days",
+    'expiring_warning': f"Expiring within {EXPIRY_WARNING_DAYS} days",
+    'invalid_expiry': "Invalid expiry date"
+}
+
+
+def max_risk_per_license(weights: Dict[str, int] = RISK_WEIGHTS) -> int:
+    """Điểm tối đa một license có thể nhận (factor nặng nhất của mỗi nhóm)"""
+    return max(weights[f] for f in USAGE_FACTORS) + max(weights[f] for f in EXPIRY_FACTORS)
+
+
+MAX_RISK_PER_LICENSE = max_risk_per_license()
+
+
+def risk_level(score: float, thresholds: Dict[str, float] = RISK_LEVEL_THRESHOLDS) -> str:
+    for level, minimum in sorted(thresholds.items(), key=lambda item: -item[1]):
+        if score >= minimum:
+            return level
+    return 'LOW'
+
+
+@dataclass(frozen=True)
+class RiskScores:
+    """Điểm rủi ro theo license, cùng thứ tự với frame
+
+    factors is a uint8 bitmask over RISK_FACTORS; scores is the sum of the
+    weights of the set bits. portfolio_score normalises the total against
+    every license scoring max_per_license, capped at 100.
+    """
+    frame: LicenseFrame
+    scores: np.ndarray
+    factors: np.ndarray
+    max_per_license: int
+    portfolio_score: float
+    level: str
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def has_factor(self, factor: str) -> np.ndarray:
+        return (self.factors & FACTOR_BITS[factor]) != 0
+
+    def factor_counts(self) -> Dict[str, int]:
+        """Số license mang mỗi factor"""
+        return {factor: int(np.count_nonzero(self.has_factor(factor))) for factor in RISK_FACTORS}
+
+    def factor_names(self, index: int) -> List[str]:
+        bits = int(self.factors[index])
+        return [factor for bit, factor in enumerate(RISK_FACTORS) if bits >> bit & 1]
+
+    def top(self, k: int = RISK_TOP_K) -> np.ndarray:
+        """Chỉ số của k license rủi ro nhất (điểm > 0), điểm giảm dần, bằng điểm giữ thứ tự gốc
+
+        argpartition picks the k largest in linear time; only those k are sorted.
+        """
+        candidates = np.flatnonzero(self.scores > 0)
+        if k <= 0:
+            return candidates[:0]
+        if k < len(candidates):
+            scores = self.scores[candidates]
+            kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            # Điểm bằng kth: lấy các license đứng trước (argpartition không giữ thứ tự khi bằng điểm)
+            above = candidates[scores > kth]
+            candidates = np.concatenate((above, candidates[scores == kth][:k - len(above)]))
+        return candidates[np.lexsort((candidates, -self.scores[candidates]))]
+
+    def records(self, indices: Optional[np.ndarray] = None) -> List[Dict]:
+        """Drill-down theo license (mặc định top RISK_TOP_K)"""
+        indices = self.top() if indices is None else indices
+        names = self.frame.names()
+        return [
+            {
+                'license_id': self.frame.license_id[i],
+                'software_name': names[i],
+                'risk_points': int(self.scores[i]),
+                'factors': self.factor_names(i)
+            }
+            for i in indices
+        ]
+
+    def describe(self, indices: Optional[np.ndarray] = None) -> List[str]:
+        """Mô tả factor dạng '<software>: <factor>' cho các license đã chọn"""
+        indices = self.top() if indices is None else indices
+        names = self.frame.names()
+        return [
+            f"{names[i]}: {FACTOR_DESCRIPTIONS[factor]}"
+            for i in indices for factor in self.factor_names(i)
+        ]
+
+
+def score_licenses(frame: LicenseFrame, now: Optional[datetime] = None,
+                   expiry: Optional[ExpiryClassification] = None,
+                   weights: Optional[Dict[str, int]] = None) -> RiskScores:
+    """Chấm điểm mọi license của frame cùng lúc
+
+    expiry can be passed when the caller already classified the frame.
+    """
+    weights = {**RISK_WEIGHTS, **(weights or {})}
+    expiry = expiry if expiry is not None else frame.classify_expiry(now=now)
+    usage_rate = frame.usage_rate
+
+    over_allocation = usage_rate > RISK_OVER_ALLOCATION_THRESHOLD
+    masks = {
+        'over_allocation': over_allocation,
+        'high_usage': ~over_allocation & (usage_rate > RISK_HIGH_USAGE_THRESHOLD),
+        'expired': expiry.expired,
+        'expiring_critical': expiry.critical,
+        'expiring_warning': expiry.warning,
+        'invalid_expiry': expiry.invalid
+    }
+    factors = np.zeros(len(frame), dtype=np.uint8)
+    scores = np.zeros(len(frame), dtype=np.int64)
+    for factor in RISK_FACTORS:
+        factors |= np.where(masks[factor], FACTOR_BITS[factor], np.uint8(0))
+        scores += weights[factor] * masks[factor]
+
+    max_per_license = max_risk_per_license(weights)
+    max_possible_score = len(frame) * max_per_license
+    portfolio_score = min(100, int(scores.sum()) / max_possible_score * 100) if max_possible_score > 0 else 0
+
+    for array in (scores, factors):
+        array.setflags(write=False)
+    return RiskScores(
+        frame=frame,
+        scores=scores,
+        factors=factors,
+        max_per_license=max_per_license,
+        portfolio_score=portfolio_score,
+        level=risk_level(portfolio_score)
+    )
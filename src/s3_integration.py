@@ -5,9 +5,13 @@ Integrates S3 storage with existing modules
 
 from .s3_storage import S3StorageManager
 from .license_tracker import LicenseTracker
+from .data_validator import LicenseValidator
+from .snapshot_io import SNAPSHOT_EXTENSIONS, SNAPSHOT_FORMATS, snapshot_records
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import json
+import os
 
 class S3Integration:
     def __init__(self):
@@ -38,6 +42,8 @@ class S3Integration:
             if format == 'csv':
                 df = pd.DataFrame(licenses)
                 s3_url = self.s3_storage.upload_csv_export(df)
+            elif format in SNAPSHOT_FORMATS:
+                s3_url = self.s3_storage.upload_snapshot(licenses, format)
             else:
                 s3_url = self.s3_storage.upload_license_data(licenses)
             
@@ -47,23 +53,29 @@ class S3Integration:
             return None
     
     def restore_from_backup(self, backup_key):
-        """Restore licenses from S3 backup"""
+        """Restore licenses from S3 backup (JSON backup hoặc snapshot Parquet/Arrow)"""
         try:
-            backup_data = self.s3_storage.download_file(backup_key)
-            if backup_data:
-                data = json.loads(backup_data)
-                licenses = data.get('licenses', [])
+            if os.path.splitext(backup_key)[1].lower() in SNAPSHOT_EXTENSIONS:
+                table = self.s3_storage.download_snapshot(backup_key)
+                licenses = snapshot_records(table) if table is not None else None
+            else:
+                backup_data = self.s3_storage.download_file(backup_key)
+                licenses = json.loads(backup_data).get('licenses', []) if backup_data else None
+            if licenses is not None:
+                # Validate cả backup một lượt; dòng lỗi không được ghi
+                validation = LicenseValidator.validate_frame(pd.DataFrame.from_records(licenses))
+                invalid = np.flatnonzero(~validation.valid)
+                for i in invalid[:20]:
+                    print(f"Restore skipped {licenses[i].get('license_id')}: {', '.join(validation.messages(i))}")
+                if len(invalid):
+                    print(f"Restore skipped {len(invalid)} invalid licenses: {validation.summary()['errors']}")
                 
-                # Restore each license
-                restored_count = 0
-                for license_data in licenses:
-                    try:
-                        self.license_tracker.add_license(license_data)
-                        restored_count += 1
-                    except:
-                        continue
+                # Restore licenses in batched writes
+                results = self.license_tracker.add_licenses([licenses[i] for i in np.flatnonzero(validation.valid)])
+                for failure in results['failed']:
+                    print(f"Restore skipped {failure['license_id']}: {failure['error']}")
                 
-                return restored_count
+                return results['written']
             return 0
         except Exception as e:
             print(f"Restore failed: {e}")
@@ -3,30 +3,43 @@ S3 Storage System for License Optimization
 Handles file storage, backup, and data archiving
 """
 
-import boto3
 import json
 import pandas as pd
 from datetime import datetime
 from io import StringIO, BytesIO
 import logging
+import threading
+from .aws_config import get_boto3_client
+from .snapshot_io import SNAPSHOT_CONTENT_TYPES, read_snapshot, snapshot_format, write_snapshot
+
+# Buckets already verified in this process
+_checked_buckets = set()
+_checked_buckets_lock = threading.Lock()
 
 class S3StorageManager:
     def __init__(self):
-        self.s3_client = boto3.client('s3')
+        self.s3_client = get_boto3_client('s3')
         self.bucket_name = 'license-optimization-storage'
         self.logger = logging.getLogger(__name__)
         self._ensure_bucket_exists()
     
     def _ensure_bucket_exists(self):
-        """Create S3 bucket if not exists"""
-        try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-        except:
+        """Create S3 bucket if not exists (checked once per process)"""
+        if self.bucket_name in _checked_buckets:
+            return
+        with _checked_buckets_lock:
+            if self.bucket_name in _checked_buckets:
+                return
             try:
-                self.s3_client.create_bucket(Bucket=self.bucket_name)
-                print(f"Created S3 bucket: {self.bucket_name}")
-            except Exception as e:
-                print(f"Error creating bucket: {e}")
+                self.s3_client.head_bucket(Bucket=self.bucket_name)
+                _checked_buckets.add(self.bucket_name)
+            except:
+                try:
+                    self.s3_client.create_bucket(Bucket=self.bucket_name)
+                    _checked_buckets.add(self.bucket_name)
+                    print(f"Created S3 bucket: {self.bucket_name}")
+                except Exception as e:
+                    print(f"Error creating bucket: {e}")
     
     def upload_license_data(self, data, filename=None):
         """Upload license data to S3"""
@@ -66,6 +79,30 @@ class S3StorageManager:
             self.logger.error(f"CSV upload failed: {e}")
             return None
     
+    def upload_snapshot(self, licenses, format='parquet', filename=None):
+        """Upload license snapshot dạng Parquet/Arrow (typed, nén) to S3"""
+        format = snapshot_format(filename, format)
+        if filename is None:
+            filename = f"exports/license_snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+        
+        try:
+            buffer = BytesIO()
+            count = write_snapshot(licenses, buffer, format=format)
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=filename,
+                Body=buffer.getvalue(),
+                ContentType=SNAPSHOT_CONTENT_TYPES[format],
+                Metadata={
+                    'license_count': str(count),
+                    'created_at': datetime.now().isoformat()
+                }
+            )
+            return f"s3://{self.bucket_name}/{filename}"
+        except Exception as e:
+            self.logger.error(f"Snapshot upload failed: {e}")
+            return None
+    
     def upload_backup(self, backup_data, backup_type='full'):
         """Upload system backup to S3"""
         filename = f"backups/{backup_type}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -96,6 +133,15 @@ class S3StorageManager:
             self.logger.error(f"Download failed: {e}")
             return None
     
+    def download_snapshot(self, s3_key, format=None):
+        """Download snapshot Parquet/Arrow from S3 thành pyarrow Table"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+            return read_snapshot(BytesIO(response['Body'].read()), format=snapshot_format(s3_key, format))
+        except Exception as e:
+            self.logger.error(f"Snapshot download failed: {e}")
+            return None
+    
     def list_files(self, prefix=''):
         """List files in S3 bucket"""
         try:
@@ -151,7 +197,7 @@ class S3StorageManager:
 # Storage utility functions
 def create_presigned_url(s3_key, expiration=3600):
     """Create presigned URL for file download"""
-    s3_client = boto3.client('s3')
+    s3_client = get_boto3_client('s3')
     bucket_name = 'license-optimization-storage'
     
     try:
@@ -0,0 +1,211 @@
+"""
+Snapshot Cache - Cache snapshot license trong process
+Shared read-through cache in front of full-table reads
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+# license_tracker import module này là 'src.snapshot_cache', các module analytics là 'snapshot_cache':
+# đăng ký cả hai tên để module chỉ load một lần và mọi caller dùng chung một cache
+for _name in ('snapshot_cache', 'src.snapshot_cache'):
+    sys.modules.setdefault(_name, sys.modules[__name__])
+
+# Default settings
+SNAPSHOT_TTL_SECONDS = 60
+SNAPSHOT_MAX_BYTES = 256 * 1024 * 1024
+# Number of items sampled to estimate snapshot size
+SIZE_SAMPLE_ITEMS = 50
+# Max entries kept by ResultCache
+RESULT_CACHE_SIZE = 128
+# Usage forecasts are licenses x horizon arrays: keep only the latest few versions
+FORECAST_CACHE_SIZE = 2
+
+
+def estimate_items_size(items: List[Dict]) -> int:
+    """Estimate memory footprint of a list of flat dicts by sampling"""
+    if not items:
+        return sys.getsizeof(items)
+
+    step = max(1, len(items) // SIZE_SAMPLE_ITEMS)
+    sample = items[::step][:SIZE_SAMPLE_ITEMS]
+    sample_size = 0
+    for item in sample:
+        sample_size += sys.getsizeof(item)
+        for key, value in item.items():
+            sample_size += sys.getsizeof(key) + sys.getsizeof(value)
+    return sys.getsizeof(items) + int(sample_size / len(sample) * len(items))
+
+
+class _Snapshot:
+    def __init__(self, items: List[Dict], size: int, generation: int):
+        self.items = items
+        self.size = size
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        # Dạng dữ liệu dẫn xuất (vd. LicenseFrame), build một lần cho mỗi snapshot
+        self.derived = {}
+
+
+class SnapshotCache:
+    def __init__(self, ttl_seconds: float = SNAPSHOT_TTL_SECONDS, max_bytes: int = SNAPSHOT_MAX_BYTES):
+        """Cache LRU theo key (thường là (region, table)), có TTL và giới hạn bộ nhớ"""
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._snapshots = OrderedDict()
+        self._generations = {}
+        self._load_locks = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], List[Dict]], refresh: bool = False) -> List[Dict]:
+        """Trả về snapshot còn hạn, hoặc gọi loader một lần (các thread khác chờ kết quả)
+
+        Items are shared between callers and must be treated as read-only.
+        """
+        return list(self._snapshot(key, loader, refresh).items)
+
+    def get_derived(self, key: Hashable, name: str, builder: Callable[[List[Dict]], Any],
+                    loader: Callable[[], List[Dict]], refresh: bool = False) -> Any:
+        """Giá trị dẫn xuất từ snapshot hiện tại, build một lần và bỏ cùng snapshot"""
+        snapshot = self._snapshot(key, loader, refresh)
+        with self._lock:
+            if name in snapshot.derived:
+                return snapshot.derived[name]
+        value = builder(snapshot.items)
+        with self._lock:
+            return snapshot.derived.setdefault(name, value)
+
+    def _snapshot(self, key: Hashable, loader: Callable[[], List[Dict]], refresh: bool) -> _Snapshot:
+        if not refresh:
+            snapshot = self._lookup(key)
+            if snapshot is not None:
+                return snapshot
+
+        with self._load_lock(key):
+            # Thread khác có thể đã load xong trong lúc chờ
+            if not refresh:
+                snapshot = self._lookup(key)
+                if snapshot is not None:
+                    return snapshot
+
+            with self._lock:
+                generation = self._generations.get(key, 0)
+                self.misses += 1
+            items = loader()
+            return self._store(key, items, generation)
+
+    def invalidate(self, key: Hashable):
+        """Bỏ snapshot sau khi dữ liệu thay đổi"""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._drop(key)
+
+    def clear(self):
+        """Bỏ toàn bộ snapshot"""
+        with self._lock:
+            for key in list(self._snapshots):
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._drop(key)
+
+    def generation(self, key: Hashable) -> int:
+        """Số lần key bị invalidate trong process (không đổi khi snapshot load lại theo TTL)"""
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def stats(self) -> Dict:
+        """Thống kê cache"""
+        with self._lock:
+            return {
+                'entries': len(self._snapshots),
+                'total_bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _lookup(self, key: Hashable) -> Optional[_Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                return None
+            if time.monotonic() - snapshot.loaded_at > self.ttl_seconds:
+                self._drop(key)
+                return None
+            self._snapshots.move_to_end(key)
+            self.hits += 1
+            return snapshot
+
+    def _store(self, key: Hashable, items: List[Dict], generation: int) -> _Snapshot:
+        size = estimate_items_size(items)
+        snapshot = _Snapshot(items, size, generation)
+        with self._lock:
+            # Dữ liệu đã bị ghi trong lúc đang load - không cache kết quả cũ
+            if self._generations.get(key, 0) != generation or size > self.max_bytes:
+                return snapshot
+            self._drop(key)
+            self._snapshots[key] = snapshot
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._snapshots:
+                oldest = next(iter(self._snapshots))
+                self._drop(oldest)
+        return snapshot
+
+    def _drop(self, key: Hashable):
+        snapshot = self._snapshots.pop(key, None)
+        if snapshot is not None:
+            self._total_bytes -= snapshot.size
+
+    def _load_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            lock = self._load_locks.get(key)
+            if lock is None:
+                lock = self._load_locks[key] = threading.Lock()
+            return lock
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        """Cache LRU cho kết quả tính toán; key nên chứa data version để tự hết hiệu lực"""
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Trả về kết quả đã cache hoặc gọi compute và lưu lại"""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._results[key] = value
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._results), 'hits': self.hits, 'misses': self.misses}
+
+
+# Cache dùng chung cho mọi LicenseTracker trong process
+license_snapshot_cache = SnapshotCache()
+# Kết quả analytics theo data version (AdvancedAnalytics)
+analytics_result_cache = ResultCache()
+# Dự báo usage (MLRecommender): cache riêng, version mới đẩy version cũ ra
+forecast_result_cache = ResultCache(FORECAST_CACHE_SIZE)
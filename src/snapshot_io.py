@@ -0,0 +1,258 @@
+"""
+Snapshot IO - Export/import snapshot license dạng Parquet và Arrow IPC
+Typed, compressed columnar snapshots that load straight into LicenseFrame
+"""
+
+import os
+import sys
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = ipc = pq = None
+
+# s3_storage import module này là 'src.snapshot_io', license_frame/bulk_importer là 'snapshot_io':
+# đăng ký cả hai tên để module chỉ load một lần
+for _name in ('snapshot_io', 'src.snapshot_io'):
+    sys.modules.setdefault(_name, sys.modules[__name__])
+
+# Snapshot settings (overridden by config/config.py if available)
+SNAPSHOT_COMPRESSION = 'zstd'
+# Số dòng mỗi row group Parquet / record batch Arrow (đơn vị đọc stream khi import)
+SNAPSHOT_BATCH_ROWS = 100000
+
+try:
+    from config.config import SNAPSHOT_SETTINGS
+    SNAPSHOT_COMPRESSION = SNAPSHOT_SETTINGS.get('compression', SNAPSHOT_COMPRESSION)
+    SNAPSHOT_BATCH_ROWS = SNAPSHOT_SETTINGS.get('batch_rows', SNAPSHOT_BATCH_ROWS)
+except ImportError:
+    pass
+
+SNAPSHOT_FORMATS = ('parquet', 'arrow')
+SNAPSHOT_EXTENSIONS = {'.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+SNAPSHOT_CONTENT_TYPES = {'parquet': 'application/vnd.apache.parquet',
+                          'arrow': 'application/vnd.apache.arrow.file'}
+SNAPSHOT_VERSION = '1'
+
+# Cột của license khi đọc lại (cùng thứ tự với IMPORT_COLUMNS của bulk_importer)
+RECORD_COLUMNS = ['license_id', 'software_name', 'license_type', 'total_licenses', 'used_licenses',
+                  'cost_per_license', 'expiry_date', 'cost_center']
+_SOURCE_COLUMNS = RECORD_COLUMNS + ['created_date', 'last_updated']
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _require_arrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet/Arrow snapshots (pip install pyarrow)")
+
+
+def snapshot_schema() -> 'pa.Schema':
+    """Schema của snapshot: tên/loại license dictionary-encoded, chi phí decimal, expiry date32
+
+    expiry_date_unparsed keeps the original text only where expiry_date is
+    not a valid YYYY-MM-DD date, so invalid dates survive a round trip
+    (they are a risk factor) while valid ones are stored typed.
+    """
+    _require_arrow()
+    labels = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        pa.field('license_id', pa.string(), nullable=False),
+        pa.field('software_name', labels, nullable=False),
+        pa.field('license_type', labels, nullable=False),
+        pa.field('total_licenses', pa.int64(), nullable=False),
+        pa.field('used_licenses', pa.int64(), nullable=False),
+        pa.field('cost_per_license', pa.decimal128(18, 4), nullable=False),
+        pa.field('expiry_date', pa.date32()),
+        pa.field('expiry_date_unparsed', pa.string()),
+        pa.field('cost_center', labels),
+        pa.field('created_date', pa.timestamp('us')),
+        pa.field('last_updated', pa.timestamp('us'))
+    ], metadata={'snapshot': 'licenses', 'version': SNAPSHOT_VERSION})
+
+
+def snapshot_format(path: Optional[str] = None, format: Optional[str] = None) -> str:
+    """Định dạng snapshot: tham số format, nếu không có thì theo phần mở rộng của path"""
+    if format is None and path is not None:
+        format = SNAPSHOT_EXTENSIONS.get(os.path.splitext(str(path))[1].lower())
+    if format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unsupported snapshot format: {format}. Expected one of {SNAPSHOT_FORMATS}")
+    return format
+
+
+def _arrow_source(source):
+    # Path Arrow IPC được memory-map: đọc không copy, chỉ chạm các cột cần dùng
+    return pa.memory_map(os.fspath(source)) if isinstance(source, (str, os.PathLike)) else source
+
+
+def licenses_to_table(licenses: List[Dict]) -> 'pa.Table':
+    """List license (dict DynamoDB/SQLite) -> Table theo snapshot_schema, chuyển từng cột một lượt"""
+    schema = snapshot_schema()
+    df = pd.DataFrame.from_records(licenses, columns=_SOURCE_COLUMNS)
+
+    def text(name):
+        return df[name].fillna('').astype(str).to_numpy(dtype=object)
+
+    def labels(name, nullable=False):
+        values = text(name)
+        if nullable:
+            values[values == ''] = None
+        return pa.array(values, type=pa.string()).dictionary_encode()
+
+    def integers(name):
+        return pa.array(pd.to_numeric(df[name], errors='coerce').fillna(0).to_numpy(np.int64))
+
+    def timestamps(name):
+        parsed = pd.to_datetime(df[name], format='ISO8601', errors='coerce')
+        return pa.array(parsed.to_numpy().astype('datetime64[us]'), type=pa.timestamp('us'), from_pandas=True)
+
+    # Decimal -> float64 -> decimal128: làm tròn 4 chữ số như scale của schema
+    cost = pa.array(pd.to_numeric(df['cost_per_license'], errors='coerce').fillna(0).to_numpy(np.float64))
+    expiry_raw = text('expiry_date')
+    expiry_date = pd.to_datetime(pd.Series(expiry_raw), format='%Y-%m-%d', errors='coerce').to_numpy()
+    unparsed = np.where((expiry_raw != '') & np.isnat(expiry_date), expiry_raw, None)
+
+    return pa.Table.from_arrays([
+        pa.array(text('license_id'), type=pa.string()),
+        labels('software_name'),
+        labels('license_type'),
+        integers('total_licenses'),
+        integers('used_licenses'),
+        pc.round(cost, 4).cast(pa.decimal128(18, 4)),
+        pa.array(expiry_date.astype('datetime64[D]'), type=pa.date32(), from_pandas=True),
+        pa.array(unparsed, type=pa.string()),
+        labels('cost_center', nullable=True),
+        timestamps('created_date'),
+        timestamps('last_updated')
+    ], schema=schema)
+
+
+def write_snapshot(licenses: List[Dict], destination, format: Optional[str] = None,
+                   compression: str = SNAPSHOT_COMPRESSION) -> int:
+    """Ghi snapshot ra path hoặc file-like (vd. BytesIO cho S3); trả về số license
+
+    Parquet is the compact choice for storage and transfer; Arrow IPC
+    (Feather v2) is larger but memory-maps and loads without decoding.
+    """
+    format = snapshot_format(destination if isinstance(destination, (str, os.PathLike)) else None, format)
+    table = licenses_to_table(licenses)
+    if format == 'parquet':
+        pq.write_table(table, destination, compression=compression, row_group_size=SNAPSHOT_BATCH_ROWS)
+    else:
+        options = ipc.IpcWriteOptions(compression=compression)
+        with ipc.new_file(destination, table.schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=SNAPSHOT_BATCH_ROWS)
+    return table.num_rows
+
+
+def read_snapshot(source, format: Optional[str] = None, columns: Optional[List[str]] = None) -> 'pa.Table':
+    """Đọc cả snapshot thành Table (path hoặc file-like)"""
+    _require_arrow()
+    format = snapshot_format(source if isinstance(source, (str, os.PathLike)) else None, format)
+    if format == 'parquet':
+        return pq.read_table(source, columns=columns)
+    table = ipc.open_file(_arrow_source(source)).read_all()
+    return table.select(columns) if columns else table
+
+
+def count_snapshot_rows(source, format: Optional[str] = None) -> int:
+    """Số license trong snapshot, chỉ đọc metadata"""
+    _require_arrow()
+    format = snapshot_format(source if isinstance(source, (str, os.PathLike)) else None, format)
+    if format == 'parquet':
+        return pq.ParquetFile(source).metadata.num_rows
+    reader = ipc.open_file(_arrow_source(source))
+    return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def iter_snapshot_batches(source, format: Optional[str] = None,
+                          batch_rows: int = SNAPSHOT_BATCH_ROWS) -> Iterator['pa.RecordBatch']:
+    """Đọc snapshot theo record batch (không giữ cả file trong bộ nhớ với Parquet)"""
+    _require_arrow()
+    format = snapshot_format(source if isinstance(source, (str, os.PathLike)) else None, format)
+    if format == 'parquet':
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_rows)
+        return
+    reader = ipc.open_file(_arrow_source(source))
+    for i in range(reader.num_record_batches):
+        yield reader.get_batch(i)
+
+
+def _dictionary_text(column) -> np.ndarray:
+    """Cột (dictionary) string -> mảng object, decode dictionary một lần; null -> ''"""
+    if pa.types.is_dictionary(column.type):
+        if isinstance(column, pa.ChunkedArray):
+            # Ghép chunk (dictionary được hợp nhất) để decode một lần
+            column = column.combine_chunks()
+        dictionary = np.asarray(column.dictionary.to_pylist() + [''], dtype=object)
+        indices = column.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        # index -1 (null) trỏ vào phần tử '' cuối
+        return dictionary[indices]
+    return np.asarray(column.fill_null('').to_pylist(), dtype=object)
+
+
+def column_numbers(table, name: str, dtype) -> np.ndarray:
+    """Cột số -> mảng NumPy (null -> 0); decimal được cast trong Arrow, không đi qua Decimal"""
+    if name not in table.schema.names:
+        return np.zeros(table.num_rows, dtype=dtype)
+    return table.column(name).cast(pa.from_numpy_dtype(dtype), safe=False).fill_null(0).to_numpy()
+
+
+def expiry_text(expiry_date, unparsed=None) -> np.ndarray:
+    """date32 -> chuỗi YYYY-MM-DD (mảng object); ngày không hợp lệ lấy lại text gốc, thiếu -> ''"""
+    # Cast date32 -> string trong Arrow (ISO YYYY-MM-DD), không format từng ngày bằng Python
+    text = np.asarray(expiry_date.cast(pa.string()).fill_null('').to_numpy(zero_copy_only=False), dtype=object)
+    if unparsed is not None:
+        original = np.asarray(unparsed.to_pylist(), dtype=object)
+        has_original = original != None  # noqa: E711 - so sánh từng phần tử
+        text[has_original] = original[has_original]
+    return text
+
+
+def snapshot_frame(table) -> pd.DataFrame:
+    """Table/RecordBatch snapshot -> DataFrame theo RECORD_COLUMNS cho import/validate
+
+    Strings are object arrays with '' for missing values (like a CSV read
+    with keep_default_na=False); numeric columns stay numeric, so the
+    importer's clean_chunk/validate_frame skip their parsing step.
+    """
+    _require_arrow()
+    names = set(table.schema.names)
+
+    def text(name):
+        return _dictionary_text(table.column(name)) if name in names else np.full(table.num_rows, '', dtype=object)
+
+    expiry = table.column('expiry_date') if 'expiry_date' in names else None
+    if expiry is not None and pa.types.is_date(expiry.type):
+        unparsed = table.column('expiry_date_unparsed') if 'expiry_date_unparsed' in names else None
+        expiry = expiry_text(expiry, unparsed)
+    else:
+        expiry = text('expiry_date')
+
+    return pd.DataFrame({
+        'license_id': text('license_id'),
+        'software_name': text('software_name'),
+        'license_type': text('license_type'),
+        'total_licenses': column_numbers(table, 'total_licenses', np.int64),
+        'used_licenses': column_numbers(table, 'used_licenses', np.int64),
+        # Về 4 chữ số (scale của schema) để Decimal(str(cost)) khi ghi lại đúng giá trị gốc
+        'cost_per_license': np.round(column_numbers(table, 'cost_per_license', np.float64), 4),
+        'expiry_date': expiry,
+        'cost_center': text('cost_center')
+    }, columns=RECORD_COLUMNS)
+
+
+def snapshot_records(table) -> List[Dict]:
+    """Table snapshot -> list license dict (dạng add_licenses nhận)"""
+    df = snapshot_frame(table)
+    columns = [df[column].to_numpy().tolist() for column in RECORD_COLUMNS]
+    return [dict(zip(RECORD_COLUMNS, values)) for values in zip(*columns)]
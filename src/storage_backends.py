@@ -0,0 +1,1147 @@
+"""
+Storage Backends - Lớp lưu trữ cho LicenseTracker
+DynamoDB, SQLite và in-memory dùng chung một interface
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Callable, Dict, List, Optional
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from .aws_config import get_boto3_resource
+
+# Parallel scan: số segment chia bảng và số worker thread
+SCAN_TOTAL_SEGMENTS = 4
+SCAN_MAX_WORKERS = 4
+# BatchWriteItem: tối đa 25 item mỗi request, retry UnprocessedItems với jittered backoff
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_RETRIES = 8
+BATCH_RETRY_BASE_DELAY = 0.05
+BATCH_RETRY_MAX_DELAY = 2.0
+# Số lô BatchWriteItem/BatchGetItem chạy song song trong một put_items
+BATCH_WRITE_MAX_WORKERS = 4
+# BatchGetItem: tối đa 100 key mỗi request
+BATCH_GET_SIZE = 100
+# Global secondary indexes
+EXPIRY_INDEX_NAME = 'expiry_month-expiry_date-index'
+SOFTWARE_INDEX_NAME = 'software_name-index'
+# SQLite giới hạn số tham số trong một câu lệnh
+SQLITE_IN_CHUNK = 500
+
+# Portfolio summary: các shard item tổng hợp trong bảng DynamoDB (id '<SUMMARY_ITEM_ID>#<n>', bị loại khỏi scan)
+SUMMARY_ITEM_ID = '__portfolio_summary__'
+SUMMARY_SHARDS = 10
+SUMMARY_MAX_RETRIES = 5
+# Attribute của shard không phải counter
+SUMMARY_META_FIELDS = ('license_id', 'version', 'built_at')
+# Số license mà mỗi backend nhớ item gần nhất (giá trị kỳ vọng cho ghi optimistic)
+SUMMARY_KNOWN_ITEMS = 10000
+# usage_rate_sum lưu dạng số nguyên: tổng used/total * USAGE_RATE_SCALE
+USAGE_RATE_SCALE = 10**9
+
+# Trạng thái bảng DynamoDB đã kiểm tra, dùng chung trong process: (region, table) -> TableDescription
+_TABLE_READY = {}
+_TABLE_READY_LOCK = threading.Lock()
+
+
+def summary_contribution(item: Optional[Dict]) -> Dict[str, int]:
+    """Phần đóng góp của một license vào các counter tổng hợp (toàn số nguyên)
+
+    Counters: license_count, total_seats, used_seats, spend_cents,
+    used_spend_cents (waste = spend - used_spend), usage_rate_sum,
+    type:<license_type> and expiry:<YYYY-MM-DD>.
+    """
+    if not item:
+        return {}
+    total = int(item.get('total_licenses', 0))
+    used = int(item.get('used_licenses', 0))
+    cost = Decimal(str(item.get('cost_per_license', 0)))
+    cost_cents = int((cost * 100).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+    counters = {
+        'license_count': 1,
+        'total_seats': total,
+        'used_seats': used,
+        'spend_cents': total * cost_cents,
+        'used_spend_cents': used * cost_cents,
+        # Làm tròn used/total * scale bằng số nguyên để cộng/trừ không bị lệch
+        'usage_rate_sum': (2 * used * USAGE_RATE_SCALE + total) // (2 * total) if total > 0 else 0,
+        f"type:{item.get('license_type', '')}": 1
+    }
+    expiry_date = item.get('expiry_date')
+    if expiry_date:
+        try:
+            datetime.strptime(expiry_date, '%Y-%m-%d')
+            counters[f"expiry:{expiry_date}"] = 1
+        except ValueError:
+            pass
+    return counters
+
+
+def summary_delta(old: Optional[Dict], new: Optional[Dict]) -> Dict[str, int]:
+    """Chênh lệch counter khi license đổi từ old sang new (None = không tồn tại)"""
+    delta = dict(summary_contribution(new))
+    for counter, value in summary_contribution(old).items():
+        delta[counter] = delta.get(counter, 0) - value
+    return {counter: value for counter, value in delta.items() if value}
+
+
+def summary_counters(items: List[Dict]) -> Dict[str, int]:
+    """Tính lại toàn bộ counter từ danh sách license (bỏ counter bằng 0, như get_summary)"""
+    counters = {}
+    for item in items:
+        for counter, value in summary_contribution(item).items():
+            counters[counter] = counters.get(counter, 0) + value
+    return {counter: value for counter, value in counters.items() if value}
+
+
+class StorageBackend:
+    """Interface lưu trữ license
+
+    Items are plain dicts shaped like DynamoDB items: counts are ints,
+    cost_per_license is a Decimal, expiry_date/expiry_month are omitted
+    for perpetual licenses and cost_center when unassigned. Methods raise on failure; LicenseTracker handles
+    logging and return values.
+    """
+    name = 'base'
+
+    def cache_key(self) -> tuple:
+        """Key định danh nguồn dữ liệu cho snapshot cache"""
+        raise NotImplementedError
+
+    def ensure_ready(self, refresh: bool = False):
+        """Tạo bảng/schema nếu chưa có"""
+        raise NotImplementedError
+
+    def describe(self) -> Optional[Dict]:
+        """Thông tin schema đã kiểm tra (None nếu chưa)"""
+        return None
+
+    def put_item(self, item: Dict):
+        raise NotImplementedError
+
+    def put_items(self, prepared: List) -> Dict[int, str]:
+        """Ghi list (index, item); trả về lỗi theo index đầu vào"""
+        raise NotImplementedError
+
+    def get_item(self, license_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_items(self, license_ids: List[str]) -> List[Dict]:
+        """Đọc nhiều key (không trùng); thứ tự không đảm bảo"""
+        raise NotImplementedError
+
+    def scan_all(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def update_usage(self, license_id: str, used_licenses: int, updated_at: str) -> Optional[Dict]:
+        """Đặt used_licenses; trả về item mới, None nếu license không tồn tại"""
+        raise NotImplementedError
+
+    def adjust_usage(self, license_id: str, delta: int, updated_at: str) -> Optional[int]:
+        """Cộng delta vào used_licenses một cách atomic, giữ 0 <= used <= total
+
+        Returns the new used_licenses, or None if the license does not exist
+        or the change would leave the allowed range.
+        """
+        raise NotImplementedError
+
+    def delete_item(self, license_id: str):
+        raise NotImplementedError
+
+    def query_expiring(self, start: str, end: str) -> Optional[List[Dict]]:
+        """License có start <= expiry_date <= end; None nếu backend không có index phù hợp"""
+        raise NotImplementedError
+
+    def query_software(self, software_name: str) -> Optional[List[Dict]]:
+        """License theo software_name; None nếu backend không có index phù hợp"""
+        raise NotImplementedError
+
+    def get_summary(self) -> Dict[str, int]:
+        """Counter tổng hợp của portfolio (xem summary_contribution), một lần đọc"""
+        raise NotImplementedError
+
+    def rebuild_summary(self) -> Dict[str, int]:
+        """Tính lại summary từ toàn bộ license và lưu lại"""
+        raise NotImplementedError
+
+
+class DynamoDBBackend(StorageBackend):
+    name = 'dynamodb'
+
+    def __init__(self, table_name: str, region: str, logger,
+                 scan_segments: int = SCAN_TOTAL_SEGMENTS, scan_workers: int = SCAN_MAX_WORKERS):
+        self.table_name = table_name
+        self.region = region
+        self.logger = logger
+        self.scan_segments = max(1, int(scan_segments))
+        self.scan_workers = max(1, int(scan_workers))
+        # Item gần nhất thấy được của mỗi license (LRU, None = không tồn tại): ghi không cần đọc trước
+        self._known = OrderedDict()
+        self._known_lock = threading.Lock()
+
+    @property
+    def dynamodb(self):
+        """Resource của thread hiện tại từ registry dùng chung (resource boto3 không thread-safe)
+
+        Resolved on every use - a thread-local lookup - so scan segments and
+        importer writer threads never share one resource.
+        """
+        return get_boto3_resource('dynamodb', self.region)
+
+    def cache_key(self) -> tuple:
+        return (self.region, self.table_name)
+
+    def ensure_ready(self, refresh: bool = False):
+        """Đảm bảo bảng tồn tại và ACTIVE; kết quả được cache một lần cho mỗi process"""
+        key = self.cache_key()
+        if not refresh and key in _TABLE_READY:
+            return
+
+        with _TABLE_READY_LOCK:
+            if not refresh and key in _TABLE_READY:
+                return
+            _TABLE_READY.pop(key, None)
+            _TABLE_READY[key] = self._describe_or_create_table()
+
+    def describe(self) -> Optional[Dict]:
+        return _TABLE_READY.get(self.cache_key())
+
+    def _describe_or_create_table(self) -> Dict:
+        """DescribeTable; tạo bảng nếu chưa có và chờ tới khi ACTIVE"""
+        client = self.dynamodb.meta.client
+        try:
+            description = client.describe_table(TableName=self.table_name)['Table']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+            try:
+                client.create_table(
+                    TableName=self.table_name,
+                    KeySchema=[
+                        {'AttributeName': 'license_id', 'KeyType': 'HASH'}
+                    ],
+                    AttributeDefinitions=[
+                        {'AttributeName': 'license_id', 'AttributeType': 'S'},
+                        {'AttributeName': 'expiry_month', 'AttributeType': 'S'},
+                        {'AttributeName': 'expiry_date', 'AttributeType': 'S'},
+                        {'AttributeName': 'software_name', 'AttributeType': 'S'}
+                    ],
+                    GlobalSecondaryIndexes=[
+                        {
+                            # Bucket theo tháng hết hạn (YYYY-MM), sort theo expiry_date
+                            'IndexName': EXPIRY_INDEX_NAME,
+                            'KeySchema': [
+                                {'AttributeName': 'expiry_month', 'KeyType': 'HASH'},
+                                {'AttributeName': 'expiry_date', 'KeyType': 'RANGE'}
+                            ],
+                            'Projection': {'ProjectionType': 'ALL'}
+                        },
+                        {
+                            'IndexName': SOFTWARE_INDEX_NAME,
+                            'KeySchema': [
+                                {'AttributeName': 'software_name', 'KeyType': 'HASH'}
+                            ],
+                            'Projection': {'ProjectionType': 'ALL'}
+                        }
+                    ],
+                    BillingMode='PAY_PER_REQUEST'
+                )
+                self.logger.info(f"Created table: {self.table_name}")
+            except ClientError as create_error:
+                # Process khác vừa tạo bảng
+                if create_error.response['Error']['Code'] != 'ResourceInUseException':
+                    raise
+            description = {'TableStatus': 'CREATING'}
+
+        if description.get('TableStatus') != 'ACTIVE':
+            client.get_waiter('table_exists').wait(TableName=self.table_name)
+            description = client.describe_table(TableName=self.table_name)['Table']
+        return description
+
+    def has_index(self, index_name: str) -> bool:
+        """Kiểm tra GSI đã ACTIVE trên bảng (theo TableDescription đã cache)"""
+        description = self.describe() or {}
+        return any(
+            index['IndexName'] == index_name and index.get('IndexStatus', 'ACTIVE') == 'ACTIVE'
+            for index in description.get('GlobalSecondaryIndexes', [])
+        )
+
+    @staticmethod
+    def _with_counters(item: Dict) -> Dict:
+        """Thêm free_licenses = total - used để ADD có thể kiểm tra giới hạn trên"""
+        item = dict(item)
+        item['free_licenses'] = int(item['total_licenses']) - int(item.get('used_licenses', 0))
+        return item
+
+    def put_item(self, item: Dict):
+        self._write_with_summary(
+            item['license_id'],
+            lambda old: ({'Put': {'Item': self._with_counters(item)}}, item),
+            assume_absent=True
+        )
+
+    def put_items(self, prepared: List) -> Dict[int, str]:
+        """BatchWriteItem theo lô 25, các lô chạy song song; delta summary của cả lần ghi là một ADD
+
+        BatchWriteItem has no conditions, so the old items are read first -
+        one consistent BatchGetItem per 100 distinct ids, in parallel - and
+        the delta from them to the last item written for each id is added to
+        the summary once, after all chunks. A single-item write to one of
+        these licenses between that read and the batch write is not seen,
+        and the summary stays skewed until rebuild_summary(). A license_id
+        repeated in the input is written in input order (chunks holding it
+        run in later waves).
+        """
+        errors = {}
+        if not prepared:
+            return errors
+        workers = min(self.scan_workers, BATCH_WRITE_MAX_WORKERS)
+
+        license_ids = list(dict.fromkeys(item['license_id'] for _, item in prepared))
+        groups = [license_ids[start:start + BATCH_GET_SIZE] for start in range(0, len(license_ids), BATCH_GET_SIZE)]
+        old_items = {}
+        unread = set()
+        with ThreadPoolExecutor(max_workers=min(workers, len(groups))) as executor:
+            for group, result in zip(groups, executor.map(self._try_get_batch, groups)):
+                if isinstance(result, Exception):
+                    self.logger.error(f"Batch get failed: {result}")
+                    unread.update(group)
+                    continue
+                old_items.update((old['license_id'], old) for old in result)
+        for index, item in prepared:
+            if item['license_id'] in unread:
+                errors[index] = 'Could not read current item before batch write'
+        writable = [(index, item) for index, item in prepared if index not in errors]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for wave in self._waves(self._chunk_for_batch_write(writable)):
+                for chunk_errors in executor.map(self._write_batch, wave):
+                    errors.update(chunk_errors)
+
+        # Item cuối cùng ghi thành công của mỗi license, theo thứ tự đầu vào
+        latest = {}
+        for index, item in writable:
+            if index not in errors:
+                latest[item['license_id']] = item
+        delta = {}
+        for license_id, item in latest.items():
+            for counter, value in summary_delta(old_items.get(license_id), item).items():
+                delta[counter] = delta.get(counter, 0) + value
+            self._remember(license_id, item)
+        delta = {counter: value for counter, value in delta.items() if value}
+        if delta:
+            self.dynamodb.meta.client.update_item(**self._summary_update(delta)['Update'])
+        return errors
+
+    def _try_get_batch(self, license_ids: List[str]):
+        try:
+            return self._get_batch(license_ids, consistent=True)
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def _waves(chunks: List[List]) -> List[List[List]]:
+        """Gom các lô liên tiếp không chung license_id; các lô trong một wave ghi song song"""
+        waves = []
+        wave_ids = set()
+        for chunk in chunks:
+            chunk_ids = {item['license_id'] for _, item in chunk}
+            if not waves or chunk_ids & wave_ids:
+                waves.append([])
+                wave_ids = set()
+            waves[-1].append(chunk)
+            wave_ids |= chunk_ids
+        return waves
+
+    def _chunk_for_batch_write(self, prepared: List) -> List[List]:
+        """Chia item thành các lô 25, không để trùng license_id trong cùng một lô"""
+        chunks = []
+        current = []
+        current_ids = set()
+        for index, item in prepared:
+            if len(current) >= BATCH_WRITE_SIZE or item['license_id'] in current_ids:
+                chunks.append(current)
+                current = []
+                current_ids = set()
+            current.append((index, item))
+            current_ids.add(item['license_id'])
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _write_batch(self, chunk: List) -> Dict[int, str]:
+        """Ghi một lô và retry UnprocessedItems; trả về lỗi theo index đầu vào"""
+        client = self.dynamodb.meta.client
+        pending = {item['license_id']: index for index, item in chunk}
+        requests = [{'PutRequest': {'Item': self._with_counters(item)}} for _, item in chunk]
+
+        for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+            if attempt:
+                _backoff(attempt)
+            try:
+                response = client.batch_write_item(RequestItems={self.table_name: requests})
+            except Exception as e:
+                self.logger.error(f"Batch write failed: {e}")
+                return {index: str(e) for index in pending.values()}
+
+            requests = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            if not requests:
+                return {}
+            unprocessed_ids = {req['PutRequest']['Item']['license_id'] for req in requests}
+            pending = {lid: index for lid, index in pending.items() if lid in unprocessed_ids}
+
+        return {index: 'Unprocessed after retries' for index in pending.values()}
+
+    def get_item(self, license_id: str) -> Optional[Dict]:
+        response = self.dynamodb.Table(self.table_name).get_item(Key={'license_id': license_id})
+        item = response.get('Item')
+        self._remember(license_id, item)
+        return item
+
+    def get_items(self, license_ids: List[str]) -> List[Dict]:
+        items = []
+        for start in range(0, len(license_ids), BATCH_GET_SIZE):
+            chunk = license_ids[start:start + BATCH_GET_SIZE]
+            try:
+                items.extend(self._get_batch(chunk))
+            except Exception as e:
+                self.logger.error(f"Batch get failed: {e}")
+        for item in items:
+            self._remember(item['license_id'], item)
+        return items
+
+    def _get_batch(self, license_ids: List[str], consistent: bool = False) -> List[Dict]:
+        """Đọc một lô key và retry UnprocessedKeys với jittered backoff"""
+        client = self.dynamodb.meta.client
+        request = {self.table_name: {
+            'Keys': [{'license_id': license_id} for license_id in license_ids],
+            'ConsistentRead': consistent
+        }}
+        items = []
+
+        for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+            if attempt:
+                _backoff(attempt)
+            response = client.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(self.table_name, []))
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                return items
+
+        self.logger.error(f"Batch get left {len(request[self.table_name]['Keys'])} keys unprocessed")
+        return items
+
+    def scan_all(self, total_segments: Optional[int] = None) -> List[Dict]:
+        """Scan toàn bộ bảng, chia thành nhiều segment chạy song song"""
+        total_segments = max(1, int(total_segments or self.scan_segments))
+        if total_segments == 1:
+            return self._scan_segment()
+
+        # Mỗi worker lấy resource/client của thread mình qua self.dynamodb
+        workers = min(self.scan_workers, total_segments)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pages = executor.map(
+                lambda segment: self._scan_segment(segment, total_segments),
+                range(total_segments)
+            )
+            items = []
+            for segment_items in pages:
+                items.extend(segment_items)
+        return items
+
+    def _scan_segment(self, segment: Optional[int] = None, total_segments: Optional[int] = None) -> List[Dict]:
+        """Scan một segment, đi theo LastEvaluatedKey tới trang cuối"""
+        client = self.dynamodb.meta.client
+        params = {
+            'TableName': self.table_name,
+            # Các shard summary nằm chung bảng nhưng không phải license
+            'FilterExpression': 'NOT begins_with(license_id, :summary_prefix)',
+            'ExpressionAttributeValues': {':summary_prefix': SUMMARY_ITEM_ID}
+        }
+        if total_segments and total_segments > 1:
+            params['Segment'] = segment
+            params['TotalSegments'] = total_segments
+
+        items = []
+        while True:
+            response = client.scan(**params)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            params['ExclusiveStartKey'] = last_key
+
+    def update_usage(self, license_id: str, used_licenses: int, updated_at: str) -> Optional[Dict]:
+        return self._write_with_summary(
+            license_id,
+            lambda old: self._set_usage(old, used_licenses, updated_at) if old else None
+        )
+
+    def adjust_usage(self, license_id: str, delta: int, updated_at: str) -> Optional[int]:
+        """Một UpdateItem có điều kiện ADD trên cả hai counter, rồi ADD delta vào summary
+
+        The counter write is not pinned to last_updated, so concurrent deltas
+        never conflict; only the bound (free >= delta going up, used >= |delta|
+        going down) can reject it. The summary delta is derived from the
+        returned item and added to a shard in a second, unconditional request.
+        If that request fails the counter change stands and the summary lags
+        it until rebuild_summary().
+        """
+        client = self.dynamodb.meta.client
+        if delta >= 0:
+            condition = 'attribute_exists(free_licenses) AND free_licenses >= :bound'
+        else:
+            condition = 'attribute_exists(free_licenses) AND used_licenses >= :bound'
+
+        for attempt in range(2):
+            try:
+                response = self.dynamodb.Table(self.table_name).update_item(
+                    Key={'license_id': license_id},
+                    UpdateExpression='ADD used_licenses :delta, free_licenses :negative SET last_updated = :updated',
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues={
+                        ':delta': delta,
+                        ':negative': -delta,
+                        ':bound': abs(delta),
+                        ':updated': updated_at
+                    },
+                    ReturnValues='ALL_NEW',
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                current = _deserialize_item(e.response.get('Item'))
+                self._remember(license_id, current)
+                # Item ghi trước khi có free_licenses: bổ sung một lần rồi thử lại
+                if current is None or 'free_licenses' in current or attempt:
+                    return None
+                self._backfill_free_licenses(license_id)
+                continue
+
+            new_item = response['Attributes']
+            self._remember(license_id, new_item)
+            old_item = dict(new_item, used_licenses=int(new_item['used_licenses']) - delta)
+            summary = summary_delta(old_item, new_item)
+            if summary:
+                try:
+                    client.update_item(**self._summary_update(summary)['Update'])
+                except Exception as e:
+                    self.logger.error(f"Summary update for {license_id} failed, run rebuild_summary(): {e}")
+            return int(new_item['used_licenses'])
+        return None
+
+    def _backfill_free_licenses(self, license_id: str):
+        """Tính free_licenses cho item cũ (không làm gì nếu item đã có counter hoặc đã bị xoá)"""
+        try:
+            self.dynamodb.Table(self.table_name).update_item(
+                Key={'license_id': license_id},
+                UpdateExpression='SET free_licenses = total_licenses - used_licenses',
+                ConditionExpression='attribute_exists(license_id) AND attribute_not_exists(free_licenses)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    @staticmethod
+    def _set_usage(old: Dict, used_licenses: int, updated_at: str):
+        """Update used/free counter của license old -> (transact operation, item mới)"""
+        operation = {
+            'Update': {
+                'UpdateExpression': 'SET used_licenses = :used, free_licenses = :free, last_updated = :updated',
+                'ExpressionAttributeValues': {
+                    ':used': used_licenses,
+                    ':free': int(old['total_licenses']) - used_licenses,
+                    ':updated': updated_at
+                }
+            }
+        }
+        return operation, dict(old, used_licenses=used_licenses, last_updated=updated_at)
+
+    def delete_item(self, license_id: str):
+        self._write_with_summary(
+            license_id,
+            lambda old: ({'Delete': {}}, None) if old else None
+        )
+
+    def _remember(self, license_id: str, item: Optional[Dict]):
+        with self._known_lock:
+            self._known[license_id] = dict(item) if item else None
+            self._known.move_to_end(license_id)
+            while len(self._known) > SUMMARY_KNOWN_ITEMS:
+                self._known.popitem(last=False)
+
+    def _recall(self, license_id: str):
+        """Item đã biết của license -> (item, found); found=False nếu chưa từng thấy"""
+        with self._known_lock:
+            if license_id not in self._known:
+                return None, False
+            item = self._known[license_id]
+            return (dict(item) if item else None), True
+
+    def _read_item(self, license_id: str) -> Optional[Dict]:
+        item = self.dynamodb.Table(self.table_name).get_item(
+            Key={'license_id': license_id}, ConsistentRead=True
+        ).get('Item')
+        self._remember(license_id, item)
+        return item
+
+    def _write_with_summary(self, license_id: str, build: Callable, assume_absent: bool = False) -> Optional[Dict]:
+        """Ghi một license và ADD delta vào một shard summary trong cùng một transaction
+
+        build(old_item) returns (operation, new_item) - operation is a
+        TransactWriteItems entry without table/key/condition - or None to skip.
+        old_item is the item this backend last saw (no read before the write);
+        the write is conditioned on it being current, and a failed condition
+        returns the current item, so a stale expectation costs one retry, not
+        a read. Only an unseen license is read first (put_item assumes it is
+        new instead). The summary ADD goes to a random shard with no
+        condition. Returns the new item (None when skipped or deleted).
+        """
+        client = self.dynamodb.meta.client
+        key = {'license_id': license_id}
+        # Item nhớ được có thể đã cũ: chỉ điều kiện ghi (hoặc lần đọc) mới xác nhận nó
+        old, known = self._recall(license_id)
+        confirmed = False
+        if not known and not assume_absent:
+            old, confirmed = self._read_item(license_id), True
+
+        for attempt in range(SUMMARY_MAX_RETRIES):
+            built = build(old)
+            if built is None:
+                if confirmed:
+                    return None
+                # Bỏ qua theo giá trị nhớ được: xác nhận lại bằng item hiện tại trước khi từ chối
+                old, confirmed = self._read_item(license_id), True
+                continue
+            operation, new_item = built
+
+            action, params = next(iter(operation.items()))
+            condition, values = self._expected_condition(old)
+            params = dict(params, TableName=self.table_name, Key=key, ConditionExpression=condition,
+                          ReturnValuesOnConditionCheckFailure='ALL_OLD')
+            if action == 'Put':
+                params.pop('Key')
+            if values:
+                params['ExpressionAttributeValues'] = dict(params.get('ExpressionAttributeValues', {}), **values)
+
+            delta = summary_delta(old, new_item)
+            transact_items = [{action: params}] + ([self._summary_update(delta)] if delta else [])
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                reason = (e.response.get('CancellationReasons') or [{}])[0]
+                if reason.get('Code') == 'ConditionalCheckFailed':
+                    # License đã đổi: item hiện tại đi kèm lỗi (dạng AttributeValue thô), build lại từ đó
+                    old, confirmed = _deserialize_item(reason.get('Item')), True
+                    self._remember(license_id, old)
+                else:
+                    _backoff(attempt + 1)  # Xung đột transaction hoặc throttling
+                continue
+
+            self._remember(license_id, new_item)
+            return new_item
+
+        raise RuntimeError(f"License {license_id} kept changing during update, giving up after {SUMMARY_MAX_RETRIES} attempts")
+
+    @staticmethod
+    def _expected_condition(old: Optional[Dict]):
+        """Điều kiện: item vẫn là old (mọi lần ghi đều đổi last_updated) hoặc vẫn chưa tồn tại"""
+        if old is None:
+            return 'attribute_not_exists(license_id)', {}
+        if 'last_updated' not in old:
+            return 'attribute_exists(license_id) AND attribute_not_exists(last_updated)', {}
+        return 'last_updated = :expected_updated', {':expected_updated': old['last_updated']}
+
+    @staticmethod
+    def _summary_id(shard: int) -> str:
+        return f"{SUMMARY_ITEM_ID}#{shard}"
+
+    def _summary_update(self, delta: Dict[str, int]) -> Dict:
+        """Transact entry ADD delta vào một shard summary ngẫu nhiên (không điều kiện)"""
+        names = {'#version': 'version'}
+        values = {':one': 1}
+        parts = ['#version :one']
+        for i, (counter, value) in enumerate(sorted(delta.items())):
+            names[f'#c{i}'] = counter
+            values[f':c{i}'] = value
+            parts.append(f'#c{i} :c{i}')
+        return {
+            'Update': {
+                'TableName': self.table_name,
+                'Key': {'license_id': self._summary_id(random.randrange(SUMMARY_SHARDS))},
+                'UpdateExpression': 'ADD ' + ', '.join(parts),
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': values
+            }
+        }
+
+    def _summary_shards(self) -> Dict[str, Dict]:
+        shard_ids = [self._summary_id(shard) for shard in range(SUMMARY_SHARDS)]
+        return {item['license_id']: item for item in self._get_batch(shard_ids, consistent=True)}
+
+    def get_summary(self) -> Dict[str, int]:
+        """Cộng counter của mọi shard (một BatchGetItem); rebuild nếu summary chưa được build"""
+        shards = self._summary_shards()
+        if 'built_at' not in shards.get(self._summary_id(0), {}):
+            return self.rebuild_summary()
+        counters = {}
+        for item in shards.values():
+            for counter, value in item.items():
+                if counter not in SUMMARY_META_FIELDS:
+                    counters[counter] = counters.get(counter, 0) + int(value)
+        return {counter: value for counter, value in counters.items() if value}
+
+    def rebuild_summary(self) -> Dict[str, int]:
+        """Scan toàn bảng và ghi lại summary vào shard 0, đưa các shard khác về 0
+
+        All shards are replaced in one transaction conditioned on their
+        versions, so a delta added during the scan makes it retry instead of
+        being overwritten.
+        """
+        client = self.dynamodb.meta.client
+        counters = {}
+        for attempt in range(SUMMARY_MAX_RETRIES):
+            if attempt:
+                _backoff(attempt)
+            current = self._summary_shards()
+            counters = summary_counters(self.scan_all())
+            transact_items = []
+            for shard in range(SUMMARY_SHARDS):
+                shard_id = self._summary_id(shard)
+                body = dict(counters, built_at=datetime.now().isoformat()) if shard == 0 else {}
+                put = {'TableName': self.table_name}
+                if shard_id in current:
+                    version = int(current[shard_id].get('version', 0))
+                    put['ConditionExpression'] = 'version = :version'
+                    put['ExpressionAttributeValues'] = {':version': version}
+                else:
+                    version = 0
+                    put['ConditionExpression'] = 'attribute_not_exists(license_id)'
+                put['Item'] = dict(body, license_id=shard_id, version=version + 1)
+                transact_items.append({'Put': put})
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+                return counters
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+        self.logger.error("Portfolio summary changed during rebuild; returning unsaved counters")
+        return counters
+
+    def query_expiring(self, start: str, end: str) -> Optional[List[Dict]]:
+        if not self.has_index(EXPIRY_INDEX_NAME):
+            return None
+
+        months = _months_between(start, end)
+        workers = min(self.scan_workers, len(months))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pages = executor.map(
+                lambda month: self._query_index(
+                    EXPIRY_INDEX_NAME,
+                    Key('expiry_month').eq(month) & Key('expiry_date').between(start, end)
+                ),
+                months
+            )
+            items = []
+            for month_items in pages:
+                items.extend(month_items)
+        return items
+
+    def query_software(self, software_name: str) -> Optional[List[Dict]]:
+        if not self.has_index(SOFTWARE_INDEX_NAME):
+            return None
+        return self._query_index(SOFTWARE_INDEX_NAME, Key('software_name').eq(software_name))
+
+    def _query_index(self, index_name: str, key_condition) -> List[Dict]:
+        """Query một GSI, đi theo LastEvaluatedKey tới trang cuối"""
+        table = self.dynamodb.Table(self.table_name)
+        params = {'IndexName': index_name, 'KeyConditionExpression': key_condition}
+        items = []
+        while True:
+            response = table.query(**params)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            params['ExclusiveStartKey'] = last_key
+
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+
+    COLUMNS = ['license_id', 'software_name', 'license_type', 'total_licenses', 'used_licenses',
+               'expiry_date', 'expiry_month', 'cost_per_license', 'created_date', 'last_updated',
+               'cost_center']
+
+    def __init__(self, db_path: str, logger):
+        self.db_path = db_path
+        self.logger = logger
+        self._lock = threading.RLock()
+        self._conn = None
+        self._ready = False
+
+    def cache_key(self) -> tuple:
+        if self.db_path == ':memory:':
+            return ('sqlite', self.db_path, id(self))
+        return ('sqlite', os.path.abspath(self.db_path))
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path != ':memory:':
+                directory = os.path.dirname(os.path.abspath(self.db_path))
+                os.makedirs(directory, exist_ok=True)
+            # Một connection dùng chung, mọi truy cập đi qua self._lock
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        return self._conn
+
+    def ensure_ready(self, refresh: bool = False):
+        if self._ready and not refresh:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS licenses (
+                        license_id TEXT PRIMARY KEY,
+                        software_name TEXT NOT NULL,
+                        license_type TEXT NOT NULL,
+                        total_licenses INTEGER NOT NULL,
+                        used_licenses INTEGER NOT NULL DEFAULT 0,
+                        expiry_date TEXT,
+                        expiry_month TEXT,
+                        cost_per_license TEXT NOT NULL DEFAULT '0',
+                        created_date TEXT,
+                        last_updated TEXT,
+                        cost_center TEXT
+                    )
+                """)
+                # Database tạo trước khi có cost_center: thêm cột (NULL = chưa gán)
+                existing = {row['name'] for row in conn.execute('PRAGMA table_info(licenses)')}
+                if 'cost_center' not in existing:
+                    conn.execute('ALTER TABLE licenses ADD COLUMN cost_center TEXT')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_licenses_expiry_date ON licenses (expiry_date)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_licenses_software_name ON licenses (software_name)')
+                # Sidecar summary: counter -> giá trị, cập nhật trong cùng transaction với licenses
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS portfolio_summary (
+                        counter TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL
+                    )
+                """)
+                has_summary = conn.execute('SELECT 1 FROM portfolio_summary LIMIT 1').fetchone()
+                has_licenses = conn.execute('SELECT 1 FROM licenses LIMIT 1').fetchone()
+                if has_licenses and not has_summary:
+                    self._rebuild_summary(conn)
+            self._ready = True
+
+    def describe(self) -> Optional[Dict]:
+        return {'backend': self.name, 'path': self.db_path} if self._ready else None
+
+    def _row_values(self, item: Dict) -> tuple:
+        values = []
+        for column in self.COLUMNS:
+            value = item.get(column)
+            if column == 'cost_per_license':
+                value = str(value if value is not None else 0)
+            values.append(value)
+        return tuple(values)
+
+    def _to_item(self, row: sqlite3.Row) -> Dict:
+        item = {}
+        for column in self.COLUMNS:
+            value = row[column]
+            if value is None:
+                continue
+            if column == 'cost_per_license':
+                value = Decimal(value)
+            item[column] = value
+        return item
+
+    def _upsert_sql(self) -> str:
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        return f"INSERT OR REPLACE INTO licenses ({', '.join(self.COLUMNS)}) VALUES ({placeholders})"
+
+    def _apply_summary_delta(self, conn: sqlite3.Connection, delta: Dict[str, int]):
+        conn.executemany(
+            'INSERT INTO portfolio_summary (counter, value) VALUES (?, ?) '
+            'ON CONFLICT(counter) DO UPDATE SET value = value + excluded.value',
+            list(delta.items())
+        )
+
+    def _rebuild_summary(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        rows = conn.execute('SELECT * FROM licenses').fetchall()
+        counters = summary_counters([self._to_item(row) for row in rows])
+        conn.execute('DELETE FROM portfolio_summary')
+        self._apply_summary_delta(conn, counters)
+        return counters
+
+    def put_item(self, item: Dict):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                old = self._get_items(conn, [item['license_id']])
+                conn.execute(self._upsert_sql(), self._row_values(item))
+                self._apply_summary_delta(conn, summary_delta(old[0] if old else None, item))
+
+    def put_items(self, prepared: List) -> Dict[int, str]:
+        with self._lock:
+            conn = self._connection()
+            try:
+                with conn:
+                    ids = list(dict.fromkeys(item['license_id'] for _, item in prepared))
+                    current = {item['license_id']: item for item in self._get_items(conn, ids)}
+                    # Cộng dồn delta theo thứ tự ghi (license_id trùng: bản sau thay bản trước)
+                    delta = {}
+                    for _, item in prepared:
+                        for counter, value in summary_delta(current.get(item['license_id']), item).items():
+                            delta[counter] = delta.get(counter, 0) + value
+                        current[item['license_id']] = item
+                    conn.executemany(self._upsert_sql(), [self._row_values(item) for _, item in prepared])
+                    self._apply_summary_delta(conn, {counter: value for counter, value in delta.items() if value})
+            except sqlite3.Error as e:
+                return {index: str(e) for index, _ in prepared}
+        return {}
+
+    def get_item(self, license_id: str) -> Optional[Dict]:
+        with self._lock:
+            items = self._get_items(self._connection(), [license_id])
+        return items[0] if items else None
+
+    def get_items(self, license_ids: List[str]) -> List[Dict]:
+        with self._lock:
+            return self._get_items(self._connection(), license_ids)
+
+    def _get_items(self, conn: sqlite3.Connection, license_ids: List[str]) -> List[Dict]:
+        items = []
+        for start in range(0, len(license_ids), SQLITE_IN_CHUNK):
+            chunk = license_ids[start:start + SQLITE_IN_CHUNK]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = conn.execute(
+                f'SELECT * FROM licenses WHERE license_id IN ({placeholders})', chunk
+            ).fetchall()
+            items.extend(self._to_item(row) for row in rows)
+        return items
+
+    def scan_all(self) -> List[Dict]:
+        with self._lock:
+            rows = self._connection().execute('SELECT * FROM licenses').fetchall()
+        return [self._to_item(row) for row in rows]
+
+    def update_usage(self, license_id: str, used_licenses: int, updated_at: str) -> Optional[Dict]:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                old = self._get_items(conn, [license_id])
+                if not old:
+                    return None
+                conn.execute(
+                    'UPDATE licenses SET used_licenses = ?, last_updated = ? WHERE license_id = ?',
+                    (used_licenses, updated_at, license_id)
+                )
+                new_item = dict(old[0], used_licenses=used_licenses, last_updated=updated_at)
+                self._apply_summary_delta(conn, summary_delta(old[0], new_item))
+        return new_item
+
+    def adjust_usage(self, license_id: str, delta: int, updated_at: str) -> Optional[int]:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                old = self._get_items(conn, [license_id])
+                cursor = conn.execute(
+                    'UPDATE licenses SET used_licenses = used_licenses + ?, last_updated = ? '
+                    'WHERE license_id = ? AND used_licenses + ? BETWEEN 0 AND total_licenses',
+                    (delta, updated_at, license_id, delta)
+                )
+                if cursor.rowcount == 0:
+                    return None
+                used = int(old[0]['used_licenses']) + delta
+                self._apply_summary_delta(conn, summary_delta(old[0], dict(old[0], used_licenses=used)))
+        return used
+
+    def delete_item(self, license_id: str):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                old = self._get_items(conn, [license_id])
+                conn.execute('DELETE FROM licenses WHERE license_id = ?', (license_id,))
+                if old:
+                    self._apply_summary_delta(conn, summary_delta(old[0], None))
+
+    def query_expiring(self, start: str, end: str) -> Optional[List[Dict]]:
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT * FROM licenses WHERE expiry_date BETWEEN ? AND ? ORDER BY expiry_date',
+                (start, end)
+            ).fetchall()
+        return [self._to_item(row) for row in rows]
+
+    def query_software(self, software_name: str) -> Optional[List[Dict]]:
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT * FROM licenses WHERE software_name = ?', (software_name,)
+            ).fetchall()
+        return [self._to_item(row) for row in rows]
+
+    def get_summary(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT counter, value FROM portfolio_summary WHERE value != 0'
+            ).fetchall()
+        return {row['counter']: row['value'] for row in rows}
+
+    def rebuild_summary(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return self._rebuild_summary(conn)
+
+
+class InMemoryBackend(StorageBackend):
+    name = 'memory'
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._items = {}
+        self._summary = {}
+        self._lock = threading.RLock()
+
+    def cache_key(self) -> tuple:
+        # Mỗi instance là một kho riêng
+        return ('memory', id(self))
+
+    def ensure_ready(self, refresh: bool = False):
+        pass
+
+    def describe(self) -> Optional[Dict]:
+        return {'backend': self.name, 'item_count': len(self._items)}
+
+    def _store(self, item: Dict):
+        """Ghi item và cập nhật summary (gọi khi đang giữ lock)"""
+        self._apply_summary_delta(summary_delta(self._items.get(item['license_id']), item))
+        self._items[item['license_id']] = item
+
+    def _apply_summary_delta(self, delta: Dict[str, int]):
+        for counter, value in delta.items():
+            self._summary[counter] = self._summary.get(counter, 0) + value
+
+    def put_item(self, item: Dict):
+        with self._lock:
+            self._store(dict(item))
+
+    def put_items(self, prepared: List) -> Dict[int, str]:
+        with self._lock:
+            for _, item in prepared:
+                self._store(dict(item))
+        return {}
+
+    def get_item(self, license_id: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._items.get(license_id)
+            return dict(item) if item else None
+
+    def get_items(self, license_ids: List[str]) -> List[Dict]:
+        with self._lock:
+            return [dict(self._items[license_id]) for license_id in license_ids if license_id in self._items]
+
+    def scan_all(self) -> List[Dict]:
+        with self._lock:
+            return [dict(item) for item in self._items.values()]
+
+    def update_usage(self, license_id: str, used_licenses: int, updated_at: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._items.get(license_id)
+            if item is None:
+                return None
+            new_item = dict(item, used_licenses=used_licenses, last_updated=updated_at)
+            self._store(new_item)
+            return dict(new_item)
+
+    def adjust_usage(self, license_id: str, delta: int, updated_at: str) -> Optional[int]:
+        with self._lock:
+            item = self._items.get(license_id)
+            if item is None:
+                return None
+            used = int(item.get('used_licenses', 0)) + delta
+            if not 0 <= used <= int(item['total_licenses']):
+                return None
+            self._store(dict(item, used_licenses=used, last_updated=updated_at))
+            return used
+
+    def delete_item(self, license_id: str):
+        with self._lock:
+            self._apply_summary_delta(summary_delta(self._items.pop(license_id, None), None))
+
+    def query_expiring(self, start: str, end: str) -> Optional[List[Dict]]:
+        with self._lock:
+            items = [dict(item) for item in self._items.values()
+                     if start <= (item.get('expiry_date') or '') <= end]
+        return sorted(items, key=lambda item: item['expiry_date'])
+
+    def query_software(self, software_name: str) -> Optional[List[Dict]]:
+        with self._lock:
+            return [dict(item) for item in self._items.values() if item.get('software_name') == software_name]
+
+    def get_summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {counter: value for counter, value in self._summary.items() if value}
+
+    def rebuild_summary(self) -> Dict[str, int]:
+        with self._lock:
+            self._summary = summary_counters(list(self._items.values()))
+            return dict(self._summary)
+
+
+def create_backend(name: str, logger, table_name: str, region: str, sqlite_path: str,
+                   scan_segments: int = SCAN_TOTAL_SEGMENTS, scan_workers: int = SCAN_MAX_WORKERS) -> StorageBackend:
+    """Tạo backend theo tên cấu hình: 'dynamodb', 'sqlite' hoặc 'memory'"""
+    name = (name or 'dynamodb').lower()
+    if name == 'dynamodb':
+        return DynamoDBBackend(table_name, region, logger, scan_segments, scan_workers)
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_path, logger)
+    if name == 'memory':
+        return InMemoryBackend(logger)
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+def _deserialize_item(item: Optional[Dict]) -> Optional[Dict]:
+    """AttributeValue map (vd. Item trong CancellationReasons, không qua resource) -> dict Python"""
+    if not item:
+        return None
+    deserializer = TypeDeserializer()
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def _backoff(attempt: int):
+    """Full jitter exponential backoff"""
+    delay = min(BATCH_RETRY_MAX_DELAY, BATCH_RETRY_BASE_DELAY * (2 ** attempt))
+    time.sleep(random.uniform(0, delay))
+
+
+def _months_between(start: str, end: str) -> List[str]:
+    """Danh sách tháng YYYY-MM từ start tới end (bao gồm hai đầu)"""
+    year, month = int(start[:4]), int(start[5:7])
+    end_year, end_month = int(end[:4]), int(end[5:7])
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append(f"{year:04d}-{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
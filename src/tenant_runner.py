@@ -0,0 +1,234 @@
+"""
+Tenant Runner - Phân tích nhiều tenant/business unit song song, gộp thành báo cáo tập đoàn
+Fans per-table analysis out across a process pool and merges the results
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from usage_analyzer import UsageAnalyzer
+from compliance_checker import ComplianceChecker
+from advanced_analytics import AdvancedAnalytics
+from license_frame import LicenseFrame
+from license_tracker import LicenseTracker
+from portfolio_engine import COMPLIANCE_STATUSES, PortfolioEngine
+from risk_engine import RISK_TOP_K, risk_level
+
+# Tenant settings (overridden by config/config.py if available)
+# tenant -> table; list table cũng được (tên tenant = tên bảng)
+TENANTS = {}
+TENANT_MAX_WORKERS = None
+
+try:
+    from config.config import TENANT_SETTINGS
+    TENANTS = TENANT_SETTINGS.get('tenants', TENANTS)
+    TENANT_MAX_WORKERS = TENANT_SETTINGS.get('max_workers', TENANT_MAX_WORKERS)
+except ImportError:
+    pass
+
+
+def analyze_tenant(tenant: str, table_name: str, now: Optional[datetime] = None) -> Dict:
+    """Phân tích một bảng trong worker: một snapshot, một PortfolioAnalysis cho mọi analyzer
+
+    Only summaries and counts travel back to the parent (not per-license
+    lists), plus the raw totals consolidate_reports needs to merge tenants
+    exactly. Failures are returned as status 'error' so one business unit
+    does not abort the group run.
+    """
+    started = time.monotonic()
+    result = {'tenant': tenant, 'table_name': table_name}
+    try:
+        # Một tracker (một backend, một snapshot cache) cho cả ba analyzer
+        tracker = LicenseTracker(table_name=table_name)
+        usage_analyzer = UsageAnalyzer(tracker=tracker)
+        compliance_checker = ComplianceChecker(tracker=tracker)
+        analytics = AdvancedAnalytics(tracker=tracker)
+
+        portfolio = PortfolioEngine(tracker).analyze(now=now)
+        if not portfolio.total_licenses:
+            result['status'] = 'empty'
+            return result
+
+        frame = portfolio.frame
+        usage = usage_analyzer.analyze_usage_patterns(portfolio)
+        compliance = compliance_checker.check_compliance_status(portfolio)
+        result.update({
+            'status': 'ok',
+            'totals': {
+                'licenses': portfolio.total_licenses,
+                'total_seats': int(frame.total_licenses.sum()),
+                'used_seats': int(frame.used_licenses.sum()),
+                'monthly_cost_cents': portfolio.total_monthly_cost_cents,
+                'waste_cents': portfolio.total_waste_cents,
+                'underutilized_waste_cents': portfolio.underutilized_waste_cents,
+                'usage_rate_sum': float(frame.usage_rate.sum()),
+                'risk_points': int(portfolio.risk.scores.sum()),
+                'max_risk_points': portfolio.total_licenses * portfolio.risk.max_per_license
+            },
+            'executive_summary': analytics.generate_executive_summary(portfolio),
+            'risk': analytics.generate_compliance_risk_score(portfolio),
+            'compliance': {
+                'overall_status': compliance['overall_status'],
+                'compliant': len(compliance['compliant']),
+                'warnings': len(compliance['warnings']),
+                'violations': len(compliance['violations'])
+            },
+            'usage': {
+                'underutilized': len(usage['underutilized']),
+                'overutilized': len(usage['overutilized']),
+                'expiring_soon': len(usage['expiring_soon']),
+                'expired': len(usage['expired']),
+                'cost_analysis': usage['cost_analysis']
+            }
+        })
+    except Exception as e:
+        result.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        result['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    return result
+
+
+def _tenant_tables(tenants: Union[Dict[str, str], List[str], None]) -> Dict[str, str]:
+    tenants = TENANTS if tenants is None else tenants
+    if isinstance(tenants, dict):
+        return dict(tenants)
+    return {table_name: table_name for table_name in tenants}
+
+
+def run_tenants(tenants: Union[Dict[str, str], List[str], None] = None, max_workers: Optional[int] = None,
+                now: Optional[datetime] = None) -> Dict:
+    """Phân tích mọi tenant trên process pool rồi gộp báo cáo
+
+    tenants maps tenant -> table (or is a list of tables); defaults to
+    TENANT_SETTINGS['tenants']. Workers are spawned rather than forked so no
+    boto3 client or lock is inherited from the parent. max_workers=1 runs
+    in-process, one tenant after another.
+    """
+    tables = _tenant_tables(tenants)
+    if not tables:
+        return consolidate_reports([])
+
+    max_workers = max_workers or TENANT_MAX_WORKERS or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(tables)))
+    started = time.monotonic()
+    if max_workers == 1:
+        results = [analyze_tenant(tenant, table_name, now) for tenant, table_name in tables.items()]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            futures = {
+                executor.submit(analyze_tenant, tenant, table_name, now): tenant
+                for tenant, table_name in tables.items()
+            }
+            completed = {}
+            for future in as_completed(futures):
+                tenant = futures[future]
+                try:
+                    completed[tenant] = future.result()
+                except Exception as e:
+                    # Worker chết (vd. hết bộ nhớ): ghi nhận như tenant lỗi
+                    completed[tenant] = {'tenant': tenant, 'table_name': tables[tenant],
+                                         'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+        results = [completed[tenant] for tenant in tables]
+
+    report = consolidate_reports(results)
+    report['max_workers'] = max_workers
+    report['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def consolidate_reports(results: List[Dict], top_k: int = RISK_TOP_K) -> Dict:
+    """Gộp kết quả các tenant thành báo cáo tập đoàn
+
+    Group metrics are recomputed from the tenants' raw totals (cents, seat
+    and risk-point sums) rather than averaged from their formatted values,
+    so the group risk score equals scoring all tables as one portfolio.
+    """
+    succeeded = [result for result in results if result.get('status') == 'ok']
+    keys = ('licenses', 'total_seats', 'used_seats', 'monthly_cost_cents', 'waste_cents',
+            'underutilized_waste_cents', 'risk_points', 'max_risk_points')
+    totals = {key: sum(result['totals'][key] for result in succeeded) for key in keys}
+    usage_rate_sum = sum(result['totals']['usage_rate_sum'] for result in succeeded)
+
+    total_spend = LicenseFrame.to_money(totals['monthly_cost_cents'])
+    total_waste = LicenseFrame.to_money(totals['waste_cents'])
+    risk_score = (min(100, totals['risk_points'] / totals['max_risk_points'] * 100)
+                  if totals['max_risk_points'] else 0)
+    statuses = [result['compliance']['overall_status'] for result in succeeded]
+    worst = max((int(np.flatnonzero(COMPLIANCE_STATUSES == status)[0]) for status in statuses), default=0)
+
+    # Top risk toàn tập đoàn: gộp top-k của từng tenant (sort ổn định giữ thứ tự tenant)
+    top_risks = [
+        dict(record, tenant=result['tenant'])
+        for result in succeeded for record in result['risk'].get('top_risk_licenses', [])
+    ]
+    top_risks.sort(key=lambda record: -record['risk_points'])
+
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'tenants': len(results),
+        'succeeded': len(succeeded),
+        'empty': [result['tenant'] for result in results if result.get('status') == 'empty'],
+        'failed': [
+            {'tenant': result['tenant'], 'table_name': result['table_name'], 'error': result.get('error')}
+            for result in results if result.get('status') == 'error'
+        ],
+        'total_licenses': totals['licenses'],
+        'total_seats': totals['total_seats'],
+        'used_seats': totals['used_seats'],
+        'total_monthly_cost': total_spend,
+        'total_annual_spend': total_spend * 12,
+        'potential_annual_savings': total_waste * 12,
+        'underutilized_monthly_savings': LicenseFrame.to_money(totals['underutilized_waste_cents']),
+        'average_utilization': f"{(usage_rate_sum / totals['licenses'] if totals['licenses'] else 0):.1%}",
+        'efficiency_score': f"{((total_spend - total_waste) / total_spend * 100):.1f}%" if total_spend > 0 else "0.0%",
+        'risk_score': f"{risk_score:.1f}",
+        'risk_level': risk_level(risk_score),
+        'overall_compliance': str(COMPLIANCE_STATUSES[worst]),
+        'compliance_counts': {
+            key: sum(result['compliance'][key] for result in succeeded)
+            for key in ('compliant', 'warnings', 'violations')
+        },
+        'top_risk_licenses': top_risks[:top_k],
+        'by_tenant': sorted(
+            (
+                {
+                    'tenant': result['tenant'],
+                    'table_name': result['table_name'],
+                    'licenses': result['totals']['licenses'],
+                    'monthly_cost': LicenseFrame.to_money(result['totals']['monthly_cost_cents']),
+                    'monthly_waste': LicenseFrame.to_money(result['totals']['waste_cents']),
+                    'risk_score': result['risk']['risk_score'],
+                    'risk_level': result['risk']['risk_level'],
+                    'compliance': result['compliance']['overall_status'],
+                    'elapsed_seconds': result['elapsed_seconds']
+                }
+                for result in succeeded
+            ),
+            key=lambda row: -row['monthly_cost']
+        ),
+        'results': results
+    }
+
+
+def main():
+    """Chạy phân tích nhóm cho các tenant trong TENANT_SETTINGS"""
+    report = run_tenants()
+    print(f"Tenants: {report['succeeded']}/{report['tenants']} analyzed, {len(report['failed'])} failed")
+    print(f"Total licenses: {report['total_licenses']}, monthly cost: ${report['total_monthly_cost']:,.2f}")
+    print(f"Group risk: {report['risk_score']} ({report['risk_level']}), compliance: {report['overall_compliance']}")
+    for row in report['by_tenant']:
+        print(f"- {row['tenant']}: {row['licenses']} licenses, ${row['monthly_cost']:,.2f}/month, "
+              f"risk {row['risk_score']} ({row['risk_level']})")
+    for failure in report['failed']:
+        print(f"! {failure['tenant']}: {failure['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,87 +6,44 @@ import boto3
 from datetime import datetime, timedelta
 from typing import Dict, List
 from decimal import Decimal
+import numpy as np
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from config.config import *
 from license_tracker import LicenseTracker
+from license_frame import classify_expiry
+from portfolio_engine import PortfolioAnalysis, PortfolioEngine
 
 class UsageAnalyzer:
-    def __init__(self):
-        """Khởi tạo Usage Analyzer"""
-        self.tracker = LicenseTracker()
+    def __init__(self, table_name: str = None, tracker: LicenseTracker = None):
+        """Khởi tạo Usage Analyzer (table_name: bảng của tenant, mặc định DYNAMODB_TABLE_NAME; tracker: dùng chung tracker có sẵn)"""
+        self.tracker = tracker or LicenseTracker(table_name=table_name)
     
-    def analyze_usage_patterns(self) -> Dict:
+    def analyze_usage_patterns(self, portfolio: PortfolioAnalysis = None) -> Dict:
         """Phân tích pattern sử dụng license"""
-        licenses = self.tracker.get_all_licenses()
-        analysis = {
-            'total_licenses': len(licenses),
-            'underutilized': [],
-            'overutilized': [],
-            'expiring_soon': [],
-            'expired': [],
-            'cost_analysis': {}
-        }
-        
-        total_cost = 0
-        total_waste = 0
-        
-        for license in licenses:
-            usage_rate = float(license['used_licenses']) / float(license['total_licenses'])
-            cost_per_license = float(license['cost_per_license'])
-            total_licenses = float(license['total_licenses'])
-            used_licenses = float(license['used_licenses'])
-            monthly_cost = cost_per_license * total_licenses
-            total_cost += monthly_cost
-            
-            # Kiểm tra underutilized (dưới 30%)
-            if usage_rate < COST_SETTINGS['min_usage_for_recommendation']:
-                waste = (total_licenses - used_licenses) * cost_per_license
-                total_waste += waste
-                analysis['underutilized'].append({
-                    'software': license['software_name'],
-                    'usage_rate': f"{usage_rate:.1%}",
-                    'unused_licenses': int(total_licenses - used_licenses),
-                    'potential_savings': waste
-                })
-            
-            # Kiểm tra overutilized (trên 95%)
-            if usage_rate > COMPLIANCE_THRESHOLDS['usage_critical']:
-                analysis['overutilized'].append({
-                    'software': license['software_name'],
-                    'usage_rate': f"{usage_rate:.1%}",
-                    'risk_level': 'HIGH'
-                })
-            
-            # Kiểm tra expiring soon và expired
-            if license.get('expiry_date'):
-                try:
-                    expiry = datetime.strptime(license['expiry_date'], '%Y-%m-%d')
-                    days_until_expiry = (expiry - datetime.now()).days
-                    if days_until_expiry < 0:
-                        analysis['expired'].append({
-                            'software': license['software_name'],
-                            'expiry_date': license['expiry_date'],
-                            'days_expired': abs(days_until_expiry)
-                        })
-                    elif days_until_expiry <= COMPLIANCE_THRESHOLDS['expiry_warning_days']:
-                        analysis['expiring_soon'].append({
-                            'software': license['software_name'],
-                            'expiry_date': license['expiry_date'],
-                            'days_remaining': days_until_expiry
-                        })
-                except:
-                    pass
-        
-        analysis['cost_analysis'] = {
-            'total_monthly_cost': total_cost,
-            'potential_monthly_savings': total_waste,
-            'efficiency_rate': f"{((total_cost - total_waste) / total_cost * 100):.1f}%" if total_cost > 0 else "0%"
-        }
-        
-        return analysis
+        portfolio = portfolio or PortfolioEngine(self.tracker).analyze()
+        return portfolio.usage_report()
+    
+    def get_expiring_licenses(self, days_ahead: int = COMPLIANCE_THRESHOLDS['expiry_warning_days']) -> List[Dict]:
+        """Danh sách license sắp hết hạn trong days_ahead ngày (query GSI, không scan cả bảng)"""
+        today = datetime.now()
+        licenses = self.tracker.licenses_expiring_between(today, today + timedelta(days=days_ahead + 1))
+        
+        # Cùng quy ước với analyze_usage_patterns: hết hạn hôm nay tính là expired
+        expiry = classify_expiry([license['expiry_date'] for license in licenses], now=today)
+        in_window = ~expiry.expired & expiry.has_expiry & (expiry.days_remaining <= days_ahead)
+        
+        expiring = [
+            {
+                'software': licenses[i]['software_name'],
+                'expiry_date': licenses[i]['expiry_date'],
+                'days_remaining': int(expiry.days_remaining[i])
+            }
+            for i in np.flatnonzero(in_window)
+        ]
+        return sorted(expiring, key=lambda item: item['expiry_date'])
     
     def generate_recommendations(self, analysis: Dict) -> List[str]:
         """Tạo đề xuất tối ưu hóa"""
@@ -121,13 +78,13 @@ class UsageAnalyzer:
         
         return recommendations
     
-    def print_analysis_report(self):
+    def print_analysis_report(self, portfolio: PortfolioAnalysis = None):
         """In báo cáo phân tích"""
         print("=" * 60)
         print("📊 BÁO CÁO PHÂN TÍCH LICENSE")
         print("=" * 60)
         
-        analysis = self.analyze_usage_patterns()
+        analysis = self.analyze_usage_patterns(portfolio)
         
         # Tổng quan
         print(f"\n🔍 TỔNG QUAN:")
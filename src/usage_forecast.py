@@ -0,0 +1,213 @@
+"""
+Usage Forecast - Dự báo used_licenses cho toàn bộ license trong một lượt
+Vectorized Holt (double exponential smoothing) over a licenses x days matrix
+"""
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+
+# Forecast settings (overridden by config/config.py if available)
+FORECAST_HISTORY_DAYS = 180
+FORECAST_INTERVAL = 0.8
+FORECAST_MIN_OBSERVATIONS = 7
+# Lưới tham số Holt; mỗi license chọn cặp (alpha, beta) có SSE one-step nhỏ nhất
+FORECAST_ALPHAS = (0.2, 0.5, 0.8)
+FORECAST_BETAS = (0.05, 0.2)
+# Thay đổi dự báo (so với mức hiện tại) vượt ngưỡng này thì coi là có xu hướng
+FORECAST_TREND_THRESHOLD = 0.05
+
+try:
+    from config.config import FORECAST_SETTINGS
+    FORECAST_HISTORY_DAYS = FORECAST_SETTINGS.get('history_days', FORECAST_HISTORY_DAYS)
+    FORECAST_INTERVAL = FORECAST_SETTINGS.get('interval', FORECAST_INTERVAL)
+    FORECAST_MIN_OBSERVATIONS = FORECAST_SETTINGS.get('min_observations', FORECAST_MIN_OBSERVATIONS)
+except ImportError:
+    pass
+
+
+def usage_matrix(history: pd.DataFrame, license_ids: Sequence[str], end=None,
+                 days: int = FORECAST_HISTORY_DAYS, value: str = 'max_used') -> Tuple[np.ndarray, np.ndarray]:
+    """Chuỗi dài (license_id, day, value) -> (ma trận licenses x days, mask ngày có record thật)
+
+    Rows follow license_ids (unique); days without a record carry the previous value
+    forward (usage is a level that persists until the next change). Days
+    before a license's first record stay NaN. The observed mask is True
+    only where a record exists, so forward-filled days are not counted as
+    observations.
+    """
+    license_ids = np.asarray(license_ids, dtype=object)
+    matrix = np.full((len(license_ids), days), np.nan)
+    if history is None or not len(history) or not len(license_ids):
+        return matrix, ~np.isnan(matrix)
+
+    day = pd.to_datetime(history['day']).to_numpy().astype('datetime64[D]')
+    end = day.max() if end is None else np.datetime64(end, 'D')
+    column = (day - (end - np.timedelta64(days - 1, 'D'))).astype(np.int64)
+    row = pd.Index(license_ids).get_indexer(history['license_id'].astype(str))
+    keep = (row >= 0) & (column >= 0) & (column < days)
+    matrix[row[keep], column[keep]] = history[value].to_numpy(dtype=np.float64)[keep]
+
+    # Forward-fill theo trục ngày
+    observed = ~np.isnan(matrix)
+    index = np.where(observed, np.arange(days), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = matrix[np.arange(len(license_ids))[:, None], index]
+    filled[~np.maximum.accumulate(observed, axis=1)] = np.nan
+    return filled, observed
+
+
+@dataclass(frozen=True)
+class UsageForecast:
+    """Dự báo cho mọi license - mảng theo hàng (license) và cột (ngày tới 1..horizon)
+
+    fitted is False where there were fewer than FORECAST_MIN_OBSERVATIONS
+    observed days of history; those rows hold a flat forecast at the last known usage
+    and NaN interval bounds.
+    """
+    license_ids: np.ndarray
+    horizon: int
+    interval: float
+    forecast: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    last_observed: np.ndarray
+    trend_per_day: np.ndarray
+    sigma: np.ndarray
+    alpha: np.ndarray
+    beta: np.ndarray
+    observations: np.ndarray
+    fitted: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.license_ids)
+
+    def index_of(self, license_id: str) -> Optional[int]:
+        matches = np.flatnonzero(self.license_ids == license_id)
+        return int(matches[0]) if len(matches) else None
+
+    def trends(self, days_ahead: Optional[int] = None) -> np.ndarray:
+        """'increasing' / 'decreasing' / 'stable' theo thay đổi dự báo tới days_ahead"""
+        step = min(days_ahead or self.horizon, self.horizon) - 1
+        change = (self.forecast[:, step] - self.last_observed) / np.maximum(self.last_observed, 1)
+        return np.where(change > FORECAST_TREND_THRESHOLD, 'increasing',
+                        np.where(change < -FORECAST_TREND_THRESHOLD, 'decreasing', 'stable'))
+
+
+def holt_forecast(matrix: np.ndarray, horizon: int, interval: float = FORECAST_INTERVAL,
+                  alphas: Sequence[float] = FORECAST_ALPHAS, betas: Sequence[float] = FORECAST_BETAS,
+                  min_observations: int = FORECAST_MIN_OBSERVATIONS,
+                  license_ids: Optional[Sequence[str]] = None,
+                  fallback: Optional[np.ndarray] = None,
+                  observed: Optional[np.ndarray] = None) -> UsageForecast:
+    """Holt linear trend cho mọi hàng của matrix cùng lúc
+
+    Every (alpha, beta) pair in the grid is run side by side as an extra
+    array axis; each row keeps the pair with the smallest one-step-ahead
+    squared error. Intervals use the Holt forecast-variance formula with the
+    residual sigma of the chosen pair. Each row starts with level at its
+    first observation and zero trend; leading NaNs (no history yet) are
+    skipped. fallback gives the last known usage for rows without history.
+    observed (from usage_matrix) marks days with a real record: only those
+    count toward observations and the squared error, while forward-filled
+    days still move level and trend.
+    """
+    n, days = matrix.shape
+    horizon = max(1, int(horizon))
+    grid_alpha, grid_beta = (a.ravel()[:, None] for a in np.meshgrid(alphas, betas, indexing='ij'))
+
+    level = np.zeros((len(grid_alpha), n))
+    trend = np.zeros_like(level)
+    sse = np.zeros_like(level)
+    observations = np.zeros(n, dtype=np.int64)
+    started = np.zeros(n, dtype=bool)
+
+    for t in range(days):
+        y = matrix[:, t]
+        valid = ~np.isnan(y)
+        real = valid if observed is None else valid & observed[:, t]
+        first = valid & ~started
+        update = valid & started
+        # Error-correction form: l = l + b + alpha*e, b = b + alpha*beta*e
+        error = np.where(update, y - (level + trend), 0.0)
+        # Ngày forward-fill không phải quan sát: không tính vào SSE/sigma
+        sse += np.where(real, error * error, 0.0)
+        level = np.where(update, level + trend + grid_alpha * error, level)
+        trend = np.where(update, trend + grid_alpha * grid_beta * error, trend)
+        level[:, first] = y[first]
+        observations += real
+        started |= valid
+
+    best = np.argmin(sse, axis=0)[None, :]
+    pick = lambda values: np.take_along_axis(values, best, axis=0)[0]
+    level, trend, sse = pick(level), pick(trend), pick(sse)
+    alpha = grid_alpha[best[0], 0]
+    beta = grid_beta[best[0], 0]
+    fitted = observations >= max(min_observations, 3)
+    sigma = np.where(fitted, np.sqrt(sse / np.maximum(observations - 3, 1)), np.nan)
+
+    last_observed = np.where(started, matrix[np.arange(n), days - 1] if days else 0.0, np.nan)
+    if fallback is not None:
+        last_observed = np.where(np.isnan(last_observed), np.asarray(fallback, dtype=np.float64), last_observed)
+    last_observed = np.nan_to_num(last_observed)
+
+    steps = np.arange(1, horizon + 1)
+    forecast = np.where(fitted[:, None], level[:, None] + trend[:, None] * steps, last_observed[:, None])
+    forecast = np.maximum(forecast, 0)
+    # Var(h) = sigma^2 * (1 + sum_{j<h} alpha^2 (1 + j*beta)^2)
+    j = steps[:-1]
+    growth = np.cumsum((alpha[:, None] * (1 + j * beta[:, None])) ** 2, axis=1)
+    variance_factor = 1 + np.concatenate((np.zeros((n, 1)), growth), axis=1)
+    half_width = NormalDist().inv_cdf(0.5 + interval / 2) * sigma[:, None] * np.sqrt(variance_factor)
+
+    trend_per_day = np.where(fitted, trend, 0.0)
+    result = UsageForecast(
+        license_ids=np.asarray(license_ids if license_ids is not None else np.arange(n), dtype=object),
+        horizon=horizon,
+        interval=interval,
+        forecast=forecast,
+        lower=np.maximum(forecast - half_width, 0),
+        upper=forecast + half_width,
+        last_observed=last_observed,
+        trend_per_day=trend_per_day,
+        sigma=sigma,
+        alpha=np.where(fitted, alpha, np.nan),
+        beta=np.where(fitted, beta, np.nan),
+        observations=observations,
+        fitted=fitted
+    )
+    for array in (result.forecast, result.lower, result.upper, result.last_observed,
+                  result.trend_per_day, result.sigma, result.alpha, result.beta,
+                  result.observations, result.fitted):
+        array.setflags(write=False)
+    return result
+
+
+def forecast_record(result: UsageForecast, index: int, days_ahead: int, total_licenses: int) -> Dict:
+    """Kết quả dự báo của một license dạng dict (giữ các key cũ của predict_usage_trend)
+
+    confidence is derived from the prediction interval: 1 minus the interval
+    width relative to the license's seat count (0 when not fitted).
+    """
+    step = min(max(1, int(days_ahead)), result.horizon) - 1
+    predicted = float(result.forecast[index, step])
+    lower = float(result.lower[index, step])
+    upper = float(result.upper[index, step])
+    fitted = bool(result.fitted[index])
+    confidence = 1 - (upper - lower) / max(total_licenses, 1) if fitted else 0.0
+    return {
+        'license_id': str(result.license_ids[index]),
+        'current_usage': float(result.last_observed[index]),
+        'predicted_usage': predicted,
+        'lower_bound': lower if fitted else None,
+        'upper_bound': upper if fitted else None,
+        'interval': result.interval,
+        'trend': str(result.trends(days_ahead)[index]),
+        'trend_per_day': float(result.trend_per_day[index]),
+        'confidence': float(np.clip(confidence, 0, 1)),
+        'method': 'holt' if fitted else 'insufficient_history',
+        'observations': int(result.observations[index]),
+        'days_ahead': days_ahead
+    }
@@ -0,0 +1,763 @@
+"""
+Usage History - Lịch sử used_licenses theo thời gian
+Append-only usage snapshots with range queries and daily rollups
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from .aws_config import get_boto3_resource
+
+# Bảng DynamoDB lịch sử = tên bảng license + hậu tố
+HISTORY_TABLE_SUFFIX = '_usage_history'
+# Điểm raw hết hạn (DynamoDB TTL, SQLite/in-memory prune) sau số ngày này; rollup theo ngày được giữ lại
+HISTORY_RAW_RETENTION_DAYS = 90
+# SQLite/in-memory: prune điểm raw quá hạn tối đa một lần mỗi khoảng này (giây) khi append
+HISTORY_PRUNE_INTERVAL_SECONDS = 3600
+# DynamoDB: append có từ số nhóm (license, ngày) này trở lên (import) được fold ở client, ghi bằng BatchWriteItem
+HISTORY_BULK_FOLD_MIN_GROUPS = 25
+
+try:
+    from config.config import USAGE_HISTORY_SETTINGS
+    HISTORY_RAW_RETENTION_DAYS = USAGE_HISTORY_SETTINGS.get('raw_retention_days', HISTORY_RAW_RETENTION_DAYS)
+    HISTORY_PRUNE_INTERVAL_SECONDS = USAGE_HISTORY_SETTINGS.get('prune_interval_seconds', HISTORY_PRUNE_INTERVAL_SECONDS)
+    HISTORY_BULK_FOLD_MIN_GROUPS = USAGE_HISTORY_SETTINGS.get('bulk_fold_min_groups', HISTORY_BULK_FOLD_MIN_GROUPS)
+except ImportError:
+    pass
+
+# DynamoDB: GSI thưa trên rollup ngày (partition = ngày) để đọc rollup mọi license theo khoảng ngày
+ROLLUP_INDEX_NAME = 'rollup_day-license_id-index'
+# Số request song song: fold rollup của một lần append, ghi batch, query rollup theo từng ngày
+HISTORY_MAX_WORKERS = 8
+# DynamoDB giới hạn mỗi request
+HISTORY_BATCH_GET_SIZE = 100
+HISTORY_BATCH_WRITE_SIZE = 25
+
+# Sort key DynamoDB: điểm raw 'T#<ISO timestamp>', rollup ngày 'D#<YYYY-MM-DD>'
+RAW_PREFIX = 'T#'
+DAILY_PREFIX = 'D#'
+# Ký tự lớn hơn mọi ký tự trong timestamp ISO - để end dạng ngày bao gồm cả ngày đó
+_RANGE_END = '~'
+
+# Một bản ghi lịch sử: (license_id, recorded_at ISO, used_licenses)
+UsageRecord = Tuple[str, str, int]
+
+DAILY_COLUMNS = ['license_id', 'day', 'samples', 'max_used', 'avg_used', 'last_used']
+
+
+@dataclass(frozen=True)
+class UsageSeries:
+    """Chuỗi điểm raw của một license, sắp theo thời gian"""
+    license_id: str
+    timestamps: np.ndarray
+    used_licenses: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+@dataclass(frozen=True)
+class DailyRollup:
+    """Rollup theo ngày của một license (chỉ những ngày có dữ liệu)"""
+    license_id: str
+    days: np.ndarray
+    samples: np.ndarray
+    max_used: np.ndarray
+    avg_used: np.ndarray
+    last_used: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'license_id': self.license_id,
+            'day': self.days,
+            'samples': self.samples,
+            'max_used': self.max_used,
+            'avg_used': self.avg_used,
+            'last_used': self.last_used
+        }, columns=DAILY_COLUMNS)
+
+
+def _range_bounds(start: Optional[str], end: Optional[str]) -> Tuple[str, str]:
+    """[start, end] dạng chuỗi so sánh được với timestamp ISO (end dạng ngày gồm cả ngày đó)"""
+    start = start if isinstance(start, str) or start is None else start.isoformat()
+    end = end if isinstance(end, str) or end is None else end.isoformat()
+    low = start or ''
+    high = end if end and len(end) > 10 else (end or '') + _RANGE_END
+    return low, high
+
+
+def _day_bounds(start: Optional[str], end: Optional[str]) -> Tuple[str, str]:
+    """[start, end] thu về ngày YYYY-MM-DD"""
+    low, high = _range_bounds(start, end)
+    return low[:10], high[:10] if high != _RANGE_END else _RANGE_END
+
+
+def _to_datetime64(values: List[str]) -> np.ndarray:
+    return np.array(values, dtype='datetime64[us]')
+
+
+def aggregate_daily(records: List[UsageRecord]) -> Dict[Tuple[str, str], List]:
+    """Gộp bản ghi theo (license_id, ngày) -> [samples, usage_sum, max_used, last_used, last_at]"""
+    groups = {}
+    for license_id, recorded_at, used in records:
+        used = int(used)
+        group = groups.get((license_id, recorded_at[:10]))
+        if group is None:
+            groups[(license_id, recorded_at[:10])] = [1, used, used, used, recorded_at]
+            continue
+        group[0] += 1
+        group[1] += used
+        group[2] = max(group[2], used)
+        if recorded_at >= group[4]:
+            group[3], group[4] = used, recorded_at
+    return groups
+
+
+def _deserialize_item(item: Optional[Dict]) -> Optional[Dict]:
+    """AttributeValue map trả kèm lỗi ConditionalCheckFailed -> dict Python"""
+    if not item:
+        return None
+    deserializer = TypeDeserializer()
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def _retention_cutoff(raw_retention_days: int) -> str:
+    """Timestamp ISO: điểm raw ghi trước mốc này đã quá hạn giữ"""
+    return (datetime.now() - timedelta(days=raw_retention_days)).isoformat()
+
+
+class UsageHistoryStore:
+    """Interface lưu lịch sử sử dụng
+
+    Stores are append-only. Each append also folds the point into a per-day
+    rollup (samples, sum, max, last) so long ranges are read from the
+    rollups instead of the raw points. Raw points older than
+    raw_retention_days are dropped; rollups are kept. Methods raise on
+    failure; LicenseTracker handles logging.
+    """
+    name = 'base'
+
+    def ensure_ready(self):
+        raise NotImplementedError
+
+    def append(self, records: List[UsageRecord]):
+        """Ghi thêm các điểm (license_id, recorded_at, used_licenses)"""
+        raise NotImplementedError
+
+    def query(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> UsageSeries:
+        """Điểm raw trong khoảng [start, end] (ngày hoặc timestamp ISO)"""
+        raise NotImplementedError
+
+    def daily_rollup(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> DailyRollup:
+        """Rollup ngày của một license trong khoảng [start, end]"""
+        raise NotImplementedError
+
+    def daily_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Rollup ngày của mọi license (cột DAILY_COLUMNS), sắp theo license_id, day"""
+        raise NotImplementedError
+
+
+class DynamoDBUsageHistory(UsageHistoryStore):
+    name = 'dynamodb'
+
+    def __init__(self, table_name: str, region: str, logger, raw_retention_days: int = HISTORY_RAW_RETENTION_DAYS):
+        self.table_name = table_name
+        self.region = region
+        self.logger = logger
+        self.raw_retention_days = raw_retention_days
+        self._ready = False
+        self._has_rollup_index = False
+        self._lock = threading.Lock()
+
+    @property
+    def dynamodb(self):
+        # Resource theo thread (xem DynamoDBBackend.dynamodb)
+        return get_boto3_resource('dynamodb', self.region)
+
+    def ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            client = self.dynamodb.meta.client
+            try:
+                description = client.describe_table(TableName=self.table_name)['Table']
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                    raise
+                self._create_table(client)
+                description = client.describe_table(TableName=self.table_name)['Table']
+            if description.get('TableStatus') != 'ACTIVE':
+                client.get_waiter('table_exists').wait(TableName=self.table_name)
+            # Bảng tạo trước khi có GSI rollup: daily_rollups quay về scan
+            self._has_rollup_index = any(
+                index['IndexName'] == ROLLUP_INDEX_NAME for index in description.get('GlobalSecondaryIndexes', [])
+            )
+            self._ready = True
+
+    def _create_table(self, client):
+        """Tạo bảng (license_id, sk), chờ ACTIVE rồi bật TTL cho điểm raw"""
+        try:
+            client.create_table(
+                TableName=self.table_name,
+                KeySchema=[
+                    {'AttributeName': 'license_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'sk', 'KeyType': 'RANGE'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'license_id', 'AttributeType': 'S'},
+                    {'AttributeName': 'sk', 'AttributeType': 'S'},
+                    {'AttributeName': 'rollup_day', 'AttributeType': 'S'}
+                ],
+                GlobalSecondaryIndexes=[
+                    {
+                        # Chỉ rollup ngày có rollup_day: index thưa, không chứa điểm raw
+                        'IndexName': ROLLUP_INDEX_NAME,
+                        'KeySchema': [
+                            {'AttributeName': 'rollup_day', 'KeyType': 'HASH'},
+                            {'AttributeName': 'license_id', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {'ProjectionType': 'ALL'}
+                    }
+                ],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            self.logger.info(f"Created table: {self.table_name}")
+        except ClientError as e:
+            # Process khác vừa tạo bảng (và bật TTL)
+            if e.response['Error']['Code'] != 'ResourceInUseException':
+                raise
+            client.get_waiter('table_exists').wait(TableName=self.table_name)
+            return
+        client.get_waiter('table_exists').wait(TableName=self.table_name)
+        # Điểm raw tự hết hạn; rollup ngày không có expires_at nên được giữ
+        client.update_time_to_live(
+            TableName=self.table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+
+    def append(self, records: List[UsageRecord]):
+        """Ghi điểm raw bằng BatchWriteItem và fold chúng vào rollup ngày
+
+        Small appends (streaming updates) fold each (license, day) group with
+        one UpdateItem that never conflicts with concurrent folds. Appends
+        with at least HISTORY_BULK_FOLD_MIN_GROUPS groups - imports - read the
+        stored rollups (BatchGetItem), merge on the client and write them
+        back with the raw points, so a 500-row import costs a few dozen
+        requests instead of one per license. That merge is not conditional:
+        a fold of the same license-day by another writer between the read
+        and the write is lost.
+        """
+        self.ensure_ready()
+        expires_at = int(time.time()) + self.raw_retention_days * 86400
+        items = [
+            {'license_id': license_id, 'sk': RAW_PREFIX + recorded_at, 'used_licenses': int(used), 'expires_at': expires_at}
+            for license_id, recorded_at, used in records
+        ]
+        groups = aggregate_daily(records)
+        if len(groups) >= HISTORY_BULK_FOLD_MIN_GROUPS:
+            self._batch_write(items + self._merge_rollups(groups))
+            return
+        self._batch_write(items)
+
+        # Một update cho mỗi (license, ngày) thay vì mỗi điểm; các nhóm độc lập chạy song song
+        groups = list(groups.items())
+        if len(groups) == 1:
+            self._fold_daily(*groups[0])
+            return
+        with ThreadPoolExecutor(max_workers=min(HISTORY_MAX_WORKERS, len(groups))) as executor:
+            list(executor.map(lambda group: self._fold_daily(*group), groups))
+
+    def _batch_write(self, items: List[Dict]):
+        """BatchWriteItem 25 item/request, các phần chia cho tối đa HISTORY_MAX_WORKERS thread"""
+        requests = -(-len(items) // HISTORY_BATCH_WRITE_SIZE)
+        workers = min(HISTORY_MAX_WORKERS, requests)
+        if workers <= 1:
+            self._write_items(items)
+            return
+        size = -(-requests // workers) * HISTORY_BATCH_WRITE_SIZE
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(self._write_items, [items[start:start + size] for start in range(0, len(items), size)]))
+
+    def _write_items(self, items: List[Dict]):
+        # batch_writer retry UnprocessedItems; hai điểm trùng timestamp giữ điểm sau
+        with self.dynamodb.Table(self.table_name).batch_writer(overwrite_by_pkeys=['license_id', 'sk']) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    def _merge_rollups(self, groups: Dict[Tuple[str, str], List]) -> List[Dict]:
+        """Rollup ngày sau khi cộng các nhóm vào rollup đã lưu (đọc bằng BatchGetItem song song)"""
+        keys = [{'license_id': license_id, 'sk': DAILY_PREFIX + day} for license_id, day in groups]
+        chunks = [keys[start:start + HISTORY_BATCH_GET_SIZE] for start in range(0, len(keys), HISTORY_BATCH_GET_SIZE)]
+        with ThreadPoolExecutor(max_workers=min(HISTORY_MAX_WORKERS, len(chunks))) as executor:
+            stored = {
+                (item['license_id'], item['sk'][len(DAILY_PREFIX):]): item
+                for chunk_items in executor.map(self._get_rollups, chunks) for item in chunk_items
+            }
+
+        merged = []
+        for (license_id, day), (samples, usage_sum, max_used, last_used, last_at) in groups.items():
+            old = stored.get((license_id, day))
+            if old and 'last_at' in old:
+                if old['last_at'] == last_at:
+                    continue  # Đã fold (append được gọi lại)
+                samples += int(old['samples'])
+                usage_sum += int(old['usage_sum'])
+                max_used = max(max_used, int(old['max_used']))
+                if old['last_at'] > last_at:
+                    last_used, last_at = int(old['last_used']), old['last_at']
+            merged.append({
+                'license_id': license_id, 'sk': DAILY_PREFIX + day, 'rollup_day': day,
+                'samples': samples, 'usage_sum': usage_sum, 'max_used': max_used,
+                'last_used': last_used, 'last_at': last_at
+            })
+        return merged
+
+    def _get_rollups(self, keys: List[Dict]) -> List[Dict]:
+        dynamodb = self.dynamodb
+        request = {self.table_name: {'Keys': keys, 'ConsistentRead': True}}
+        items = []
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(self.table_name, []))
+            request = response.get('UnprocessedKeys') or {}
+        return items
+
+    def _fold_daily(self, key: Tuple[str, str], group: List):
+        """Cộng một nhóm điểm vào rollup ngày: ADD samples/usage_sum, max/last chỉ tiến lên
+
+        The first request assumes the group is newer and not smaller than the
+        stored day (the common streaming case) and folds it whole. When that
+        condition fails the stored item comes back with the error: a group
+        whose latest point is already the stored last_at was folded before (a
+        retried append) and is skipped; otherwise the sums are ADDed without
+        a condition and max/last are each SET only if they move forward. A
+        failed forward condition means a newer value is already stored, so
+        nothing is retried and a hot license cannot make the fold give up.
+        """
+        license_id, day = key
+        samples, usage_sum, max_used, last_used, last_at = group
+        table = self.dynamodb.Table(self.table_name)
+        item_key = {'license_id': license_id, 'sk': DAILY_PREFIX + day}
+        try:
+            table.update_item(
+                Key=item_key,
+                UpdateExpression='ADD samples :n, usage_sum :sum '
+                                 'SET rollup_day = :day, max_used = :max, last_used = :last, last_at = :at',
+                ConditionExpression='attribute_not_exists(last_at) OR (last_at < :at AND max_used <= :max)',
+                ExpressionAttributeValues={':n': samples, ':sum': usage_sum, ':day': day,
+                                           ':max': max_used, ':last': last_used, ':at': last_at},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            old = _deserialize_item(e.response.get('Item')) or {}
+
+        if old.get('last_at') == last_at:
+            return
+        table.update_item(
+            Key=item_key,
+            UpdateExpression='ADD samples :n, usage_sum :sum SET rollup_day = :day',
+            ExpressionAttributeValues={':n': samples, ':sum': usage_sum, ':day': day}
+        )
+        if int(old.get('max_used', -1)) < max_used:
+            self._advance(table, item_key, 'max_used = :max',
+                          'attribute_not_exists(max_used) OR max_used < :max', {':max': max_used})
+        if old.get('last_at', '') < last_at:
+            self._advance(table, item_key, 'last_used = :last, last_at = :at',
+                          'attribute_not_exists(last_at) OR last_at < :at', {':last': last_used, ':at': last_at})
+
+    @staticmethod
+    def _advance(table, key: Dict, update: str, condition: str, values: Dict):
+        """SET có điều kiện chỉ tiến lên; điều kiện sai nghĩa là giá trị mới hơn đã được lưu"""
+        try:
+            table.update_item(Key=key, UpdateExpression='SET ' + update,
+                              ConditionExpression=condition, ExpressionAttributeValues=values)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    def _query(self, license_id: str, low: str, high: str) -> List[Dict]:
+        table = self.dynamodb.Table(self.table_name)
+        params = {'KeyConditionExpression': Key('license_id').eq(license_id) & Key('sk').between(low, high)}
+        items = []
+        while True:
+            response = table.query(**params)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            params['ExclusiveStartKey'] = last_key
+
+    def query(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> UsageSeries:
+        self.ensure_ready()
+        low, high = _range_bounds(start, end)
+        items = self._query(license_id, RAW_PREFIX + low, RAW_PREFIX + high)
+        return UsageSeries(
+            license_id=license_id,
+            timestamps=_to_datetime64([item['sk'][len(RAW_PREFIX):] for item in items]),
+            used_licenses=np.array([int(item['used_licenses']) for item in items], dtype=np.int64)
+        )
+
+    def daily_rollup(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> DailyRollup:
+        self.ensure_ready()
+        low, high = _day_bounds(start, end)
+        items = self._query(license_id, DAILY_PREFIX + low, DAILY_PREFIX + high)
+        return self._to_rollup(license_id, items)
+
+    def daily_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Query GSI rollup theo từng ngày trong [start, end] (song song)
+
+        Without a start date, or on a table created before the index
+        existed, the rollups are read with a filtered scan instead.
+        """
+        self.ensure_ready()
+        low, high = _day_bounds(start, end)
+        if low and self._has_rollup_index:
+            last_day = datetime.now().strftime('%Y-%m-%d') if high == _RANGE_END else high
+            days = [str(day) for day in np.arange(np.datetime64(low, 'D'), np.datetime64(last_day, 'D') + 1)]
+            with ThreadPoolExecutor(max_workers=max(1, min(HISTORY_MAX_WORKERS, len(days)))) as executor:
+                pages = executor.map(lambda day: self._query_rollup_day(day), days)
+                items = [item for day_items in pages for item in day_items]
+        else:
+            items = self._scan_rollups(low, high)
+        return _daily_frame([
+            (item['license_id'], item['sk'][len(DAILY_PREFIX):], int(item['samples']),
+             int(item['usage_sum']), int(item['max_used']), int(item['last_used']))
+            for item in items
+        ])
+
+    def _query_rollup_day(self, day: str) -> List[Dict]:
+        table = self.dynamodb.Table(self.table_name)
+        params = {'IndexName': ROLLUP_INDEX_NAME, 'KeyConditionExpression': Key('rollup_day').eq(day)}
+        items = []
+        while True:
+            response = table.query(**params)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            params['ExclusiveStartKey'] = last_key
+
+    def _scan_rollups(self, low: str, high: str) -> List[Dict]:
+        table = self.dynamodb.Table(self.table_name)
+        params = {'FilterExpression': Attr('sk').between(DAILY_PREFIX + low, DAILY_PREFIX + high)}
+        items = []
+        while True:
+            response = table.scan(**params)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            params['ExclusiveStartKey'] = last_key
+
+    @staticmethod
+    def _to_rollup(license_id: str, items: List[Dict]) -> DailyRollup:
+        samples = np.array([int(item['samples']) for item in items], dtype=np.int64)
+        usage_sum = np.array([int(item['usage_sum']) for item in items], dtype=np.int64)
+        return DailyRollup(
+            license_id=license_id,
+            days=np.array([item['sk'][len(DAILY_PREFIX):] for item in items], dtype='datetime64[D]'),
+            samples=samples,
+            max_used=np.array([int(item['max_used']) for item in items], dtype=np.int64),
+            avg_used=usage_sum / np.maximum(samples, 1),
+            last_used=np.array([int(item['last_used']) for item in items], dtype=np.int64)
+        )
+
+
+class SQLiteUsageHistory(UsageHistoryStore):
+    name = 'sqlite'
+
+    def __init__(self, db_path: str, logger, raw_retention_days: int = HISTORY_RAW_RETENTION_DAYS):
+        self.db_path = db_path
+        self.logger = logger
+        self.raw_retention_days = raw_retention_days
+        self._lock = threading.RLock()
+        self._conn = None
+        self._ready = False
+        self._last_prune = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path != ':memory:':
+                directory = os.path.dirname(os.path.abspath(self.db_path))
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        return self._conn
+
+    def ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS usage_history (
+                        license_id TEXT NOT NULL,
+                        recorded_at TEXT NOT NULL,
+                        used_licenses INTEGER NOT NULL
+                    )
+                """)
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS idx_usage_history_license '
+                    'ON usage_history (license_id, recorded_at)'
+                )
+                # Cho prune theo recorded_at trên mọi license
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS idx_usage_history_recorded '
+                    'ON usage_history (recorded_at)'
+                )
+                # Rollup ngày cập nhật cùng transaction với điểm raw
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS usage_daily (
+                        license_id TEXT NOT NULL,
+                        day TEXT NOT NULL,
+                        samples INTEGER NOT NULL,
+                        usage_sum INTEGER NOT NULL,
+                        max_used INTEGER NOT NULL,
+                        last_used INTEGER NOT NULL,
+                        last_at TEXT NOT NULL,
+                        PRIMARY KEY (license_id, day)
+                    )
+                """)
+            self._ready = True
+
+    def append(self, records: List[UsageRecord]):
+        self.ensure_ready()
+        rows = [(license_id, recorded_at, int(used)) for license_id, recorded_at, used in records]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO usage_history (license_id, recorded_at, used_licenses) VALUES (?, ?, ?)',
+                    rows
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO usage_daily (license_id, day, samples, usage_sum, max_used, last_used, last_at)
+                    VALUES (?, ?, 1, ?, ?, ?, ?)
+                    ON CONFLICT(license_id, day) DO UPDATE SET
+                        samples = samples + 1,
+                        usage_sum = usage_sum + excluded.usage_sum,
+                        max_used = MAX(max_used, excluded.max_used),
+                        last_used = CASE WHEN excluded.last_at >= last_at THEN excluded.last_used ELSE last_used END,
+                        last_at = MAX(last_at, excluded.last_at)
+                    """,
+                    [(license_id, recorded_at[:10], used, used, used, recorded_at)
+                     for license_id, recorded_at, used in rows]
+                )
+                if time.monotonic() - self._last_prune >= HISTORY_PRUNE_INTERVAL_SECONDS:
+                    self._prune(conn, _retention_cutoff(self.raw_retention_days))
+
+    def prune(self, before: Optional[str] = None) -> int:
+        """Xóa điểm raw ghi trước before (mặc định: quá raw_retention_days); rollup ngày được giữ"""
+        self.ensure_ready()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return self._prune(conn, before or _retention_cutoff(self.raw_retention_days))
+
+    def _prune(self, conn: sqlite3.Connection, before: str) -> int:
+        self._last_prune = time.monotonic()
+        return conn.execute('DELETE FROM usage_history WHERE recorded_at < ?', (before,)).rowcount
+
+    def query(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> UsageSeries:
+        self.ensure_ready()
+        low, high = _range_bounds(start, end)
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT recorded_at, used_licenses FROM usage_history '
+                'WHERE license_id = ? AND recorded_at BETWEEN ? AND ? ORDER BY recorded_at',
+                (license_id, low, high)
+            ).fetchall()
+        return UsageSeries(
+            license_id=license_id,
+            timestamps=_to_datetime64([row[0] for row in rows]),
+            used_licenses=np.array([row[1] for row in rows], dtype=np.int64)
+        )
+
+    def daily_rollup(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> DailyRollup:
+        self.ensure_ready()
+        low, high = _day_bounds(start, end)
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT day, samples, usage_sum, max_used, last_used FROM usage_daily '
+                'WHERE license_id = ? AND day BETWEEN ? AND ? ORDER BY day',
+                (license_id, low, high)
+            ).fetchall()
+        samples = np.array([row[1] for row in rows], dtype=np.int64)
+        return DailyRollup(
+            license_id=license_id,
+            days=np.array([row[0] for row in rows], dtype='datetime64[D]'),
+            samples=samples,
+            max_used=np.array([row[3] for row in rows], dtype=np.int64),
+            avg_used=np.array([row[2] for row in rows], dtype=np.int64) / np.maximum(samples, 1),
+            last_used=np.array([row[4] for row in rows], dtype=np.int64)
+        )
+
+    def daily_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        self.ensure_ready()
+        low, high = _day_bounds(start, end)
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT license_id, day, samples, usage_sum, max_used, last_used FROM usage_daily '
+                'WHERE day BETWEEN ? AND ?',
+                (low, high)
+            ).fetchall()
+        return _daily_frame(rows)
+
+
+class _SeriesBuffer:
+    """Mảng NumPy tăng dần dung lượng (gấp đôi) cho một license"""
+
+    def __init__(self, capacity: int = 16):
+        self.timestamps = np.empty(capacity, dtype='datetime64[us]')
+        self.used = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, timestamp: np.datetime64, used: int):
+        if self.size == len(self.used):
+            self.timestamps = np.resize(self.timestamps, 2 * self.size)
+            self.used = np.resize(self.used, 2 * self.size)
+        self.timestamps[self.size] = timestamp
+        self.used[self.size] = used
+        self.size += 1
+
+    def prune(self, before: np.datetime64) -> int:
+        """Bỏ các điểm trước before (giữ thứ tự ghi); trả về số điểm bị bỏ"""
+        keep = self.timestamps[:self.size] >= before
+        kept = int(np.count_nonzero(keep))
+        removed = self.size - kept
+        if removed:
+            self.timestamps[:kept] = self.timestamps[:self.size][keep]
+            self.used[:kept] = self.used[:self.size][keep]
+            self.size = kept
+        return removed
+
+
+class InMemoryUsageHistory(UsageHistoryStore):
+    name = 'memory'
+
+    def __init__(self, raw_retention_days: int = HISTORY_RAW_RETENTION_DAYS):
+        self.raw_retention_days = raw_retention_days
+        self._series = {}
+        # Rollup ngày fold khi append (như SQLite/DynamoDB): license_id -> {day: [samples, sum, max, last, last_at]}
+        self._daily = {}
+        self._lock = threading.RLock()
+        self._last_prune = 0.0
+
+    def ensure_ready(self):
+        pass
+
+    def append(self, records: List[UsageRecord]):
+        with self._lock:
+            for license_id, recorded_at, used in records:
+                buffer = self._series.get(license_id)
+                if buffer is None:
+                    buffer = self._series[license_id] = _SeriesBuffer()
+                buffer.append(np.datetime64(recorded_at, 'us'), int(used))
+            for (license_id, day), group in aggregate_daily(records).items():
+                days = self._daily.setdefault(license_id, {})
+                rollup = days.get(day)
+                if rollup is None:
+                    days[day] = group
+                    continue
+                rollup[0] += group[0]
+                rollup[1] += group[1]
+                rollup[2] = max(rollup[2], group[2])
+                if group[4] >= rollup[4]:
+                    rollup[3], rollup[4] = group[3], group[4]
+            if time.monotonic() - self._last_prune >= HISTORY_PRUNE_INTERVAL_SECONDS:
+                self.prune()
+
+    def prune(self, before: Optional[str] = None) -> int:
+        """Bỏ điểm raw ghi trước before (mặc định: quá raw_retention_days); rollup ngày được giữ"""
+        cutoff = np.datetime64(before or _retention_cutoff(self.raw_retention_days), 'us')
+        with self._lock:
+            self._last_prune = time.monotonic()
+            return sum(buffer.prune(cutoff) for buffer in self._series.values())
+
+    def _slice(self, license_id: str, start: Optional[str], end: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            buffer = self._series.get(license_id)
+            if buffer is None:
+                return np.array([], dtype='datetime64[us]'), np.array([], dtype=np.int64)
+            timestamps = buffer.timestamps[:buffer.size].copy()
+            used = buffer.used[:buffer.size].copy()
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start:
+            mask &= timestamps >= np.datetime64(start, 'us')
+        if end and len(end) > 10:
+            mask &= timestamps <= np.datetime64(end, 'us')
+        elif end:
+            # end dạng ngày: gồm cả ngày đó
+            mask &= timestamps < np.datetime64(end, 'D') + np.timedelta64(1, 'D')
+        order = np.argsort(timestamps[mask], kind='stable')
+        return timestamps[mask][order], used[mask][order]
+
+    def query(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> UsageSeries:
+        timestamps, used = self._slice(license_id, start, end)
+        return UsageSeries(license_id=license_id, timestamps=timestamps, used_licenses=used)
+
+    def _rollup_rows(self, license_id: str, low: str, high: str) -> List[tuple]:
+        """Rows (license_id, day, samples, usage_sum, max_used, last_used) trong [low, high], sắp theo ngày"""
+        with self._lock:
+            days = self._daily.get(license_id, {})
+            return sorted((license_id, day) + tuple(rollup[:4]) for day, rollup in days.items() if low <= day <= high)
+
+    def daily_rollup(self, license_id: str, start: Optional[str] = None, end: Optional[str] = None) -> DailyRollup:
+        rows = self._rollup_rows(license_id, *_day_bounds(start, end))
+        samples = np.array([row[2] for row in rows], dtype=np.int64)
+        return DailyRollup(
+            license_id=license_id,
+            days=np.array([row[1] for row in rows], dtype='datetime64[D]'),
+            samples=samples,
+            max_used=np.array([row[4] for row in rows], dtype=np.int64),
+            avg_used=np.array([row[3] for row in rows], dtype=np.int64) / np.maximum(samples, 1),
+            last_used=np.array([row[5] for row in rows], dtype=np.int64)
+        )
+
+    def daily_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        low, high = _day_bounds(start, end)
+        with self._lock:
+            license_ids = list(self._daily)
+        return _daily_frame([row for license_id in license_ids for row in self._rollup_rows(license_id, low, high)])
+
+
+def _daily_frame(rows: List[tuple]) -> pd.DataFrame:
+    """Rows (license_id, day, samples, usage_sum, max_used, last_used) -> DataFrame DAILY_COLUMNS"""
+    df = pd.DataFrame.from_records(
+        [tuple(row) for row in rows],
+        columns=['license_id', 'day', 'samples', 'usage_sum', 'max_used', 'last_used']
+    )
+    df['day'] = pd.to_datetime(df['day'], format='%Y-%m-%d')
+    df['avg_used'] = df['usage_sum'] / df['samples'].clip(lower=1)
+    return df[DAILY_COLUMNS].sort_values(['license_id', 'day'], ignore_index=True)
+
+
+def create_history_store(backend, logger) -> UsageHistoryStore:
+    """History store đi cùng storage backend của tracker"""
+    if backend.name == 'dynamodb':
+        return DynamoDBUsageHistory(backend.table_name + HISTORY_TABLE_SUFFIX, backend.region, logger)
+    if backend.name == 'sqlite':
+        return SQLiteUsageHistory(backend.db_path, logger)
+    return InMemoryUsageHistory()
@@ -12,6 +12,8 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.license_tracker import LicenseTracker
+from src.license_frame import LicenseFrame
+from src.portfolio_engine import PortfolioEngine
 from src.usage_analyzer import UsageAnalyzer
 from src.compliance_checker import ComplianceChecker
 from src.bulk_importer import BulkImporter
@@ -30,6 +32,14 @@ st.set_page_config(
     layout="wide"
 )
 
+# Chiều của aggregation cube -> nhãn hiển thị
+ROLLUP_DIMENSIONS = {
+    'vendor': 'Vendor',
+    'license_type': 'License Type',
+    'cost_center': 'Cost Center',
+    'expiry_month': 'Tháng Hết Hạn'
+}
+
 @st.cache_resource
 def init_system():
     tracker = LicenseTracker()
@@ -140,24 +150,24 @@ def show_dashboard(system):
         st.warning("Chưa có dữ liệu license. Vui lòng thêm license hoặc import dữ liệu.")
         return
     
-    df = pd.DataFrame(licenses)
-    df['used_licenses'] = pd.to_numeric(df['used_licenses'])
-    df['total_licenses'] = pd.to_numeric(df['total_licenses'])
-    df['cost_per_license'] = pd.to_numeric(df['cost_per_license'])
-    df['usage_rate'] = (df['used_licenses'] / df['total_licenses'] * 100).round(1)
-    df['total_cost'] = df['total_licenses'] * df['cost_per_license']
+    frame = LicenseFrame.from_tracker(system['tracker'])
+    df = frame.to_dataframe()
+    df['usage_rate'] = (df['usage_rate'] * 100).round(1)
+    
+    # Chỉ số chính đọc từ portfolio summary (một lần đọc, không scan)
+    summary = PortfolioEngine(system['tracker']).summary()
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Tổng License", len(licenses))
+        st.metric("Tổng License", summary.total_licenses if summary else len(licenses))
     with col2:
-        st.metric("Tổng Chi Phí", f"${df['total_cost'].sum():,.2f}")
+        total_cost = summary.total_monthly_cost if summary else df['total_cost'].sum()
+        st.metric("Tổng Chi Phí", f"${total_cost:,.2f}")
     with col3:
-        avg_usage = df['usage_rate'].mean()
+        avg_usage = summary.average_utilization * 100 if summary else df['usage_rate'].mean()
         st.metric("Usage Trung Bình", f"{avg_usage:.1f}%")
     with col4:
-        expired_count = sum(1 for l in licenses if l.get('expiry_date') and 
-                          datetime.strptime(l['expiry_date'], '%Y-%m-%d') < datetime.now())
+        expired_count = summary.expiry_counts()['expired'] if summary else int(frame.classify_expiry().expired.sum())
         st.metric("License Hết Hạn", expired_count)
     
     col1, col2 = st.columns(2)
@@ -170,9 +180,37 @@ def show_dashboard(system):
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        st.subheader("Cost by Software")
-        fig = px.pie(df, values='total_cost', names='software_name')
-        st.plotly_chart(fig, use_container_width=True)
+        st.subheader("Cost Breakdown")
+        dimension = st.selectbox("Nhóm theo", list(ROLLUP_DIMENSIONS), format_func=ROLLUP_DIMENSIONS.get)
+        rollup = pd.DataFrame(system['tracker'].get_rollup([dimension]))
+        if not rollup.empty:
+            fig = px.pie(rollup, values='monthly_spend', names=dimension)
+            st.plotly_chart(fig, use_container_width=True)
+    
+    show_rollup_drilldown(system)
+
+def show_rollup_drilldown(system):
+    """Drill-down spend/waste: chọn giá trị ở một chiều rồi xem chiều tiếp theo (đọc từ cube)"""
+    st.subheader("Spend Drill-down")
+    cube = system['tracker'].get_aggregation_cube()
+    dimensions = list(ROLLUP_DIMENSIONS)
+    filters = {}
+    columns = st.columns(len(dimensions))
+    for column, dimension in zip(columns, dimensions):
+        with column:
+            value = st.selectbox(ROLLUP_DIMENSIONS[dimension], ['(Tất cả)'] + cube.values(dimension),
+                                 key=f"drill_{dimension}")
+            if value != '(Tất cả)':
+                filters[dimension] = value
+    # Cấp tiếp theo của drill-down: một chiều chưa lọc
+    remaining = [dimension for dimension in dimensions if dimension not in filters]
+    by = st.selectbox("Chi tiết theo", remaining, format_func=ROLLUP_DIMENSIONS.get) if remaining else None
+    rollup = pd.DataFrame(cube.rollup([by] if by else dimensions, filters))
+    if rollup.empty:
+        st.info("Không có license khớp bộ lọc.")
+        return
+    rollup['utilization'] = (rollup['utilization'] * 100).round(1)
+    st.dataframe(rollup, use_container_width=True)
 
 def show_license_management(system):
     st.header("📝 License Management")
@@ -182,11 +220,9 @@ def show_license_management(system):
     with tab1:
         licenses = system['tracker'].get_all_licenses()
         if licenses:
-            df = pd.DataFrame(licenses)
-            df['used_licenses'] = pd.to_numeric(df['used_licenses'])
-            df['total_licenses'] = pd.to_numeric(df['total_licenses'])
-            df['cost_per_license'] = pd.to_numeric(df['cost_per_license'])
-            df['usage_rate'] = (df['used_licenses'] / df['total_licenses'] * 100).round(1)
+            df = LicenseFrame.from_tracker(system['tracker']).to_dataframe()
+            df['usage_rate'] = (df['usage_rate'] * 100).round(1)
+            df = df.drop(columns=['total_cost', 'waste_cost'])
             st.dataframe(df, use_container_width=True)
         else:
             st.info("Chưa có license nào.")
@@ -206,6 +242,7 @@ def show_license_management(system):
                 cost_per_license = st.number_input("Chi Phí/License ($)*", min_value=0.0, value=0.0)
             
             expiry_date = st.date_input("Ngày Hết Hạn (tùy chọn)", value=None)
+            cost_center = st.text_input("Cost Center (tùy chọn)")
             
             if st.form_submit_button("Thêm License"):
                 license_data = {
@@ -215,7 +252,8 @@ def show_license_management(system):
                     'total_licenses': total_licenses,
                     'used_licenses': used_licenses,
                     'expiry_date': expiry_date.strftime('%Y-%m-%d') if expiry_date else '',
-                    'cost_per_license': cost_per_license
+                    'cost_per_license': cost_per_license,
+                    'cost_center': cost_center
                 }
                 
                 errors = system['validator'].validate_license_data(license_data)
@@ -238,22 +276,24 @@ def show_license_management(system):
             
             if selected:
                 license_id = license_options[selected]
-                current_license = next(l for l in licenses if l['license_id'] == license_id)
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.info(f"Hiện tại: {current_license['used_licenses']}/{current_license['total_licenses']}")
-                with col2:
-                    new_usage = st.number_input("Usage Mới:", 
-                        min_value=0, max_value=int(current_license['total_licenses']),
-                        value=int(current_license['used_licenses']))
+                current_license = system['tracker'].get_license(license_id)
+                if not current_license:
+                    st.error("License không tồn tại!")
+                else:
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.info(f"Hiện tại: {current_license['used_licenses']}/{current_license['total_licenses']}")
+                    with col2:
+                        new_usage = st.number_input("Usage Mới:", 
+                            min_value=0, max_value=int(current_license['total_licenses']),
+                            value=int(current_license['used_licenses']))
                 
-                if st.button("Cập Nhật"):
-                    if system['tracker'].update_usage(license_id, new_usage):
-                        st.success("Cập nhật thành công!")
-                        st.rerun()
-                    else:
-                        st.error("Cập nhật thất bại!")
+                    if st.button("Cập Nhật"):
+                        if system['tracker'].update_usage(license_id, new_usage):
+                            st.success("Cập nhật thành công!")
+                            st.rerun()
+                        else:
+                            st.error("Cập nhật thất bại!")
     
     with tab4:
         st.subheader("Xóa License")
@@ -265,49 +305,71 @@ def show_license_management(system):
             
             if selected:
                 license_id = license_options[selected]
-                current_license = next(l for l in licenses if l['license_id'] == license_id)
-                
-                st.warning(f"⚠️ Bạn sắp xóa: **{current_license['software_name']}**")
-                st.info(f"License ID: {license_id}")
+                current_license = system['tracker'].get_license(license_id)
+                if not current_license:
+                    st.error("License không tồn tại!")
+                else:
+                    st.warning(f"⚠️ Bạn sắp xóa: **{current_license['software_name']}**")
+                    st.info(f"License ID: {license_id}")
                 
-                if st.button("❌ Xóa License", type="primary"):
-                    if system['tracker'].delete_license(license_id):
-                        st.success("Xóa thành công!")
-                        st.rerun()
-                    else:
-                        st.error("Xóa thất bại!")
+                    if st.button("❌ Xóa License", type="primary"):
+                        if system['tracker'].delete_license(license_id):
+                            st.success("Xóa thành công!")
+                            st.rerun()
+                        else:
+                            st.error("Xóa thất bại!")
         else:
             st.info("Không có license nào để xóa.")
 
 def show_data_management(system):
     st.header("💾 Data Management")
     
-    tab1, tab2 = st.tabs(["Import CSV", "Export CSV"])
+    tab1, tab2 = st.tabs(["Import", "Export"])
     
     with tab1:
-        st.subheader("Import Licenses từ CSV")
-        uploaded_file = st.file_uploader("Chọn CSV file", type=['csv'])
+        st.subheader("Import Licenses từ CSV / Parquet / Arrow")
+        uploaded_file = st.file_uploader("Chọn file", type=['csv', 'parquet', 'arrow', 'feather'])
         if uploaded_file:
             if st.button("Import"):
-                temp_path = f"temp_import_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                extension = os.path.splitext(uploaded_file.name)[1].lower()
+                temp_path = f"temp_import_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
                 with open(temp_path, 'wb') as f:
                     f.write(uploaded_file.getvalue())
                 
-                results = system['importer'].import_from_csv(temp_path)
+                progress_bar = st.progress(0.0)
+                status = st.empty()
+                
+                def show_progress(progress):
+                    if progress['total_bytes']:
+                        progress_bar.progress(min(progress['bytes_read'] / progress['total_bytes'], 1.0))
+                    status.text(f"Đã đọc {progress['rows_read']:,} dòng, ghi {progress['success']:,}, "
+                                f"lỗi {progress['error_count']:,}")
+                
+                if extension == '.csv':
+                    results = system['importer'].import_from_csv(temp_path, progress_callback=show_progress)
+                else:
+                    results = system['importer'].import_snapshot(temp_path, progress_callback=show_progress)
                 os.remove(temp_path)
                 
                 st.success(f"Import thành công: {results['success']} licenses")
                 if results['errors']:
                     for error in results['errors']:
                         st.error(f"• {error}")
+                if results['errors_truncated']:
+                    st.warning(f"Chỉ hiển thị {len(results['errors'])}/{results['error_count']} lỗi")
     
     with tab2:
-        st.subheader("Export Licenses ra CSV")
+        st.subheader("Export Licenses")
+        export_format = st.selectbox("Định dạng:", ["csv", "parquet", "arrow"], key="file_export_format")
         if st.button("Export"):
-            export_path = f"licenses_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            if system['importer'].export_to_csv(export_path):
+            export_path = f"licenses_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+            if export_format == 'csv':
+                exported = system['importer'].export_to_csv(export_path)
+            else:
+                exported = system['importer'].export_snapshot(export_path, export_format)
+            if exported:
                 with open(export_path, 'rb') as f:
-                    st.download_button("Download CSV", f.read(), export_path)
+                    st.download_button(f"Download {export_format.upper()}", f.read(), export_path)
 
 def show_s3_storage(system):
     st.header("☁️ S3 Storage Management")
@@ -346,7 +408,7 @@ def show_s3_storage(system):
     
     with tab2:
         st.write("**Export Data to S3**")
-        export_format = st.selectbox("Export Format:", ["csv", "json"])
+        export_format = st.selectbox("Export Format:", ["csv", "json", "parquet", "arrow"])
         
         if st.button("Export to S3"):
             with st.spinner("Exporting to S3..."):
@@ -429,8 +491,10 @@ def show_system_setup(system):
     st.header("🔧 System Setup")
     
     if st.button("Tạo Database Table"):
-        system['tracker'].create_table_if_not_exists()
-        st.success("Database setup completed!")
+        if system['tracker'].refresh_table_status():
+            st.success("Database setup completed!")
+        else:
+            st.error("Database setup failed!")
     
     if st.button("Thêm Dữ Liệu Mẫu"):
         sample_licenses = [
@@ -473,6 +537,12 @@ def show_usage_analysis(system):
         for item in analysis['overutilized']:
             st.error(f"**{item['software']}**: {item['usage_rate']}")
     
+    expiring = system['analyzer'].get_expiring_licenses()
+    if expiring:
+        st.subheader("📅 License Sắp Hết Hạn")
+        for item in expiring:
+            st.warning(f"**{item['software']}**: còn {item['days_remaining']} ngày ({item['expiry_date']})")
+    
     if analysis['expired']:
         st.subheader("❌ License Đã Hết Hạn")
         for item in analysis['expired']:
@@ -508,7 +578,23 @@ def show_ml_recommendations(system):
     
     with tab1:
         st.subheader("Cost Optimization Recommendations")
-        recommendations = system['ml_recommender'].get_cost_optimization_recommendations()
+        budget = st.number_input("Monthly budget cap ($, 0 = no cap)", min_value=0.0, value=0.0, step=1000.0)
+        budget = budget or None
+        _, _, plan = system['ml_recommender'].optimize_rightsizing(budget)
+        plan_summary = plan.summary()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Current Monthly Spend", f"${plan_summary['current_monthly_spend']:,.2f}")
+        with col2:
+            st.metric("Optimized Monthly Spend", f"${plan_summary['recommended_monthly_spend']:,.2f}")
+        with col3:
+            st.metric("Monthly Savings", f"${plan_summary['monthly_savings']:,.2f}")
+        if not plan_summary['feasible']:
+            st.error("Budget cannot cover forecast demand even with no headroom")
+        elif plan_summary['licenses_with_headroom_cut']:
+            st.warning(f"Headroom reduced on {plan_summary['licenses_with_headroom_cut']} licenses to fit the budget")
+        
+        recommendations = system['ml_recommender'].get_cost_optimization_recommendations(budget)
         
         if recommendations:
             for rec in recommendations:
@@ -548,7 +634,18 @@ def show_ml_recommendations(system):
                         with col3:
                             st.metric("Trend", prediction['trend'].title())
                         
-                        st.info(f"Confidence: {prediction['confidence']:.1%}")
+                        if prediction['method'] == 'holt':
+                            st.info(
+                                f"{prediction['interval']:.0%} prediction interval: "
+                                f"{prediction['lower_bound']:.0f} - {prediction['upper_bound']:.0f} "
+                                f"(confidence {prediction['confidence']:.1%}, "
+                                f"{prediction['observations']} days of history)"
+                            )
+                        else:
+                            st.warning(
+                                f"Not enough usage history to fit a trend "
+                                f"({prediction['observations']} days) - showing current usage"
+                            )
     
     with tab3:
         st.subheader("Anomaly Detection")
@@ -560,6 +657,15 @@ def show_ml_recommendations(system):
                 st.write(f"Description: {anomaly['description']}")
         else:
             st.success("No anomalies detected")
+        
+        st.subheader("Recent Usage Changes")
+        usage_anomalies = system['ml_recommender'].get_usage_anomalies()
+        if usage_anomalies:
+            for anomaly in usage_anomalies[:20]:
+                st.warning(f"**{anomaly['software_name']}** - {anomaly['anomaly_type']} ({anomaly['severity']}) at {anomaly['detected_at'][:19]}")
+                st.write(f"Description: {anomaly['description']}")
+        else:
+            st.success("No unusual usage changes detected")
 
 def show_executive_summary(system):
     st.header("📋 Executive Summary")
@@ -587,9 +693,69 @@ def show_executive_summary(system):
             st.metric("Expired", summary['expired_licenses'])
         with col4:
             st.metric("Expiring Soon", summary['expiring_soon'])
+        
+        show_roi_simulation(system, summary['potential_annual_savings'] / 12)
     else:
         st.error(summary['error'])
 
+def show_roi_simulation(system, default_monthly_savings):
+    st.subheader("ROI Scenario Simulation")
+    
+    with st.form("roi_simulation_form"):
+        st.write("Monthly savings ($)")
+        col1, col2, col3 = st.columns(3)
+        savings_low = col1.number_input("Low", min_value=0.0, value=round(default_monthly_savings * 0.5, 2), key="sav_low")
+        savings_mode = col2.number_input("Most likely", min_value=0.0, value=round(default_monthly_savings * 0.8, 2), key="sav_mode")
+        savings_high = col3.number_input("High", min_value=0.0, value=round(default_monthly_savings, 2), key="sav_high")
+        
+        st.write("Implementation cost ($)")
+        col1, col2, col3 = st.columns(3)
+        cost_low = col1.number_input("Low", min_value=0.0, value=5000.0, key="cost_low")
+        cost_mode = col2.number_input("Most likely", min_value=0.0, value=10000.0, key="cost_mode")
+        cost_high = col3.number_input("High", min_value=0.0, value=20000.0, key="cost_high")
+        
+        adoption_low, adoption_high = st.slider("Adoption range", 0.0, 1.0, (0.6, 1.0), 0.05)
+        n_scenarios = st.select_slider("Scenarios", options=[10000, 20000, 50000, 100000], value=20000)
+        
+        submitted = st.form_submit_button("Run Simulation")
+    
+    if submitted:
+        if not (savings_low <= savings_mode <= savings_high and cost_low <= cost_mode <= cost_high):
+            st.error("Low <= Most likely <= High is required for savings and cost")
+            return
+        
+        scenario = {
+            'name': 'Custom Scenario',
+            'monthly_savings': {'distribution': 'triangular', 'low': savings_low, 'mode': savings_mode, 'high': savings_high},
+            'implementation_cost': {'distribution': 'triangular', 'low': cost_low, 'mode': cost_mode, 'high': cost_high},
+            'adoption': {'distribution': 'uniform', 'low': adoption_low, 'high': adoption_high}
+        }
+        result = system['advanced_analytics'].simulate_roi_projections(scenario, n_scenarios=n_scenarios)
+        
+        def fmt(value, template):
+            return template.format(value) if value is not None else "N/A"
+        
+        rows = []
+        for label, key, template in [
+            ("ROI", 'roi_percentage', "{:.1f}%"),
+            ("Payback (months)", 'payback_period_months', "{:.1f}"),
+            ("Net Benefit Year 1", 'net_benefit_year_1', "${:,.0f}")
+        ]:
+            band = result[key]
+            rows.append({
+                'Metric': label,
+                'P10': fmt(band['p10'], template),
+                'P50': fmt(band['p50'], template),
+                'P90': fmt(band['p90'], template)
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Probability of Positive ROI", f"{result['probability_positive_roi']:.0%}")
+        with col2:
+            st.metric("Payback Within 12 Months", f"{result['probability_payback_within_year']:.0%}")
+
 def show_risk_assessment(system):
     st.header("⚠️ Risk Assessment")
     
@@ -613,6 +779,12 @@ def show_risk_assessment(system):
             for factor in risk_data['risk_factors']:
                 st.warning(f"• {factor}")
         
+        if risk_data['top_risk_licenses']:
+            st.subheader("Highest Risk Licenses")
+            top_df = pd.DataFrame(risk_data['top_risk_licenses'])
+            top_df['factors'] = top_df['factors'].str.join(', ')
+            st.dataframe(top_df, use_container_width=True)
+        
         if risk_data['recommendations']:
             st.subheader("Risk Mitigation Recommendations")
             for rec in risk_data['recommendations']:
@@ -0,0 +1,82 @@
+"""
+Pytest setup - import src như package (license_tracker dùng relative import)
+và như module top-level (các module analytics import trực tiếp)
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+import src.license_tracker as license_tracker  # noqa: E402
+
+sys.modules.setdefault('license_tracker', license_tracker)
+
+
+@pytest.fixture(autouse=True)
+def anomaly_state_dir(tmp_path, monkeypatch):
+    """State của anomaly detector ghi vào thư mục tạm, không vào data/"""
+    import src.anomaly_stream as anomaly_stream
+    monkeypatch.setattr(anomaly_stream, 'ANOMALY_STATE_PATH', str(tmp_path / 'anomaly_state.npz'))
+
+
+class _TestLogger:
+    """Thay LicenseLogger: ghi qua logging (pytest bắt lại), không tạo file trong logs/"""
+
+    def __init__(self):
+        self.logger = logging.getLogger('license_optimization.tests')
+
+    def info(self, message: str):
+        self.logger.info(message)
+
+    def error(self, message: str):
+        self.logger.error(message)
+
+    def warning(self, message: str):
+        self.logger.warning(message)
+
+
+@pytest.fixture(autouse=True)
+def test_logger(monkeypatch):
+    """LicenseTracker dùng logger không ghi file"""
+    monkeypatch.setattr(license_tracker, 'LicenseLogger', _TestLogger)
+
+
+@pytest.fixture
+def mock_dynamodb(monkeypatch):
+    """DynamoDB giả lập bằng moto; trả về Counter số request theo operation
+
+    moto applies requests without locking, while DynamoDB applies each
+    request atomically, so requests are serialized here.
+    """
+    moto = pytest.importorskip('moto')
+    from moto.core.botocore_stubber import BotocoreStubber
+    import src.storage_backends as storage_backends
+
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    # Bảng "đã sẵn sàng" từ mock trước không còn tồn tại
+    monkeypatch.setattr(storage_backends, '_TABLE_READY', {})
+
+    calls = collections.Counter()
+    handle = BotocoreStubber.process_request
+    lock = threading.Lock()
+
+    def process_request(self, request):
+        with lock:
+            target = request.headers.get('X-Amz-Target') or b''
+            if isinstance(target, bytes):
+                target = target.decode()
+            calls[target.rsplit('.', 1)[-1]] += 1
+            return handle(self, request)
+    monkeypatch.setattr(BotocoreStubber, 'process_request', process_request)
+    with moto.mock_aws():
+        yield calls
@@ -0,0 +1,116 @@
+"""
+add_licenses trên DynamoDB: retry UnprocessedItems, kết quả theo index, license_id trùng trong một lần ghi
+"""
+
+import logging
+
+import pytest
+from botocore.client import BaseClient
+
+import src.storage_backends as storage_backends
+from src.license_tracker import LicenseTracker
+from src.storage_backends import DynamoDBBackend, summary_counters
+from src.usage_history import InMemoryUsageHistory
+
+LOGGER = logging.getLogger(__name__)
+
+
+def license_data(license_id, used=2, total=10):
+    return {
+        'license_id': license_id,
+        'software_name': 'Office',
+        'license_type': 'SUBSCRIPTION',
+        'total_licenses': total,
+        'used_licenses': used,
+        'cost_per_license': 12.5,
+        'expiry_date': '2027-03-31'
+    }
+
+
+@pytest.fixture
+def tracker(mock_dynamodb):
+    return LicenseTracker(backend=DynamoDBBackend('licenses', 'us-east-1', LOGGER), history=InMemoryUsageHistory())
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Ghi lại các lần backoff thay vì sleep"""
+    attempts = []
+    monkeypatch.setattr(storage_backends, '_backoff', attempts.append)
+    return attempts
+
+
+def throttle_batch_writes(monkeypatch, rejects):
+    """BatchWriteItem chỉ ghi các request không bị rejects(license_id, lần gửi); phần còn lại trả về UnprocessedItems"""
+    make_api_call = BaseClient._make_api_call
+    sent = {}
+
+    def _make_api_call(self, operation_name, api_params):
+        if operation_name != 'BatchWriteItem':
+            return make_api_call(self, operation_name, api_params)
+        (table, requests), = api_params['RequestItems'].items()
+        processed, unprocessed = [], []
+        for request in requests:
+            license_id = request['PutRequest']['Item']['license_id']
+            sent[license_id] = sent.get(license_id, 0) + 1
+            (unprocessed if rejects(license_id, sent[license_id]) else processed).append(request)
+        response = make_api_call(self, operation_name, {'RequestItems': {table: processed}}) if processed else {}
+        if unprocessed:
+            response['UnprocessedItems'] = {table: unprocessed}
+        return response
+
+    monkeypatch.setattr(BaseClient, '_make_api_call', _make_api_call)
+    return sent
+
+
+def test_unprocessed_items_are_retried_with_backoff(tracker, backoffs, monkeypatch):
+    assert tracker.ensure_table_ready()
+    # Mỗi item số lẻ bị trả về UnprocessedItems hai lần trước khi được ghi
+    sent = throttle_batch_writes(monkeypatch, lambda license_id, count: int(license_id[1:]) % 2 and count <= 2)
+
+    result = tracker.add_licenses([license_data(f'L{i}', used=i % 10) for i in range(60)])
+    assert result['written'] == 60
+    assert result['outcomes'] == [True] * 60
+    assert result['failed'] == []
+    assert sent['L1'] == 3 and sent['L2'] == 1
+    # Mỗi lô 25 lùi lại trước lần gửi 2 và 3
+    assert sorted(backoffs) == [1, 1, 1, 2, 2, 2]
+    assert sorted(item['license_id'] for item in tracker.scan_all()) == sorted(f'L{i}' for i in range(60))
+    assert tracker.get_portfolio_summary() == summary_counters(tracker.scan_all())
+
+
+def test_failures_are_reported_by_index(tracker, backoffs, monkeypatch):
+    assert tracker.ensure_table_ready()
+    throttle_batch_writes(monkeypatch, lambda license_id, count: license_id.startswith('X'))
+    rows = [license_data('A0'), license_data('X1'), {'license_id': 'B2', 'software_name': 'Office'},
+            license_data('A3'), license_data('X4'), 'not a license', license_data('A6')]
+
+    result = tracker.add_licenses(rows)
+    assert result['written'] == 3
+    assert result['outcomes'] == [True, False, False, True, False, False, True]
+    assert [(f['index'], f['license_id']) for f in result['failed']] == [(1, 'X1'), (2, 'B2'), (4, 'X4'), (5, None)]
+    assert result['failed'][0]['error'] == 'Unprocessed after retries'
+    assert result['failed'][1]['error'].startswith('Invalid license data')
+    assert backoffs.count(storage_backends.BATCH_WRITE_MAX_RETRIES) == 1
+    assert sorted(item['license_id'] for item in tracker.scan_all()) == ['A0', 'A3', 'A6']
+    assert tracker.get_portfolio_summary() == summary_counters(tracker.scan_all())
+
+
+def test_duplicate_ids_in_one_call_keep_input_order(tracker):
+    assert tracker.ensure_table_ready()
+    rows = [license_data('D', used=1), license_data('E', used=1), license_data('D', used=5),
+            license_data('F', used=1), license_data('D', used=7, total=20)]
+    chunks = tracker.backend._chunk_for_batch_write(list(enumerate(rows)))
+    assert [[index for index, _ in chunk] for chunk in chunks] == [[0, 1], [2, 3], [4]]
+
+    items = [(index, tracker._build_item(row)) for index, row in enumerate(rows)]
+    assert tracker.backend.put_items(items) == {}
+    license = tracker.get_license('D')
+    assert (license['used_licenses'], license['total_licenses']) == (7, 20)
+
+    result = tracker.add_licenses(rows + [license_data('E', used=3)])
+    assert result['written'] == 6
+    assert tracker.get_license('E')['used_licenses'] == 3
+    summary = tracker.get_portfolio_summary()
+    assert summary == summary_counters(tracker.scan_all())
+    assert summary['license_count'] == 3
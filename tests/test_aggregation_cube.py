@@ -0,0 +1,45 @@
+"""
+Aggregation cube: cập nhật tăng dần khi ghi và không cache cube build từ dữ liệu cũ
+"""
+
+import logging
+
+from src.aggregation_cube import cube_registry
+from src.license_tracker import LicenseTracker
+from src.storage_backends import InMemoryBackend
+from src.usage_history import InMemoryUsageHistory
+
+LOGGER = logging.getLogger(__name__)
+
+
+def make_tracker():
+    tracker = LicenseTracker(backend=InMemoryBackend(LOGGER), history=InMemoryUsageHistory())
+    assert tracker.add_license({
+        'license_id': 'L1', 'software_name': 'Office', 'license_type': 'SUBSCRIPTION',
+        'total_licenses': 10, 'used_licenses': 4, 'cost_per_license': 12.5, 'expiry_date': '2027-03-31'
+    })
+    return tracker
+
+
+def used_seats(cube):
+    return sum(row['used_seats'] for row in cube.rollup())
+
+
+def test_write_during_build_is_not_lost():
+    tracker = make_tracker()
+    key = tracker._table_key()
+    stale = tracker.get_all_licenses()
+
+    def loader():
+        # Một lần ghi xảy ra sau khi snapshot được đọc, trước khi cube build xong
+        assert tracker.increment_usage('L1', 3) == 7
+        return stale
+
+    cube = cube_registry.get(key, loader)
+    assert used_seats(cube) == 4
+    assert cube_registry.peek(key) is None
+
+    assert used_seats(tracker.get_aggregation_cube()) == 7
+    assert tracker.decrement_usage('L1', 2) == 5
+    assert cube_registry.peek(key) is not None
+    assert used_seats(tracker.get_aggregation_cube()) == 5
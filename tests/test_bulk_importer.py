@@ -0,0 +1,114 @@
+"""
+Pipeline import: chunk -> dispatch theo license_id -> writer thread, với back-pressure và giới hạn lỗi
+"""
+
+import csv
+import logging
+import os
+import threading
+
+import pytest
+
+import bulk_importer
+from bulk_importer import BulkImporter
+from src.license_tracker import LicenseTracker
+from src.storage_backends import InMemoryBackend
+from src.usage_history import InMemoryUsageHistory
+
+LOGGER = logging.getLogger(__name__)
+HEADERS = ['license_id', 'software_name', 'license_type', 'total_licenses', 'used_licenses',
+           'cost_per_license', 'expiry_date']
+
+
+@pytest.fixture
+def importer(monkeypatch):
+    # Chunk/batch nhỏ và budget 1 byte: mỗi batch phải chờ batch trước ghi xong
+    monkeypatch.setattr(bulk_importer, 'IMPORT_CHUNK_ROWS', 4)
+    monkeypatch.setattr(bulk_importer, 'IMPORT_BATCH_SIZE', 2)
+    monkeypatch.setattr(bulk_importer, 'IMPORT_MAX_INFLIGHT_BYTES', 1)
+    monkeypatch.setattr(bulk_importer, 'IMPORT_PROGRESS_INTERVAL', 0)
+    importer = BulkImporter.__new__(BulkImporter)
+    importer.tracker = LicenseTracker(backend=InMemoryBackend(LOGGER), history=InMemoryUsageHistory())
+    return importer
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+    return str(path)
+
+
+def row(license_id, used=1, total=10):
+    return [license_id, 'Office', 'SUBSCRIPTION', total, used, 12.5, '2027-03-31']
+
+
+def run_with_timeout(target, timeout=20):
+    """Chạy import trên thread riêng; treo (deadlock) thì test fail thay vì chờ mãi"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'import did not finish'
+    return result[0]
+
+
+def test_last_row_wins_across_chunks(importer, tmp_path):
+    rows = [row(f'L{i % 7}', used=i % 10) for i in range(30)]
+    path = write_csv(tmp_path / 'licenses.csv', rows)
+
+    results = run_with_timeout(lambda: importer.import_from_csv(path, write_workers=3))
+    assert results['success'] == 30
+    assert results['error_count'] == 0
+    for i in range(7):
+        last = max(j for j in range(30) if j % 7 == i)
+        assert importer.tracker.get_license(f'L{i}')['used_licenses'] == last % 10
+
+
+def test_error_messages_are_capped(importer, tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_importer, 'IMPORT_MAX_ERRORS', 3)
+    rows = [row(f'L{i}') if i % 2 else [f'L{i}', 'Office', 'SUBSCRIPTION', 'many', 1, 12.5, ''] for i in range(14)]
+    rows.append(row('', used=1))
+    path = write_csv(tmp_path / 'licenses.csv', rows)
+
+    results = run_with_timeout(lambda: importer.import_from_csv(path, write_workers=2))
+    assert results['success'] == 7
+    assert results['error_count'] == 7
+    assert results['skipped'] == 1
+    assert results['errors'] == [f"Row {n}: Invalid total_licenses value: many" for n in (1, 3, 5)]
+    assert results['errors_truncated'] is True
+
+
+def test_progress_is_reported_until_the_end(importer, tmp_path):
+    path = write_csv(tmp_path / 'licenses.csv', [row(f'L{i}') for i in range(17)])
+    progress = []
+
+    results = run_with_timeout(lambda: importer.import_from_csv(path, progress.append, write_workers=2))
+    assert len(progress) > 2
+    assert [p['rows_read'] for p in progress] == sorted(p['rows_read'] for p in progress)
+    assert [p['success'] for p in progress] == sorted(p['success'] for p in progress)
+    assert progress[-1] == {
+        'success': 17, 'error_count': 0, 'rows_read': 17, 'skipped': 0,
+        'bytes_read': os.path.getsize(path), 'total_bytes': os.path.getsize(path)
+    }
+    assert results['success'] == 17
+
+
+def test_failing_writer_does_not_block_the_reader(importer, tmp_path, monkeypatch):
+    path = write_csv(tmp_path / 'licenses.csv', [row(f'L{i}') for i in range(40)])
+    write_batch = BulkImporter._write_batch
+
+    def flaky(self, rows, batch, lock, results):
+        if any(record['license_id'] in ('L3', 'L20') for record in batch):
+            raise RuntimeError('writer crashed')
+        return write_batch(self, rows, batch, lock, results)
+    monkeypatch.setattr(BulkImporter, '_write_batch', flaky)
+
+    results = run_with_timeout(lambda: importer.import_from_csv(path, write_workers=2))
+    failed = {message.split(':')[0] for message in results['errors']}
+    assert results['success'] + results['error_count'] == 40
+    assert 2 <= results['error_count'] <= 4
+    assert {'Row 4', 'Row 21'} <= failed
+    assert all('writer crashed' in message for message in results['errors'])
+    assert len(importer.tracker.get_all_licenses()) == results['success']
@@ -0,0 +1,87 @@
+"""
+validate_frame phải cho cùng kết quả với validate_license_data (từng dòng)
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_validator import ERROR_BITS, VALIDATION_ERRORS, WARNING_MASK, LicenseValidator
+
+
+def license_row(**overrides):
+    row = {
+        'license_id': 'L1', 'software_name': 'Office', 'license_type': 'SUBSCRIPTION',
+        'total_licenses': 10, 'used_licenses': 4, 'expiry_date': '2027-03-31'
+    }
+    row.update(overrides)
+    return row
+
+
+ROWS = [
+    license_row(),
+    license_row(license_id=''),
+    license_row(software_name=None),
+    license_row(license_type=''),
+    license_row(license_type='TRIAL'),
+    license_row(total_licenses=None),
+    license_row(total_licenses=0),
+    license_row(total_licenses=-5),
+    license_row(used_licenses=-1),
+    license_row(used_licenses=None),
+    license_row(used_licenses=12),
+    license_row(expiry_date=''),
+    license_row(expiry_date='2027-02-30'),
+    license_row(expiry_date='31/03/2027'),
+    license_row(expiry_date='2027-3-5'),
+    license_row(license_id='', license_type='TRIAL', total_licenses=0, used_licenses=-2, expiry_date='soon'),
+]
+
+
+def as_text(rows):
+    """Như CSV: mọi cột là chuỗi, giá trị thiếu là ''"""
+    return pd.DataFrame([{key: '' if value is None else str(value) for key, value in row.items()} for row in rows])
+
+
+def expected_messages(row):
+    # validate_license_data coi used_licenses thiếu là 0
+    return LicenseValidator.validate_license_data({key: value for key, value in row.items() if value is not None})
+
+
+@pytest.mark.parametrize('frame', [pd.DataFrame(ROWS), as_text(ROWS)], ids=['numeric', 'object'])
+def test_frame_matches_row_validation(frame):
+    result = LicenseValidator.validate_frame(frame)
+    assert len(result) == len(ROWS)
+    for index, row in enumerate(ROWS):
+        warnings = {message for name, message in VALIDATION_ERRORS if ERROR_BITS[name] & WARNING_MASK}
+        messages = [message for message in result.messages(index) if message not in warnings]
+        assert messages == expected_messages(row), row
+        assert bool(result.valid[index]) == (not messages)
+
+
+def test_every_error_bit_is_reachable():
+    rows = ROWS + [license_row(used_licenses='a few')]
+    result = LicenseValidator.validate_frame(as_text(rows))
+    for name, _ in VALIDATION_ERRORS:
+        assert result.has_error(name).any(), name
+    # Không phải số: chỉ có ở dữ liệu dạng text
+    assert result.has_error('invalid_used').tolist() == [False] * len(ROWS) + [True]
+
+
+def test_used_above_total_is_a_warning_only():
+    frame = pd.DataFrame([license_row(used_licenses=12), license_row(used_licenses=12, expiry_date='bad')])
+    result = LicenseValidator.validate_frame(frame)
+    assert result.has_error('used_above_total').tolist() == [True, True]
+    assert result.valid.tolist() == [True, False]
+    assert result.summary() == {
+        'rows': 2, 'valid': 1, 'invalid': 1, 'warnings': 2,
+        'errors': {'used_above_total': 2, 'invalid_expiry_date': 1}
+    }
+    assert not result.errors.flags.writeable and not result.valid.flags.writeable
+
+
+def test_numeric_and_object_columns_agree():
+    numeric = LicenseValidator.validate_frame(pd.DataFrame(ROWS))
+    text = LicenseValidator.validate_frame(as_text(ROWS))
+    assert np.array_equal(numeric.errors, text.errors)
+    assert pd.DataFrame(ROWS)['total_licenses'].dtype.kind == 'f'
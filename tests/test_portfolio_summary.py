@@ -0,0 +1,129 @@
+"""
+Portfolio summary và usage counter trên mọi storage backend
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.license_tracker import LicenseTracker
+from src.storage_backends import DynamoDBBackend, InMemoryBackend, SQLiteBackend, summary_counters
+from src.usage_history import InMemoryUsageHistory
+
+LOGGER = logging.getLogger(__name__)
+
+
+def license_data(license_id, total=10, used=2, cost=12.5, license_type='SUBSCRIPTION', expiry='2027-03-31'):
+    return {
+        'license_id': license_id,
+        'software_name': 'Office',
+        'license_type': license_type,
+        'total_licenses': total,
+        'used_licenses': used,
+        'cost_per_license': cost,
+        'expiry_date': expiry
+    }
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def make_backend(request, tmp_path):
+    """Factory tạo backend; các instance DynamoDB cùng bảng mô phỏng nhiều process"""
+    if request.param == 'memory':
+        shared = InMemoryBackend(LOGGER)
+        yield lambda: shared
+    elif request.param == 'sqlite':
+        path = str(tmp_path / 'licenses.db')
+        yield lambda: SQLiteBackend(path, LOGGER)
+    else:
+        request.getfixturevalue('mock_dynamodb')
+        yield lambda: DynamoDBBackend('licenses', 'us-east-1', LOGGER)
+
+
+@pytest.fixture
+def tracker(make_backend):
+    return LicenseTracker(backend=make_backend(), history=InMemoryUsageHistory())
+
+
+def assert_summary_matches_scan(tracker):
+    assert tracker.get_portfolio_summary() == summary_counters(tracker.scan_all())
+
+
+def test_adjust_usage_stays_within_total(tracker):
+    assert tracker.add_license(license_data('L1', total=10, used=8))
+
+    assert tracker.increment_usage('L1', 3) is None
+    assert tracker.decrement_usage('L1', 9) is None
+    assert tracker.get_license('L1')['used_licenses'] == 8
+
+    assert tracker.increment_usage('L1', 2) == 10
+    assert tracker.increment_usage('L1') is None
+    assert tracker.decrement_usage('L1', 10) == 0
+    assert tracker.decrement_usage('L1') is None
+    assert tracker.increment_usage('missing') is None
+    assert_summary_matches_scan(tracker)
+
+
+def test_concurrent_adjust_usage_is_exact(tracker):
+    """8 thread x 20 lần cộng/trừ: không lần nào bị từ chối khi còn trong giới hạn"""
+    assert tracker.add_license(license_data('L1', total=400, used=0))
+
+    def adjust(delta):
+        return [tracker._adjust_usage('L1', delta) for _ in range(20)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = [value for values in executor.map(adjust, [1] * 8) for value in values]
+    assert None not in results
+    assert sorted(results) == list(range(1, 161))
+    assert tracker.get_license('L1')['used_licenses'] == 160
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = [value for values in executor.map(adjust, [2, -1] * 4) for value in values]
+    assert None not in results
+    assert tracker.get_license('L1')['used_licenses'] == 240
+    assert tracker.increment_usage('L1', 161) is None
+    assert_summary_matches_scan(tracker)
+
+
+def test_summary_matches_full_recompute(tracker):
+    assert tracker.add_license(license_data('L1'))
+    result = tracker.add_licenses([license_data(f'B{i}', total=5 + i, used=i, license_type='PERPETUAL')
+                                   for i in range(30)])
+    assert result['written'] == 30
+    assert_summary_matches_scan(tracker)
+
+    # Ghi đè bằng batch: delta tính từ item cũ
+    tracker.add_licenses([license_data(f'B{i}', total=20, used=1, cost=3.0, expiry='2028-01-01')
+                          for i in range(0, 30, 3)])
+    assert_summary_matches_scan(tracker)
+
+    assert tracker.update_usage('L1', 7)
+    assert not tracker.update_usage('missing', 1)
+    assert tracker.increment_usage('B4', 1) == 5
+    assert tracker.add_license(license_data('L1', total=40, used=3, cost=1.25))
+    assert tracker.delete_license('B5')
+    assert_summary_matches_scan(tracker)
+
+    summary = tracker.get_portfolio_summary()
+    assert summary['license_count'] == 30
+    assert tracker.rebuild_portfolio_summary() == summary
+
+
+def test_summary_stays_exact_across_writers(make_backend):
+    """Hai tracker (cache item riêng) cùng ghi một license"""
+    first = LicenseTracker(backend=make_backend(), history=InMemoryUsageHistory())
+    second = LicenseTracker(backend=make_backend(), history=InMemoryUsageHistory())
+    assert first.add_license(license_data('L1', total=10, used=2))
+    assert first.increment_usage('L1', 1) == 3
+
+    assert second.increment_usage('L1', 4) == 7
+    assert second.add_license(license_data('L1', total=8, used=6, cost=20.0))
+    # first chỉ còn thấy total=10, used=3: phải dựa trên item hiện tại
+    assert first.increment_usage('L1', 3) is None
+    assert first.increment_usage('L1', 2) == 8
+    assert first.get_license('L1')['used_licenses'] == 8
+    assert second.decrement_usage('L1', 8) == 0
+    assert first.update_usage('L1', 5)
+
+    assert_summary_matches_scan(first)
+    assert second.get_portfolio_summary() == first.get_portfolio_summary()
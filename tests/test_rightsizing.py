@@ -0,0 +1,83 @@
+"""
+optimize_seats: cắt headroom theo ngân sách - seat đắt nhất trước, không xuống dưới floor
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from ml_recommender import MLRecommender
+from rightsizing import optimize_seats
+
+
+def test_without_budget_buys_target():
+    plan = optimize_seats([10, 0, 7.2], [20, 3, 5], [300, 100, 200], headroom=0.2)
+    assert plan.floor.tolist() == [10, 1, 8]
+    assert plan.target.tolist() == plan.recommended.tolist() == [12, 1, 9]
+    assert plan.feasible and plan.summary()['licenses_with_headroom_cut'] == 0
+
+
+def test_budget_cuts_most_expensive_headroom_first():
+    # target 12 seat mỗi license = 7200; vượt ngân sách 700
+    plan = optimize_seats([10, 10, 10], [12, 12, 12], [300, 100, 200], headroom=0.2, budget_cents=6500)
+    # License đắt nhất mất hết headroom, license ở ranh giới chỉ mất đủ một seat, license rẻ nhất giữ nguyên
+    assert plan.recommended.tolist() == [10, 12, 11]
+    assert plan.headroom_cut.tolist() == [2, 0, 1]
+    assert plan.feasible
+    assert plan.recommended_spend_cents == 6400 <= plan.budget_cents
+
+
+def test_budget_cuts_whole_purchase_tiers():
+    plan = optimize_seats([10, 10], [20, 20], [500, 100], headroom=0.5, seat_increment=np.array([5, 1]),
+                          budget_cents=9000)
+    # target [15, 15] = 9000 - vừa ngân sách thì không cắt
+    assert plan.recommended.tolist() == [15, 15]
+    plan = optimize_seats([10, 10], [20, 20], [500, 100], headroom=0.5, seat_increment=np.array([5, 1]),
+                          budget_cents=8999)
+    # Một seat cũng không đủ: cắt cả tier 5 seat của license đắt
+    assert plan.recommended.tolist() == [10, 15]
+    assert plan.recommended_spend_cents == 6500
+
+
+def test_infeasible_budget_keeps_floor():
+    plan = optimize_seats([10, 4], [12, 5], [300, 100], headroom=0.5, budget_cents=1000)
+    assert plan.recommended.tolist() == plan.floor.tolist() == [10, 4]
+    assert not plan.feasible
+    assert plan.summary()['feasible'] is False
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_budget_plan_is_within_bounds(seed):
+    rng = np.random.default_rng(seed)
+    n = 200
+    demand = rng.uniform(0, 80, n)
+    cost = rng.integers(0, 5000, n)
+    increment = rng.choice([1, 5, 10], n)
+    unconstrained = optimize_seats(demand, np.zeros(n), cost, headroom=0.3, seat_increment=increment)
+    floor_spend = int(np.dot(unconstrained.floor, cost))
+    budget = (floor_spend + unconstrained.recommended_spend_cents) // 2
+
+    plan = optimize_seats(demand, np.zeros(n), cost, headroom=0.3, seat_increment=increment, budget_cents=budget)
+    assert plan.feasible
+    assert np.all(plan.floor <= plan.recommended) and np.all(plan.recommended <= plan.target)
+    assert np.all(plan.headroom_cut % increment == 0)
+    assert plan.recommended_spend_cents <= budget
+    # Chỉ license ở ranh giới bị cắt một phần; nó đắt hơn mọi license còn nguyên headroom
+    partial = np.flatnonzero((plan.headroom_cut > 0) & (plan.recommended > plan.floor))
+    assert len(partial) <= 1
+    kept = (plan.headroom_cut == 0) & (plan.target > plan.floor)
+    cut = plan.headroom_cut > 0
+    assert cost[cut].min() >= cost[kept].max()
+
+
+def test_recommendation_failures_are_logged(caplog, monkeypatch):
+    recommender = MLRecommender()
+
+    def broken(*args):
+        raise ValueError('forecast unavailable')
+    monkeypatch.setattr(recommender, 'optimize_rightsizing', broken)
+
+    with caplog.at_level(logging.ERROR):
+        assert recommender.get_cost_optimization_recommendations() == []
+    assert 'forecast unavailable' in caplog.text
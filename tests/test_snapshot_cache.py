@@ -0,0 +1,62 @@
+"""
+Snapshot cache và data version dùng làm key cho kết quả analytics
+"""
+
+import logging
+
+import pytest
+
+from src.license_tracker import LicenseTracker
+from src.storage_backends import InMemoryBackend
+from src.usage_history import InMemoryUsageHistory
+from src.snapshot_cache import license_snapshot_cache
+from advanced_analytics import AdvancedAnalytics
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def tracker():
+    tracker = LicenseTracker(backend=InMemoryBackend(LOGGER), history=InMemoryUsageHistory())
+    assert tracker.add_license({
+        'license_id': 'L1', 'software_name': 'Office', 'license_type': 'SUBSCRIPTION',
+        'total_licenses': 10, 'used_licenses': 4, 'cost_per_license': 12.5, 'expiry_date': '2027-03-31'
+    })
+    return tracker
+
+
+def test_data_version_counts_writes_not_loads(tracker, monkeypatch):
+    version = tracker.data_version()
+    assert len(tracker.get_all_licenses()) == 1
+
+    # Snapshot hết hạn và được load lại: dữ liệu không đổi
+    monkeypatch.setattr(license_snapshot_cache, 'ttl_seconds', 0)
+    assert len(tracker.get_all_licenses()) == 1
+    assert tracker.data_version() == version
+
+    assert tracker.increment_usage('L1') == 5
+    after_write = tracker.data_version()
+    assert after_write != version
+    # Đọc lại từ backend (có thể có ghi từ process khác)
+    tracker.get_all_licenses(refresh=True)
+    assert tracker.data_version() not in (version, after_write)
+
+
+def test_memo_holds_for_uncached_snapshots(tracker, monkeypatch):
+    """Snapshot quá lớn để cache vẫn dùng được kết quả đã tính"""
+    monkeypatch.setattr(license_snapshot_cache, 'max_bytes', 0)
+    analytics = AdvancedAnalytics.__new__(AdvancedAnalytics)
+    analytics.tracker = tracker
+    calls = []
+
+    def compute():
+        calls.append(len(tracker.get_all_licenses()))
+        return {'licenses': calls[-1]}
+
+    assert analytics._memoized('test_memo', compute) == {'licenses': 1}
+    assert analytics._memoized('test_memo', compute) == {'licenses': 1}
+    assert len(calls) == 1
+
+    assert tracker.delete_license('L1')
+    assert analytics._memoized('test_memo', compute) == {'licenses': 0}
+    assert len(calls) == 2
@@ -0,0 +1,82 @@
+"""
+Snapshot Parquet/Arrow: round trip giữ kiểu, ngày không hợp lệ và giá trị thiếu
+"""
+
+import importlib
+import io
+import sys
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+from license_frame import LicenseFrame  # noqa: E402
+from snapshot_io import read_snapshot, snapshot_frame, snapshot_records, write_snapshot  # noqa: E402
+
+LICENSES = [
+    {'license_id': 'L1', 'software_name': 'Office', 'license_type': 'SUBSCRIPTION', 'total_licenses': 10,
+     'used_licenses': 4, 'cost_per_license': Decimal('12.3456'), 'expiry_date': '2027-03-31',
+     'expiry_month': '2027-03', 'cost_center': 'FIN', 'created_date': '2026-01-02T03:04:05.123456',
+     'last_updated': '2026-10-01T00:00:00'},
+    {'license_id': 'L2', 'software_name': 'Office', 'license_type': 'PERPETUAL', 'total_licenses': 3,
+     'used_licenses': 3, 'cost_per_license': Decimal('0.10'), 'expiry_date': '2027-13-01',
+     'cost_center': None},
+    {'license_id': 'L3', 'software_name': 'Figma', 'license_type': 'NAMED_USER', 'total_licenses': 7,
+     'used_licenses': 0, 'cost_per_license': Decimal('1999.9999'), 'expiry_date': 'soon'},
+    {'license_id': 'L4', 'software_name': 'Figma', 'license_type': 'PERPETUAL', 'total_licenses': 1,
+     'used_licenses': 1, 'cost_per_license': Decimal('0')},
+]
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_round_trip_keeps_types_and_edge_values(tmp_path, format):
+    path = tmp_path / f'licenses.{format}'
+    assert write_snapshot(LICENSES, str(path)) == 4
+    table = read_snapshot(str(path))
+
+    assert table.schema.field('cost_per_license').type == pa.decimal128(18, 4)
+    assert table.column('cost_per_license').to_pylist() == [
+        Decimal('12.3456'), Decimal('0.1000'), Decimal('1999.9999'), Decimal('0.0000')
+    ]
+    # Ngày không hợp lệ: expiry_date null, text gốc giữ trong expiry_date_unparsed
+    assert [str(day) if day else None for day in table.column('expiry_date').to_pylist()] == [
+        '2027-03-31', None, None, None
+    ]
+    assert table.column('expiry_date_unparsed').to_pylist() == [None, '2027-13-01', 'soon', None]
+    assert table.column('cost_center').to_pylist() == ['FIN', None, None, None]
+
+    records = snapshot_records(table)
+    assert [record['expiry_date'] for record in records] == ['2027-03-31', '2027-13-01', 'soon', '']
+    assert [record['cost_center'] for record in records] == ['FIN', '', '', '']
+    assert [Decimal(str(record['cost_per_license'])) for record in records] == [
+        license['cost_per_license'] for license in LICENSES
+    ]
+    assert snapshot_frame(table)['total_licenses'].dtype == np.int64
+
+    # Frame từ snapshot khớp frame build từ dict
+    expected = LicenseFrame.from_licenses(LICENSES)
+    frame = LicenseFrame.from_snapshot(str(path))
+    assert frame.cost_cents.tolist() == expected.cost_cents.tolist() == [1235, 10, 200000, 0]
+    assert frame.expiry_raw.tolist() == expected.expiry_raw.tolist()
+    assert frame.expiry_invalid.tolist() == expected.expiry_invalid.tolist() == [False, True, True, False]
+    assert frame.names().tolist() == expected.names().tolist()
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_round_trip_through_a_buffer(format):
+    buffer = io.BytesIO()
+    write_snapshot(LICENSES, buffer, format=format)
+    buffer.seek(0)
+    assert read_snapshot(buffer, format=format).column('license_id').to_pylist() == ['L1', 'L2', 'L3', 'L4']
+
+
+def test_shared_modules_load_once():
+    """Import top-level và trong package trả về cùng một module (một cache, một bộ hàm)"""
+    import snapshot_cache
+    import snapshot_io
+    import src.s3_storage  # noqa: F401 - from .snapshot_io import ...
+    assert importlib.import_module('src.snapshot_cache') is snapshot_cache
+    assert importlib.import_module('src.snapshot_io') is snapshot_io
+    assert sys.modules['license_tracker'].license_snapshot_cache is snapshot_cache.license_snapshot_cache
@@ -0,0 +1,79 @@
+"""
+Báo cáo tập đoàn: gộp các tenant phải bằng phân tích tất cả các bảng như một portfolio
+"""
+
+import logging
+from datetime import datetime
+
+import pytest
+
+import tenant_runner
+from portfolio_engine import PortfolioEngine
+from src.license_tracker import LicenseTracker
+from src.storage_backends import InMemoryBackend
+from src.usage_history import InMemoryUsageHistory
+from tenant_runner import analyze_tenant, consolidate_reports
+
+LOGGER = logging.getLogger(__name__)
+NOW = datetime(2026, 10, 17)
+TYPES = ['SUBSCRIPTION', 'PERPETUAL', 'NAMED_USER', 'CONCURRENT']
+EXPIRY = ['2026-09-30', '2026-10-25', '2026-12-01', '2027-06-30', '', 'bad']
+
+
+def licenses(prefix, count, seed):
+    return [
+        {
+            'license_id': f'{prefix}{i}',
+            'software_name': f'App{(i + seed) % 5}',
+            'license_type': TYPES[(i + seed) % len(TYPES)],
+            'total_licenses': 5 + (i * 7 + seed) % 40,
+            'used_licenses': (i * 11 + seed) % 50,
+            'cost_per_license': round(1.37 * ((i + seed) % 9) + 0.005, 3),
+            'expiry_date': EXPIRY[(i + seed) % len(EXPIRY)]
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    """tenant_runner.LicenseTracker -> tracker InMemory theo tên bảng; ghi lại số lần tạo"""
+    data = {'a': licenses('A', 23, 1), 'b': licenses('B', 17, 4)}
+    data['all'] = data['a'] + data['b']
+    built = []
+
+    def make_tracker(table_name=None):
+        tracker = LicenseTracker(backend=InMemoryBackend(LOGGER), history=InMemoryUsageHistory())
+        assert tracker.add_licenses(data[table_name])['written'] == len(data[table_name])
+        built.append(table_name)
+        return tracker
+    monkeypatch.setattr(tenant_runner, 'LicenseTracker', make_tracker)
+    return built
+
+
+def test_one_tracker_per_tenant(tables):
+    result = analyze_tenant('a', 'a', NOW)
+    assert result['status'] == 'ok', result.get('error')
+    assert tables == ['a']
+
+
+def test_consolidated_report_matches_one_portfolio(tables):
+    report = consolidate_reports([analyze_tenant('a', 'a', NOW), analyze_tenant('b', 'b', NOW)])
+    combined = analyze_tenant('all', 'all', NOW)
+    assert report['succeeded'] == 2 and combined['status'] == 'ok'
+    assert 0 < float(report['risk_score']) < 100 and report['potential_annual_savings']
+
+    for key in ('monthly_cost_cents', 'waste_cents', 'underutilized_waste_cents', 'licenses', 'risk_points'):
+        assert sum(result['totals'][key] for result in report['results']) == combined['totals'][key], key
+    summary = combined['executive_summary']
+    assert report['total_annual_spend'] == summary['total_annual_spend']
+    assert report['potential_annual_savings'] == summary['potential_annual_savings']
+    assert report['efficiency_score'] == summary['efficiency_score']
+    assert report['average_utilization'] == summary['average_utilization']
+    assert report['risk_score'] == combined['risk']['risk_score']
+    assert report['risk_level'] == combined['risk']['risk_level']
+
+    # Và bằng PortfolioEngine chạy thẳng trên bảng gộp
+    portfolio = PortfolioEngine(tenant_runner.LicenseTracker('all')).analyze(now=NOW)
+    assert report['risk_score'] == f"{portfolio.risk_score:.1f}"
+    assert report['total_monthly_cost'] == portfolio.frame.to_money(portfolio.total_monthly_cost_cents)
@@ -0,0 +1,46 @@
+"""
+Dự báo usage: chỉ ngày có record thật mới là quan sát
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.usage_forecast import forecast_record, holt_forecast, usage_matrix
+
+
+def daily(license_id, values, end='2026-10-17'):
+    days = pd.date_range(end=end, periods=len(values), freq='D')
+    return pd.DataFrame({'license_id': license_id, 'day': days, 'max_used': values})
+
+
+def test_single_point_is_not_fitted():
+    history = pd.DataFrame({'license_id': ['A'], 'day': ['2026-08-01'], 'max_used': [5]})
+    matrix, observed = usage_matrix(history, ['A'], end='2026-10-17', days=90)
+
+    # Forward-fill tới hôm nay nhưng chỉ một ngày là quan sát
+    assert np.count_nonzero(~np.isnan(matrix)) == 78
+    assert observed.sum() == 1
+
+    forecast = holt_forecast(matrix, 30, license_ids=['A'], observed=observed)
+    assert forecast.observations[0] == 1
+    assert not forecast.fitted[0]
+    assert np.isnan(forecast.sigma[0])
+
+    record = forecast_record(forecast, 0, 30, total_licenses=10)
+    assert record['method'] == 'insufficient_history'
+    assert record['confidence'] == 0.0
+    assert record['predicted_usage'] == 5.0
+
+
+def test_sparse_history_counts_records_not_days():
+    # Một record mỗi tuần trong 10 tuần: 10 quan sát, không phải ~64 ngày
+    values = np.full(64, np.nan)
+    values[::7] = np.arange(10) + 20
+    history = daily('A', values).dropna()
+    matrix, observed = usage_matrix(history, ['A', 'B'], end='2026-10-17', days=90)
+
+    forecast = holt_forecast(matrix, 14, license_ids=['A', 'B'], observed=observed,
+                             fallback=np.array([0, 3]))
+    assert forecast.observations.tolist() == [10, 0]
+    assert forecast.fitted.tolist() == [True, False]
+    assert forecast.last_observed.tolist() == [29.0, 3.0]
@@ -0,0 +1,99 @@
+"""
+Usage history trên DynamoDB: fold rollup ngày cho import và cập nhật streaming
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.license_tracker import LicenseTracker
+from src.storage_backends import DynamoDBBackend
+from src.usage_history import DynamoDBUsageHistory, InMemoryUsageHistory
+
+LOGGER = logging.getLogger(__name__)
+
+
+def license_data(license_id, used):
+    return {
+        'license_id': license_id,
+        'software_name': 'Office',
+        'license_type': 'SUBSCRIPTION',
+        'total_licenses': 50,
+        'used_licenses': used,
+        'cost_per_license': 12.5,
+        'expiry_date': '2027-03-31'
+    }
+
+
+def assert_same_rollups(history, reference, license_ids):
+    for license_id in license_ids:
+        got, expected = history.daily_rollup(license_id), reference.daily_rollup(license_id)
+        assert got.days.tolist() == expected.days.tolist()
+        for field in ('samples', 'max_used', 'avg_used', 'last_used'):
+            assert np.array_equal(getattr(got, field), getattr(expected, field)), (license_id, field)
+
+
+def test_bulk_import_round_trip_budget(mock_dynamodb):
+    history = DynamoDBUsageHistory('licenses_usage_history', 'us-east-1', LOGGER)
+    tracker = LicenseTracker(backend=DynamoDBBackend('licenses', 'us-east-1', LOGGER), history=history)
+    assert tracker.ensure_table_ready()
+    history.ensure_ready()
+    rows = [license_data(f'L{i % 480}', i % 40) for i in range(500)]
+
+    mock_dynamodb.clear()
+    assert tracker.add_licenses(rows)['written'] == 500
+    # 500 license: 5 BatchGetItem + 20 BatchWriteItem + 1 summary ADD;
+    # history: 5 BatchGetItem + 40 BatchWriteItem (500 điểm raw + 480 rollup), không UpdateItem
+    assert mock_dynamodb['BatchGetItem'] <= 10
+    assert mock_dynamodb['BatchWriteItem'] <= 60
+    assert mock_dynamodb['UpdateItem'] <= 1
+    assert sum(mock_dynamodb.values()) <= 75
+
+    # Import lần hai cộng vào rollup đã có, kết quả như fold từng điểm
+    assert tracker.add_licenses(rows)['written'] == 500
+    reference = InMemoryUsageHistory()
+    for license_id, recorded_at, used in history_points(history, ['L0', 'L19', 'L20', 'L479']):
+        reference.append([(license_id, recorded_at, used)])
+    assert_same_rollups(history, reference, ['L0', 'L19', 'L20', 'L479'])
+
+
+def history_points(history, license_ids):
+    points = []
+    for license_id in license_ids:
+        series = history.query(license_id)
+        points.extend((license_id, str(timestamp), int(used))
+                      for timestamp, used in zip(series.timestamps, series.used_licenses))
+    return points
+
+
+def test_hot_license_folds_under_contention(mock_dynamodb):
+    """8 thread cùng fold một license-ngày, lẫn điểm cũ hơn: không lần nào bỏ cuộc"""
+    history = DynamoDBUsageHistory('history', 'us-east-1', LOGGER)
+    reference = InMemoryUsageHistory()
+    start = datetime.now().replace(hour=1, minute=0, second=0, microsecond=0)
+    # Mỗi thread gửi điểm theo thứ tự thời gian riêng; các thread đan xen nên rollup thấy điểm cũ hơn last_at
+    batches = [
+        [[('HOT', (start + timedelta(seconds=thread + 8 * step)).isoformat(), (thread * 7 + step * 3) % 41)]
+         for step in range(20)]
+        for thread in range(8)
+    ]
+
+    def stream(records):
+        for record in records:
+            history.append(record)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(stream, batches))
+    for records in batches:
+        for record in records:
+            reference.append(record)
+
+    assert_same_rollups(history, reference, ['HOT'])
+    rollup = history.daily_rollup('HOT')
+    assert rollup.samples.tolist() == [160]
+
+    # Append được gọi lại với điểm mới nhất không bị cộng hai lần
+    history.append(batches[-1][-1])
+    assert history.daily_rollup('HOT').samples.tolist() == [160]